@@ -2,10 +2,24 @@ from yasf import sf, structured_sentinel, convert_serializable_special_cases  #
 from .__version__ import __title__, __application_name__, __version__, __download_url__, __url__
 from .__version__ import __author_email__, __author__, __copyright__, __description__, __license__
 from .get_logger import get_logger
-from .formatter import BalsaFormatter
+from .formatter import BalsaFormatter, BalsaCompiledFormatter, BalsaJSONFormatter, get_structured, get_message
+from .structured_message import StructuredMessage, lsf
 from .handlers import HandlerType, BalsaNullHandler, BalsaStringListHandler
+from .async_logging import BalsaLogQueue, BalsaQueueHandler, BalsaQueueListener
+from .aggregation import BalsaAggregationListener, BalsaForwardingHandler
 from .guihandler import DialogBoxHandler, tkinter_present
 from .balsa import Balsa, verbose_arg_string, delete_existing_arg_string, log_dir_arg_string, balsa_dev_env_var, balsa_clone
 from .balsa import get_global_balsa, get_global_config
+from .pool import init_pool_worker
+from .fork import register_fork_aware
 from .structured import BalsaRecord, balsa_log_regex
+from .reader import iter_records, iter_record_strings, get_log_file_paths, get_rotated_sets
+from .merge import iter_merged_records, iter_merged_record_strings, get_merge_sets
+from .parallel import iter_records_parallel, reduce_records_parallel
+from .index import iter_indexed_records, update_index, get_index_path, has_valid_index
+from .query import RecordFilter, query_records
+from .export import export_records, ColumnarArchiveWriter, ArchivePart, iter_archive_parts
+from .file_handler import BalsaRotatingFileHandler, BalsaSharedFileHandler
+from .binary_format import iter_binary_records, binary_to_text
+from .caller import find_caller, install_find_caller, uninstall_find_caller, set_caller_info, caller_info
 from .balsa import traceback_string
@@ -0,0 +1,4 @@
+from balsa.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import os
+import sys
+import heapq
+import itertools
+import logging
+import pickle
+import queue
+import threading
+import time
+from logging import LogRecord
+from multiprocessing.connection import Listener, Client, Connection, wait
+from multiprocessing.util import Finalize
+from typing import List, Union
+
+from balsa.async_logging import BalsaLogQueue, BalsaQueueListener
+from balsa.formatter import get_message
+from balsa.fork import register_fork_aware
+from balsa.file_handler import flush_lock_timeout
+
+# Central log aggregation for multiprocessing. The parent process's BalsaAggregationListener owns the real handlers (log file, console, cloud services, etc.)
+# and a local socket (a named pipe on Windows). Child processes (see balsa_clone()) only have a BalsaForwardingHandler, which sends batches of pickled records
+# to the parent. The listener merges the parent's own records and the children's records in time order, so there's one ordered log.
+
+_not_forwarded = ("structured", "balsa_json", "balsa_structured", "balsa_message", "balsa_formatted")  # (in the message) and formatting caches
+
+
+class BalsaForwardingHandler(logging.Handler):
+    """
+    Cheap handler for child processes - records are sent in batches to the parent process's BalsaAggregationListener, which does all the formatting and
+    output.
+    """
+
+    def __init__(self, address: str, authkey: bytes, batch_size: int = 100, flush_interval: float = 0.1, flush_level: int = logging.ERROR):
+        """
+        :param address: the aggregation listener's address
+        :param authkey: the aggregation listener's authentication key
+        :param batch_size: send the records once this many are waiting
+        :param flush_interval: send the waiting records at least this often (in seconds)
+        :param flush_level: send the waiting records right away when a record at or above this level is logged
+        """
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._connection = None  # type: Union[Connection, None]  # connected when the first batch is sent
+        self._batch = []  # type: List[bytes]  # pickled records
+        self._flush_time = time.monotonic()
+        self._flush_thread_stop = threading.Event()
+        self._flush_thread = None  # type: Union[threading.Thread, None]
+        self._start()
+        register_fork_aware(self)
+
+    def _start(self):
+        self._flush_thread = threading.Thread(target=self._flush_worker, name="balsa forwarding flush", daemon=True)
+        self._flush_thread.start()
+        # a multiprocessing child process exits with os._exit(), which doesn't run atexit (or logging.shutdown()), but does run multiprocessing finalizers
+        self._finalizer = Finalize(self, self.close, exitpriority=10)
+
+    def _before_fork(self):
+        self.acquire()  # (not part way through sending a batch)
+
+    def _after_fork_in_parent(self):
+        self.release()
+
+    def _after_fork_in_child(self):
+        # The parent sends its own batch. The child gets its own connection and flush thread when it first logs.
+        self._at_fork_reinit()
+        self._batch = []
+        self._flush_time = time.monotonic()
+        self._connection = None  # (the parent's connection - the child connects on its own, so their batches aren't mixed up)
+        self._flush_thread_stop = threading.Event()
+        self._flush_thread = None
+        self._finalizer.cancel()
+
+    def prepare(self, record: LogRecord) -> bytes:
+        """
+        Pickle a record. Everything the parent needs to format the record is converted to strings here (e.g. the message and exception text), since arguments
+        and exception info can't (necessarily) be pickled.
+        :param record: log record
+        :return: pickled record
+        """
+        record_dict = record.__dict__.copy()
+        for key in _not_forwarded:
+            record_dict.pop(key, None)
+        record_dict["msg"] = get_message(record)  # includes any structured fields (in the same form as sf())
+        record_dict["args"] = None
+        if record.exc_info and not record.exc_text:
+            record_dict["exc_text"] = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+        record_dict["exc_info"] = None
+        return pickle.dumps(record_dict)
+
+    def emit(self, record: LogRecord):
+        try:
+            if self._flush_thread is None:
+                self._start()  # e.g. in a forked process, on first use
+            self._batch.append(self.prepare(record))
+            if len(self._batch) >= self.batch_size or record.levelno >= self.flush_level or time.monotonic() - self._flush_time >= self.flush_interval:
+                self._send_batch()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _send_batch(self):
+        # (call with the handler lock held)
+        batch, self._batch = self._batch, []
+        self._flush_time = time.monotonic()
+        if len(batch) > 0:
+            if self._connection is None:
+                self._connection = Client(self.address, authkey=self.authkey)
+            self._connection.send(batch)
+
+    def flush(self):
+        with self.lock:  # type: ignore
+            try:
+                self._send_batch()
+            except Exception as e:
+                print(f"could not forward log records to {self.address} : {e}", file=sys.stderr)  # can't log it - this is the log
+
+    def _flush_worker(self):
+        while not self._flush_thread_stop.wait(self.flush_interval):
+            if time.monotonic() - self._flush_time >= self.flush_interval:
+                # close() waits for this thread, and logging.shutdown() holds the handler lock while it calls close(), so don't wait on the lock once stopped
+                while not self.lock.acquire(timeout=flush_lock_timeout):  # type: ignore
+                    if self._flush_thread_stop.is_set():
+                        return
+                try:
+                    self.flush()
+                finally:
+                    self.lock.release()  # type: ignore
+
+    def close(self):
+        self._finalizer.cancel()
+        if self._flush_thread is not None:
+            self._flush_thread_stop.set()
+            if self._flush_thread is not threading.current_thread():
+                self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+        with self.lock:  # type: ignore
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        super().close()
+
+
+class BalsaAggregationListener(BalsaQueueListener):
+    """
+    Queue listener that also receives records from child processes (via their BalsaForwardingHandler) and passes all the records to the real handlers in time
+    order. Records are held for reorder_window seconds so that records from all processes can be merged. A record that arrives later than that (e.g. from a
+    stalled child process) is handled as soon as it arrives.
+    """
+
+    def __init__(self, log_queue: BalsaLogQueue, *handlers: logging.Handler, reorder_window: float = 0.25):
+        """
+        :param log_queue: queue for the parent process's own records (see BalsaQueueHandler)
+        :param handlers: the real handlers
+        :param reorder_window: how long to hold records (in seconds) so they can be put in time order
+        """
+        super().__init__(log_queue, *handlers)
+        self.reorder_window = reorder_window
+        self.authkey = os.urandom(32)
+        self._listener = Listener(authkey=self.authkey)  # the platform's default local socket (AF_UNIX, or a named pipe on Windows)
+        self.address = self._listener.address  # type: str
+        self._connections = []  # type: List[Connection]
+        self._connections_lock = threading.Lock()  # (connections are added by the accept thread and removed by the receive thread)
+        self._accepting = True
+        self._receiving = True
+        self._accept_thread = threading.Thread(target=self._accept_worker, name="balsa aggregation accept", daemon=True)
+        self._receive_thread = threading.Thread(target=self._receive_worker, name="balsa aggregation receive", daemon=True)
+        self._forked = False
+        self._forwarding_handler = None  # type: Union[BalsaForwardingHandler, None]  # in a forked process
+
+    def _after_fork_in_child(self):
+        super()._after_fork_in_child()
+        # The socket belongs to the parent. Don't remove its file when the child exits (e.g. a plain os.fork() child exiting normally runs the inherited
+        # multiprocessing finalizers).
+        if (unlink := getattr(getattr(self._listener, "_listener", None), "_unlink", None)) is not None:
+            unlink.cancel()
+        self._accepting = False
+        self._receiving = False
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._forked = True
+
+    def start(self):
+        if self._forked:
+            # In a forked process - the real handlers are the parent's, so the child forwards its records to the parent (the same as a balsa_clone() child), and
+            # the parent puts them in time order.
+            if self._forwarding_handler is None:
+                self._forwarding_handler = BalsaForwardingHandler(self.address, self.authkey)
+            self.handlers = (self._forwarding_handler,)
+            self.reorder_window = 0.0
+            super().start()
+        else:
+            super().start()
+            self._accept_thread.start()
+            self._receive_thread.start()
+
+    def _accept_worker(self):
+        while self._accepting:
+            try:
+                connection = self._listener.accept()
+            except Exception:
+                continue  # e.g. a client that failed authentication
+            if self._accepting:
+                with self._connections_lock:
+                    self._connections = self._connections + [connection]  # (the receive thread waits on a copy)
+            else:
+                connection.close()
+
+    def _receive_worker(self):
+        # puts the children's records on the same queue as the parent's own records
+        while True:
+            receiving = self._receiving  # (read before waiting, so everything sent before stop() is received)
+            ready = wait(self._connections, timeout=0.05 if receiving else 0.0)
+            for connection in ready:
+                try:
+                    batch = connection.recv()
+                except (EOFError, OSError):
+                    # the child process has finished
+                    with self._connections_lock:
+                        self._connections = [c for c in self._connections if c is not connection]
+                    connection.close()
+                    continue
+                for pickled_record in batch:
+                    self.queue.put(logging.makeLogRecord(pickle.loads(pickled_record)))
+            if not receiving and len(ready) == 0:
+                break
+
+    def _monitor(self):
+        pending = []  # type: list  # heap of (created, sequence, record)
+        sequence = itertools.count()  # records from the same process and time stay in the order they were logged
+        while True:
+            if len(pending) > 0:
+                timeout = max(pending[0][0] + self.reorder_window - time.time(), 0.0)
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    record = pending  # (nothing new)
+            else:
+                record = self.queue.get()
+            if record is self._sentinel:
+                break
+            if record is not pending:
+                heapq.heappush(pending, (record.created, next(sequence), record))
+            handle_before = time.time() - self.reorder_window
+            while len(pending) > 0 and pending[0][0] <= handle_before:
+                self.handle(heapq.heappop(pending)[2])
+        while len(pending) > 0:
+            self.handle(heapq.heappop(pending)[2])
+
+    def stop(self):
+        """
+        Stop receiving records (call after the child processes have finished), then handle all the records that have been received. Safe to call more than
+        once.
+        """
+        if self._accepting and self._accept_thread.is_alive():
+            self._accepting = False
+            try:
+                Client(self.address, authkey=self.authkey).close()  # wake up accept()
+            except OSError:
+                pass
+            self._accept_thread.join()
+            self._listener.close()
+            self._receiving = False
+            self._receive_thread.join()
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        super().stop()
+        if self._forwarding_handler is not None:
+            self._forwarding_handler.close()  # (sends what the listener handled)
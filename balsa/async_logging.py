@@ -0,0 +1,167 @@
+import atexit
+import logging
+import queue
+import threading
+from logging import LogRecord
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.util import Finalize
+from typing import Any, Union
+
+from balsa.fork import register_fork_aware
+
+
+class BalsaLogQueue:
+    """
+    Bounded queue for log records. put() is a queue.SimpleQueue put (no lock or condition) unless the queue is full - only then does the putting thread wait,
+    on a condition the listener signals as it takes records off. queue.Queue's put() takes its lock and notifies a condition on every call, which costs
+    more than the rest of the enqueue.
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        :param maxsize: maximum number of records on the queue (0 for no limit)
+        """
+        self.maxsize = maxsize
+        self._queue = queue.SimpleQueue()  # type: queue.SimpleQueue
+        self._not_full = threading.Condition(threading.Lock())
+        self._waiting = 0  # number of threads waiting for room
+
+    def put(self, item: Any):
+        """
+        Put an item on the queue, waiting for room if the queue is full (back pressure rather than lost records).
+        :param item: item (e.g. log record)
+        """
+        if self.maxsize > 0 and self._queue.qsize() >= self.maxsize:
+            with self._not_full:
+                self._waiting += 1  # (before the re-check, so get() either sees the waiter or this sees the room get() made)
+                try:
+                    while self._queue.qsize() >= self.maxsize:
+                        self._not_full.wait()
+                finally:
+                    self._waiting -= 1
+        self._queue.put(item)
+
+    def get(self, block: bool = True, timeout: Union[float, None] = None) -> Any:
+        """
+        Take an item off the queue.
+        :param block: wait for an item
+        :param timeout: maximum time to wait, in seconds (raises queue.Empty)
+        :return: item
+        """
+        item = self._queue.get(block, timeout)
+        if self._waiting > 0:
+            with self._not_full:
+                self._not_full.notify()
+        return item
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+
+class BalsaQueueHandler(QueueHandler):
+    """
+    Lightweight handler that only puts log records on a queue. The real handlers run on a BalsaQueueListener background thread, so the thread that made the log
+    call doesn't pay for slow disk or network I/O.
+    """
+
+    def __init__(self, log_queue: BalsaLogQueue, listener: Union["BalsaQueueListener", None] = None):
+        """
+        :param log_queue: bounded queue shared with the BalsaQueueListener
+        :param listener: the listener, so it can be restarted in a forked process (a forked process only has the thread that forked)
+        """
+        super().__init__(log_queue)
+        self.listener = listener
+        self._restart_listener = False
+        self._restart_lock = threading.Lock()
+        register_fork_aware(self)
+
+    def _after_fork_in_child(self):
+        if self.listener is not None:
+            # records the parent put on the queue are the parent's to handle, so the child gets a new queue
+            self.queue = self.listener.queue = BalsaLogQueue(self.queue.maxsize)  # type: ignore
+            self._restart_lock = threading.Lock()
+            self._restart_listener = True  # on first use
+
+    def _start_listener(self):
+        with self._restart_lock:
+            if self._restart_listener:
+                self.listener.start()  # type: ignore
+                # a multiprocessing child process exits with os._exit(), which doesn't run atexit, but does run multiprocessing finalizers
+                Finalize(self.listener, self.listener.stop, exitpriority=15)  # type: ignore  # (before the handlers' own finalizers)
+                self._restart_listener = False
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # The stdlib QueueHandler formats the whole record here so it can be pickled. This queue never leaves the process, so only the message is rendered:
+        # the arguments may be mutable objects that the caller changes right after the log call, which would be a race with the listener thread. Formatting
+        # (time, caller info, exception text) still happens on the listener thread. A message object such as lsf()'s StructuredMessage is rendered on the
+        # listener thread too - its values must not be changed after the log call.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: LogRecord):
+        # Wait (rather than drop records) when the queue is full - back pressure on the logging threads is better than silently lost logs.
+        if self._restart_listener:
+            self._start_listener()
+        self.queue.put(record)  # (waits for the listener to make room only if the queue is full)
+
+    def handle(self, record: LogRecord) -> bool:
+        # the queue is thread-safe, so skip the handler lock that logging.Handler.handle() acquires around emit()
+        rv = self.filter(record)
+        if isinstance(rv, LogRecord):
+            record = rv  # Python 3.12+ filters can return a replacement record
+        if rv:
+            try:
+                self.enqueue(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+        return bool(rv)
+
+
+class BalsaQueueListener(QueueListener):
+    """
+    Background thread that takes log records off the queue and passes them to the real handlers. Each handler's level is respected. The queue is drained when
+    stop() is called, which also happens automatically at interpreter exit.
+    """
+
+    def __init__(self, log_queue: BalsaLogQueue, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        register_fork_aware(self)
+
+    def _after_fork_in_child(self):
+        self._thread = None  # (the listener thread isn't in the child - see BalsaQueueHandler)
+
+    def add_handler(self, handler: logging.Handler):
+        """
+        Add a handler. Can be called while the listener is running.
+        :param handler: handler that will be run on the listener thread
+        """
+        self.handlers = self.handlers + (handler,)  # tuple replacement is atomic with respect to the listener thread
+
+    def start(self):
+        super().start()
+        atexit.register(self.stop)  # flush whatever is still queued at interpreter exit (runs before logging's own shutdown, which flushes the real handlers)
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # (waits for room if the queue is full)
+
+    def handle(self, record: LogRecord):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    # a misbehaving handler must not kill the listener thread (which would silently stop all logging)
+                    handler.handleError(record)
+
+    def stop(self):
+        """
+        Stop the listener thread after all records already on the queue have been handled. Safe to call more than once.
+        """
+        atexit.unregister(self.stop)
+        if self._thread is not None:
+            super().stop()
@@ -1,13 +1,27 @@
 import logging
 import json
+import time
+import threading
 from functools import lru_cache
 import getpass
 import platform
+import sys
+import traceback
+from typing import List, Dict, Any
 
-from yasf import sf_separate
+from yasf import convert_serializable_special_cases
+
+from balsa.formatter import get_structured
+from balsa.fork import register_fork_aware
 
 log = logging.getLogger(__name__)
 
+# AWS CloudWatch PutLogEvents limits
+cloudwatch_max_batch_count = 10000  # events per batch
+cloudwatch_max_batch_bytes = 1048576  # sum of the UTF-8 message sizes plus cloudwatch_event_overhead for each event
+cloudwatch_event_overhead = 26  # bytes
+cloudwatch_max_batch_span = 24 * 60 * 60 * 1000  # a batch can not span more than 24 hours (in mS)
+
 
 @lru_cache()
 def get_user_name() -> str:
@@ -19,6 +33,30 @@ def get_computer_name() -> str:
     return platform.node()
 
 
+def split_log_events(log_events: List[Dict[str, Any]], max_count: int, max_bytes: int) -> List[List[Dict[str, Any]]]:
+    """
+    Split chronologically sorted log events into batches that are within the AWS CloudWatch PutLogEvents limits.
+    :param log_events: log events, sorted by timestamp
+    :param max_count: maximum number of events in a batch
+    :param max_bytes: maximum batch size in bytes (as counted by CloudWatch)
+    :return: list of batches
+    """
+    batches = []  # type: List[List[Dict[str, Any]]]
+    batch = []  # type: List[Dict[str, Any]]
+    batch_bytes = 0
+    for log_event in log_events:
+        event_bytes = len(log_event["message"].encode("utf-8")) + cloudwatch_event_overhead
+        if len(batch) > 0 and (len(batch) >= max_count or batch_bytes + event_bytes > max_bytes or log_event["timestamp"] - batch[0]["timestamp"] >= cloudwatch_max_batch_span):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(log_event)
+        batch_bytes += event_bytes
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
 try:
     # user may or may not use AWS CloudWatch logs
 
@@ -32,31 +70,90 @@ except ImportError:
 
 if awsimple_exists:
 
+    class BalsaLogsAccess(LogsAccess):
+        """
+        AWSimple LogsAccess that can also put a batch of log events in one PutLogEvents call.
+        """
+
+        def put_events(self, log_events: List[Dict[str, Any]]):
+            """
+            Put log events.
+            :param log_events: list of {"timestamp": <mS since epoch>, "message": <str>} dicts, sorted by timestamp and within the PutLogEvents limits
+            """
+            stream_name = self.get_stream_name()
+            try:
+                self.client.put_log_events(logGroupName=self.log_group, logStreamName=stream_name, logEvents=log_events)
+            except self.client.exceptions.ResourceNotFoundException:
+                # log group and stream does not appear to exist, so make them
+                try:
+                    self.client.create_log_group(logGroupName=self.log_group)
+                    self.client.put_retention_policy(logGroupName=self.log_group, retentionInDays=self.get_retention_in_days())
+                except self.client.exceptions.ResourceAlreadyExistsException:
+                    pass
+                self.client.create_log_stream(logGroupName=self.log_group, logStreamName=stream_name)
+                self.client.put_log_events(logGroupName=self.log_group, logStreamName=stream_name, logEvents=log_events)
+
     class AWSCloudWatchLogHandler(logging.NullHandler):
         """
         Send logs to AWS CloudWatch logs.
         """
 
-        def __init__(self, log_group: str, **kwargs):
+        def __init__(
+            self,
+            log_group: str,
+            batch: bool = False,
+            batch_max_count: int = cloudwatch_max_batch_count,
+            batch_max_bytes: int = cloudwatch_max_batch_bytes,
+            batch_max_age: float = 5.0,
+            **kwargs,
+        ):
             """
             Init the AWS CloudWatch logs handler
             :param log_group: AWS log group name
+            :param batch: True to gather log events in memory and put them in batches from a worker thread (instead of one put per record on the logging thread)
+            :param batch_max_count: put a batch when it has this many events
+            :param batch_max_bytes: put a batch when it has this many bytes (as counted by CloudWatch)
+            :param batch_max_age: put a batch when its oldest event is this old (in seconds)
             :param kwargs: AWS credentials (passed to boto3 via AWSimple). e.g. profile name or key pairs.
             """
             self.log_group = log_group
             self.aws_kwargs = kwargs
             self.logs_access = None  # created lazily on first use, then reused (avoids creating a new boto3 session for every log record)
+
+            self.batch = batch
+            # never go over the PutLogEvents limits
+            self.batch_max_count = min(batch_max_count, cloudwatch_max_batch_count)
+            self.batch_max_bytes = min(batch_max_bytes, cloudwatch_max_batch_bytes)
+            self.batch_max_age = batch_max_age
+            self._batch_events = []  # type: List[Dict[str, Any]]
+            self._batch_bytes = 0
+            self._batch_start = 0.0  # time.monotonic() of the oldest event in the batch
+            self._batch_condition = threading.Condition()
+            self._batch_thread = None  # type: threading.Thread | None
+            self._batch_closing = False
+
             super().__init__()
+            register_fork_aware(self)
+
+        def _after_fork_in_child(self):
+            # the parent puts its own batch, and the child gets its own boto3 session (boto3 sessions aren't safe to share across a fork) and batch thread
+            self.logs_access = None
+            self._batch_events = []
+            self._batch_bytes = 0
+            self._batch_condition = threading.Condition()
+            self._batch_thread = None
+
+        def _get_logs_access(self) -> BalsaLogsAccess:
+            if self.logs_access is None:
+                self.logs_access = BalsaLogsAccess(self.log_group, **self.aws_kwargs)
+            return self.logs_access
 
         def handle(self, record):
             try:
-                args_json, kwargs_json = sf_separate(record.getMessage())
-                if kwargs_json is None:
-                    put_dict = {}
-                else:
-                    put_dict = json.loads(kwargs_json)
-                if args_json is not None and len(args_json) > 0:
-                    put_dict["message"] = args_json
+                message, structured_record = get_structured(record)  # (shared with the other handlers)
+                put_dict = dict(structured_record)
+                if len(message) > 0:
+                    put_dict["message"] = message
 
                 for attribute in ["created", "filename", "funcName", "levelname", "lineno", "module", "name", "pathname", "process", "thread", "threadName", "processName"]:
                     if attribute in put_dict:
@@ -66,15 +163,93 @@ if awsimple_exists:
                 put_dict["system_user_name"] = get_user_name()
                 put_dict["system_computer_name"] = get_computer_name()
 
-                put_string = json.dumps(put_dict)
+                put_string = json.dumps(put_dict, default=convert_serializable_special_cases)  # (native structured fields may not be JSON types)
 
-                if self.logs_access is None:
-                    self.logs_access = LogsAccess(self.log_group, **self.aws_kwargs)
-                self.logs_access.put(put_string)
+                if self.batch:
+                    self._add_to_batch({"timestamp": int(round(record.created * 1000)), "message": put_string})
+                else:
+                    self._get_logs_access().put(put_string)
             except Exception:
                 # a cloud logging failure (e.g. a network error) must not raise out of the user's log call
                 self.handleError(record)
 
+        def _add_to_batch(self, log_event: Dict[str, Any]):
+            event_bytes = len(log_event["message"].encode("utf-8")) + cloudwatch_event_overhead
+            with self._batch_condition:
+                if len(self._batch_events) == 0:
+                    self._batch_start = time.monotonic()
+                self._batch_events.append(log_event)
+                self._batch_bytes += event_bytes
+                if self._batch_thread is None:
+                    # started on first use (not in __init__) so a handler that never gets a record never has a thread
+                    self._batch_thread = threading.Thread(target=self._batch_worker, name=f"{self.__class__.__name__}_{self.log_group}", daemon=True)
+                    self._batch_thread.start()
+                # the worker waits (with no timeout) while the batch is empty, so it's woken to start timing a new batch's max age
+                if len(self._batch_events) == 1 or len(self._batch_events) >= self.batch_max_count or self._batch_bytes >= self.batch_max_bytes:
+                    self._batch_condition.notify()
+
+        def _take_batch(self) -> List[Dict[str, Any]]:
+            # caller must hold self._batch_condition
+            log_events = self._batch_events
+            self._batch_events = []
+            self._batch_bytes = 0
+            return log_events
+
+        def _batch_worker(self):
+            while True:
+                with self._batch_condition:
+                    while not self._batch_closing:
+                        if len(self._batch_events) >= self.batch_max_count or self._batch_bytes >= self.batch_max_bytes:
+                            break
+                        if len(self._batch_events) == 0:
+                            self._batch_condition.wait()
+                        elif (remaining := self._batch_start + self.batch_max_age - time.monotonic()) > 0.0:
+                            self._batch_condition.wait(remaining)
+                        else:
+                            break  # oldest event has reached the max age
+                    log_events = self._take_batch()
+                    closed = self._batch_closing
+                self._put_events(log_events)
+                if closed:
+                    break
+
+        def _put_events(self, log_events: List[Dict[str, Any]]):
+            """
+            Put log events, in as many PutLogEvents calls as needed to stay within the limits.
+            :param log_events: log events
+            """
+            log_events.sort(key=lambda log_event: log_event["timestamp"])  # PutLogEvents requires chronological order (records from multiple threads can be out of order)
+            for batch in split_log_events(log_events, self.batch_max_count, self.batch_max_bytes):
+                try:
+                    self._get_logs_access().put_events(batch)
+                except Exception:
+                    # Don't log this failure, since it would just be added to the next batch (which would likely fail the same way). Report it the way
+                    # logging.Handler.handleError() does instead.
+                    if logging.raiseExceptions:
+                        traceback.print_exc(file=sys.stderr)
+
+        def flush(self):
+            """
+            Put all batched log events now (on the calling thread).
+            """
+            with self._batch_condition:
+                log_events = self._take_batch()
+            if len(log_events) > 0:
+                self._put_events(log_events)
+
+        def close(self):
+            """
+            Stop the batch worker thread and put any remaining log events.
+            """
+            with self._batch_condition:
+                self._batch_closing = True
+                self._batch_condition.notify()
+            if self._batch_thread is not None:
+                self._batch_thread.join()
+                self._batch_thread = None
+            self.flush()
+            super().close()
+
 else:
 
     # mypy will complain that AWSCloudWatchLogHandler is already defined ...
@@ -1,7 +1,6 @@
 import argparse
 import os
 import logging
-import logging.handlers
 import traceback
 import sys
 from typing import List, Union, Dict, Any
@@ -23,9 +22,13 @@ except ImportError:
 from balsa.get_logger import get_logger
 from balsa.handlers import HandlerType, BalsaNullHandler, BalsaStringListHandler
 from balsa.guihandler import DialogBoxHandler
-from balsa.formatter import BalsaFormatter
+from balsa.formatter import BalsaCompiledFormatter, BalsaJSONFormatter
 from balsa.__version__ import __application_name__
 from balsa.aws_cloudwatch_logs import AWSCloudWatchLogHandler
+from balsa.async_logging import BalsaLogQueue, BalsaQueueHandler, BalsaQueueListener
+from balsa.aggregation import BalsaAggregationListener, BalsaForwardingHandler
+from balsa.file_handler import BalsaRotatingFileHandler, BalsaSharedFileHandler
+from balsa.caller import set_caller_info, _hold_find_caller, _release_find_caller, _clear_caller_info
 
 import appdirs
 from attr import attrs, attrib
@@ -108,10 +111,16 @@ class Balsa(object):
     log_path = attrib(default=None, type=Path)
     log_extension = attrib(default=".log")
     log_formatter_string = attrib(default="%(asctime)s - %(name)s - %(processName)s - %(filename)s - %(lineno)s - %(funcName)s - %(levelname)s - %(message)s")
+    # "text" (log_formatter_string) or "json" (JSON Lines, i.e. one JSON object per line) for the log file and console, or "binary" for a compact binary log file
+    # (see balsa.binary_format) with a text console
+    log_format = attrib(default="text", type=str)
     log_console_prefix = attrib(default="")  # set to "\r" (rewrite existing line) or "\n" (new line) to avoid logs appended to current line
+    use_fast_caller_info = attrib(default=False, type=bool)  # use balsa.caller's find_caller() (cached frame checks) instead of logging.Logger.findCaller()
+    caller_info = attrib(default=True, type=bool)  # False for placeholders instead of the file name, line number and function name of records logged via this Balsa's logger and its descendants
 
     handlers = attrib(default=None)
     log = attrib(default=None)
+    queue_listener = attrib(default=None)  # only used with use_async
     is_root = attrib(default=True)
     propagate = attrib(default=True)  # set to False for this logger to be independent of parent(s)
 
@@ -140,11 +149,33 @@ class Balsa(object):
     # AWS CloudWatch logs
     use_aws_cloudwatch_logs = attrib(default=False, type=bool)
     aws_credentials = attrib(factory=dict, type=dict)  # kwargs that will get sent to boto3 (via AWSimple)
+    aws_cloudwatch_batch = attrib(default=False, type=bool)  # put log events in batches from a worker thread instead of one put per record on the logging thread
+    aws_cloudwatch_batch_max_age = attrib(default=5.0, type=float)  # seconds
 
     instance_name = attrib(default=None, type=str)
 
+    # Asynchronous logging - the log call only puts the record on a bounded queue and all the handlers run on a background thread. The error callback
+    # (if any) still runs on the logging thread.
+    use_async = attrib(default=False, type=bool)
+    async_queue_size = attrib(default=10000, type=int)  # log calls block (rather than drop records) when the queue is full
+
+    # multiprocessing log aggregation - the parent process writes one merged log, and child processes (see balsa_clone()) only forward their records to it
+    use_aggregation = attrib(default=False, type=bool)  # call config_as_dict() after init_logger(), so the clones get the address and key below
+    aggregation_reorder_window = attrib(default=0.25, type=float)  # seconds to hold records so the records from all processes can be written in time order
+    aggregation_address = attrib(default=None, type=str)  # set by the parent's init_logger()
+    aggregation_authkey = attrib(default=None, type=str)  # (hex)
+
     # turn off file logging, e.g. for cloud environments where it's not recommended and/or possible to write to the local file system
     use_file_logging = attrib(default=True, type=bool)
+    use_log_index = attrib(default=False, type=bool)  # keep a time/level index (sidecar file) for each log file, for fast queries (see balsa.index)
+    use_shared_log_file = attrib(default=False, type=bool)  # the log file can be shared by several processes (see BalsaSharedFileHandler)
+    use_timestamp_segments = attrib(default=False, type=bool)  # name rotated log files by time (e.g. my_app.log.20231114T221320123456) so rollover is a single rename
+    log_compression = attrib(default=None, type=str)  # compress rotated backups with "gzip", "bz2" or "lzma", in a background thread (None to not compress them)
+    # Buffer up to this many bytes of log file writes (0 to write each record right away). The buffer is written at least every log_flush_interval seconds,
+    # and right away for records at or above log_flush_level.
+    log_buffer_size = attrib(default=0, type=int)
+    log_flush_interval = attrib(default=1.0, type=float)
+    log_flush_level = attrib(default=logging.ERROR, type=int)  # records at or above this level write the buffer right away (e.g. so errors aren't lost on a crash)
 
     # a separate rate limit for each level
     rate_limits = attrib(
@@ -184,7 +215,14 @@ class Balsa(object):
             log.warning(f'init_logger() already called for this Balsa instance ("{self.name}") - ignoring')
             return
 
-        log_formatter = BalsaFormatter(self.log_formatter_string)
+        text_formatter = BalsaCompiledFormatter(self.log_formatter_string)
+        if self.log_format in ("text", "binary"):
+            log_formatter = text_formatter  # (the binary file handler only uses the formatter for exceptions and stack info)
+            console_formatter = BalsaCompiledFormatter(self.log_formatter_string, prefix=self.log_console_prefix)  # prefix for things like "\n" or "\r"
+        elif self.log_format == "json":
+            log_formatter = console_formatter = BalsaJSONFormatter()  # (no console prefix, so each line is a JSON object)
+        else:
+            raise ValueError(f'log_format "{self.log_format}" is not "text", "json" or "binary"')
 
         assert self.name is not None
         assert self.author is not None
@@ -195,6 +233,10 @@ class Balsa(object):
             self.log = logging.getLogger(self.name)
         if not self.propagate:
             self.log.propagate = False
+        if not self.caller_info or self.use_fast_caller_info:
+            _hold_find_caller(self.log)  # (until remove())
+        if not self.caller_info:
+            set_caller_info(self.log, False)
 
         # set the root log level
         if self.verbose:
@@ -202,9 +244,32 @@ class Balsa(object):
         else:
             self.log.setLevel(logging.INFO)
 
+        if self.aggregation_address is not None:
+            # a clone in a child process - only forward records to the parent (any handlers inherited from the parent via fork would go nowhere)
+            self.log.handlers.clear()
+            forwarding_handler = BalsaForwardingHandler(self.aggregation_address, bytes.fromhex(self.aggregation_authkey))
+            self._add_handler(HandlerType.Forwarding, forwarding_handler)
+            _set_global_balsa(self)
+            return
+
         if self.log.hasHandlers():
             self.log.info("Logger already initialized.")
 
+        if self.use_async or self.use_aggregation:
+            # the only handler on the logger itself is the queue handler - the other handlers are added to the listener as they are created
+            log_queue = BalsaLogQueue(self.async_queue_size)
+            if self.use_aggregation:
+                # the listener also receives the child processes' records
+                self.queue_listener = BalsaAggregationListener(log_queue, reorder_window=self.aggregation_reorder_window)
+                self.aggregation_address = self.queue_listener.address
+                self.aggregation_authkey = self.queue_listener.authkey.hex()
+            else:
+                self.queue_listener = BalsaQueueListener(log_queue)
+            self.queue_listener.start()
+            queue_handler = BalsaQueueHandler(log_queue, self.queue_listener)
+            self.log.addHandler(queue_handler)
+            self.handlers[HandlerType.Queue] = queue_handler
+
         if self.use_file_logging:
             # create file handler
             if self.log_directory is None:
@@ -217,7 +282,7 @@ class Balsa(object):
 
                 self.log_directory.mkdir(parents=True, exist_ok=True)
                 if self.delete_existing_log_files:
-                    # need to glob since there are potentially many files due to the "rotating" file handler
+                    # need to glob since there are potentially many files due to the "rotating" file handler (including compressed backups and indexes)
                     # (only delete this application's log files - the log directory may be shared with other applications)
                     for file_path in self.log_directory.glob(f"{self.name}*{self.log_extension}*"):
                         try:
@@ -227,14 +292,37 @@ class Balsa(object):
 
                 self.log_path = self.get_log_path()
 
-                file_handler = logging.handlers.RotatingFileHandler(self.log_path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+                if self.use_shared_log_file:
+                    if self.use_log_index or self.log_compression is not None or self.log_format == "binary":
+                        raise ValueError("a shared log file can't be indexed, compressed or binary")
+                    file_handler = BalsaSharedFileHandler(
+                        self.log_path,
+                        self.max_bytes,
+                        self.backup_count,
+                        self.use_timestamp_segments,
+                        buffer_size=self.log_buffer_size,
+                        flush_interval=self.log_flush_interval,
+                        flush_level=self.log_flush_level,
+                    )  # type: BalsaRotatingFileHandler
+                else:
+                    file_handler = BalsaRotatingFileHandler(
+                        self.log_path,
+                        self.max_bytes,
+                        self.backup_count,
+                        self.use_log_index,
+                        self.log_compression,
+                        self.use_timestamp_segments,
+                        buffer_size=self.log_buffer_size,
+                        flush_interval=self.log_flush_interval,
+                        flush_level=self.log_flush_level,
+                        binary=self.log_format == "binary",
+                    )
                 file_handler.setFormatter(log_formatter)
                 if self.verbose:
                     file_handler.setLevel(logging.DEBUG)
                 else:
                     file_handler.setLevel(logging.INFO)
-                self.log.addHandler(file_handler)
-                self.handlers[HandlerType.File] = file_handler
+                self._add_handler(HandlerType.File, file_handler)
                 self.log.info(f'log file path : "{self.log_path}" ("{self.log_path.absolute()}")')
 
         if self.gui:
@@ -245,26 +333,22 @@ class Balsa(object):
                 dialog_box_handler.setLevel(logging.WARNING)
             else:
                 dialog_box_handler.setLevel(logging.ERROR)
-            self.log.addHandler(dialog_box_handler)
-            self.handlers[HandlerType.DialogBox] = dialog_box_handler
+            self._add_handler(HandlerType.DialogBox, dialog_box_handler)
 
             self.set_std()  # redirect stdout and stderr to log
         else:
             console_handler = logging.StreamHandler()
-            # prefix for things like "\n" or "\r"
-            console_handler.setFormatter(BalsaFormatter(f"{self.log_console_prefix}{self.log_formatter_string}"))
+            console_handler.setFormatter(console_formatter)
             if self.verbose:
                 console_handler.setLevel(logging.INFO)
             else:
                 console_handler.setLevel(logging.WARNING)
-            self.log.addHandler(console_handler)
-            self.handlers[HandlerType.Console] = console_handler
+            self._add_handler(HandlerType.Console, console_handler)
 
         string_list_handler = BalsaStringListHandler(self.max_string_list_entries)
-        string_list_handler.setFormatter(log_formatter)
+        string_list_handler.setFormatter(text_formatter)
         string_list_handler.setLevel(logging.INFO)
-        self.log.addHandler(string_list_handler)
-        self.handlers[HandlerType.StringList] = string_list_handler
+        self._add_handler(HandlerType.StringList, string_list_handler)
 
         # setting up Sentry error handling
         # For the Client to work you need a SENTRY_DSN environmental variable set, or one must be provided.
@@ -328,22 +412,35 @@ class Balsa(object):
             if self.inhibit_cloud_services:
                 self.log.info("AWS CloudWatch logs not initialized since inhibit_cloud_services is set")
             else:
-                aws_cloudwatch_log_handler = AWSCloudWatchLogHandler(self.name, **self.aws_credentials)
-                aws_cloudwatch_log_handler.setFormatter(log_formatter)
+                aws_cloudwatch_log_handler = AWSCloudWatchLogHandler(
+                    self.name, batch=self.aws_cloudwatch_batch, batch_max_age=self.aws_cloudwatch_batch_max_age, **self.aws_credentials
+                )
+                aws_cloudwatch_log_handler.setFormatter(text_formatter)
                 aws_cloudwatch_log_handler.setLevel(logging.WARNING)
-                self.log.addHandler(aws_cloudwatch_log_handler)
-                self.handlers[HandlerType.AWSCloudWatch] = aws_cloudwatch_log_handler
+                self._add_handler(HandlerType.AWSCloudWatch, aws_cloudwatch_log_handler)
 
         # error handler for callback on error or above
         # (this is last since the user may do a sys.exit() in the error callback)
         if self.error_callback is not None:
             error_callback_handler = BalsaNullHandler(self.error_callback)
             error_callback_handler.setLevel(logging.ERROR)
-            self.log.addHandler(error_callback_handler)
-            self.handlers[HandlerType.Callback] = error_callback_handler
+            self._add_handler(HandlerType.Callback, error_callback_handler)
 
         _set_global_balsa(self)
 
+    def _add_handler(self, handler_type: HandlerType, handler: logging.Handler):
+        """
+        Add a handler to the logger, or to the queue listener if using async logging.
+        :param handler_type: handler type
+        :param handler: the handler
+        """
+        if self.queue_listener is None or handler_type == HandlerType.Callback:
+            # the error callback runs on the logging thread, since the user may e.g. set a return code or do a sys.exit() in it
+            self.log.addHandler(handler)
+        else:
+            self.queue_listener.add_handler(handler)
+        self.handlers[handler_type] = handler
+
     def get_sentry_dsn_via_env_var(self) -> Union[str, None]:
         """
         Get the Sentry DSN via an environmental variable. Derived classes should override this to use a different environmental variable.
@@ -403,7 +500,7 @@ class Balsa(object):
         """
         config = {}
         config_types = [bool, str, Path, int, float, dict]  # only pickle-able types
-        runtime_attributes = {"handlers", "log"}  # runtime state, not configuration
+        runtime_attributes = {"handlers", "log", "queue_listener"}  # runtime state, not configuration
         for k, v in attr.asdict(self).items():
             if k not in runtime_attributes and any([isinstance(v, config_type) for config_type in config_types]):
                 config[k] = v
@@ -417,6 +514,18 @@ class Balsa(object):
         """
         if self.log is not None:
             self.log.handlers.clear()  # removeHandler() doesn't work
+            if not self.caller_info:
+                _clear_caller_info(self.log)
+            _release_find_caller(self.log)  # (logging.Logger.findCaller is put back once no Balsa instance uses find_caller())
+        if self.queue_listener is not None:
+            self.queue_listener.stop()  # handles everything still on the queue
+            self.queue_listener = None
+        if self.handlers is not None and (file_handler := self.handlers.get(HandlerType.File)) is not None:
+            file_handler.close()  # writes anything buffered and closes the log file
+        if self.handlers is not None and (forwarding_handler := self.handlers.get(HandlerType.Forwarding)) is not None:
+            forwarding_handler.close()  # sends anything not yet sent to the parent
+        if self.handlers is not None and (aws_cloudwatch_handler := self.handlers.get(HandlerType.AWSCloudWatch)) is not None:
+            aws_cloudwatch_handler.close()  # stops the batch thread and puts any batched log events
 
 
 def balsa_clone(config_dict: Dict[str, Any], instance_name: str, parent_instance: Union[Balsa, None] = None) -> Balsa:
@@ -441,6 +550,7 @@ def balsa_clone(config_dict: Dict[str, Any], instance_name: str, parent_instance
     config_dict["delete_existing_log_files"] = False  # deletion of existing log files is only possible by the original Balsa instance since all files in the directory are removed
     config_dict["handlers"] = None  # runtime state must not be inherited from the parent instance (the clone gets its own handlers via init_logger())
     config_dict["log"] = None
+    config_dict["queue_listener"] = None
     new_balsa = attr.evolve(balsa_instance, **config_dict)
     return new_balsa
 
@@ -0,0 +1,306 @@
+import sys
+import logging
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Union, Dict, List, Tuple, Iterator, BinaryIO, TextIO
+
+from balsa.structured import BalsaRecord
+from balsa.formatter import _split_timestamp, get_message
+
+# Binary log segment format. Each log file (segment) starts with binary_magic, followed by length-prefixed entries:
+#   varint payload length, then the payload, which starts with an entry type byte
+# Entry types:
+#   _string_entry: UTF-8 string, added to the segment's string dictionary (the first string is id 0, the next is 1, etc.)
+#   _record_entry: log record, all integers as varints:
+#       level, time delta (zigzag, microseconds since the previous record in the segment), UTC offset (zigzag, seconds), logger name string id,
+#       process name string id, file name string id, function name string id, line number, message length, message (UTF-8)
+#   _reset_entry: start over with an empty string dictionary and a time of 0 (so the records after it don't depend on the ones before it)
+# Logger, process, file and function names are only stored once per segment, and most time deltas are a few bytes. The level is first, so a reader can skip
+# records by level without decoding the rest. Each segment has its own dictionary, so every segment can be read on its own. When more than one process
+# appends to the same log file (e.g. after os.fork()), each write starts with a _reset_entry, so the processes' writes don't depend on each other.
+
+binary_magic = b"BALSABIN\x01"
+
+_string_entry = 0
+_record_entry = 1
+_reset_entry = 2
+
+
+def _append_varint(data: bytearray, value: int):
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if (value & 1) == 0 else -((value + 1) >> 1)
+
+
+def _read_varint(data: Union[bytes, bytearray], position: int) -> Tuple[int, int]:
+    """
+    :return: value, position after the varint
+    """
+    value = data[position]
+    position += 1
+    if value < 0x80:
+        return value, position  # most values fit in one byte
+    value &= 0x7F
+    shift = 7
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _read_varints(data: Union[bytes, bytearray], position: int, count: int) -> Tuple[List[int], int]:
+    """
+    Read consecutive varints (faster than calling _read_varint() for each one).
+    :return: values, position after the varints
+    """
+    values = []
+    for _ in range(count):
+        value = data[position]
+        position += 1
+        if value >= 0x80:
+            value, position = _read_varint(data, position - 1)
+        values.append(value)
+    return values, position
+
+
+class BinaryRecordEncoder:
+    """
+    Encodes log records for one binary log segment at a time (see above).
+    """
+
+    def __init__(self):
+        self.strings = {}  # type: Dict[str, int]
+        self.previous_time = 0  # microseconds since the epoch
+        self._utc_offset_cache = (None, 0)  # type: Tuple[Union[int, None], int]  # (seconds, UTC offset in seconds) of the most recent second
+
+    def start_segment(self, log_file_path: Union[Path, str]) -> bytes:
+        """
+        Start a segment, e.g. when the log file is opened.
+        :param log_file_path: log file path. If the log file already has records (e.g. appending after a restart), its dictionary is loaded.
+        :return: bytes to write at the start of the log file (the header if it's a new file)
+        """
+        self.strings = {}
+        self.previous_time = 0
+        log_file_path = Path(log_file_path)
+        if not log_file_path.exists() or log_file_path.stat().st_size == 0:
+            return binary_magic
+        with log_file_path.open("rb") as log_file:
+            decoder = _SegmentDecoder()
+            for data, position in decoder.iter_entries(log_file):
+                decoder.decode(data, position, sys.maxsize)  # (only the time is decoded)
+        self.strings = {string: string_id for string_id, string in enumerate(decoder.strings)}
+        self.previous_time = decoder.time
+        return b""
+
+    def restart(self) -> bytes:
+        """
+        Start over within the segment, with an empty dictionary and time base, so the records that follow can be decoded without the ones before them.
+        :return: bytes to write before the next record
+        """
+        self.strings = {}
+        self.previous_time = 0
+        return bytes((1, _reset_entry))  # (payload length, then the payload)
+
+    def _get_string_id(self, string: str, data: bytearray) -> int:
+        if (string_id := self.strings.get(string)) is None:
+            # new string - add it to the dictionary first
+            string_id = self.strings[string] = len(self.strings)
+            string_bytes = string.encode("utf-8", "backslashreplace")
+            _append_varint(data, len(string_bytes) + 1)
+            data.append(_string_entry)
+            data += string_bytes
+        return string_id
+
+    def _get_utc_offset(self, seconds: int) -> int:
+        # the local UTC offset, looked up once per second (like BalsaFormatter.formatTime())
+        cached_seconds, utc_offset = self._utc_offset_cache
+        if seconds != cached_seconds:
+            utc_offset = int(datetime.fromtimestamp(seconds).astimezone().utcoffset().total_seconds())  # type: ignore
+            self._utc_offset_cache = (seconds, utc_offset)
+        return utc_offset
+
+    def encode(self, record: logging.LogRecord, formatter: logging.Formatter) -> bytes:
+        """
+        Encode a record.
+        :param record: log record
+        :param formatter: formatter for the exception and stack info text (if any)
+        :return: bytes to write to the log file, including any new dictionary strings
+        """
+        message = get_message(record)
+        if record.exc_info is not None and record.exc_text is None:
+            record.exc_text = formatter.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"  # the same as Formatter.format()
+        if record.stack_info:
+            message = f"{message}\n{formatter.formatStack(record.stack_info)}"
+
+        data = bytearray()
+        name_id = self._get_string_id(record.name, data)
+        process_name_id = self._get_string_id(str(record.processName), data)
+        file_name_id = self._get_string_id(record.filename, data)
+        function_name_id = self._get_string_id(record.funcName, data)
+
+        seconds, microseconds = _split_timestamp(record.created)
+        time_stamp = seconds * 1000000 + microseconds
+        payload = bytearray((_record_entry,))
+        _append_varint(payload, max(record.levelno, 0))
+        _append_varint(payload, _zigzag(time_stamp - self.previous_time))
+        _append_varint(payload, _zigzag(self._get_utc_offset(seconds)))
+        _append_varint(payload, name_id)
+        _append_varint(payload, process_name_id)
+        _append_varint(payload, file_name_id)
+        _append_varint(payload, function_name_id)
+        _append_varint(payload, max(record.lineno, 0))
+        message_bytes = message.encode("utf-8", "backslashreplace")
+        _append_varint(payload, len(message_bytes))
+        payload += message_bytes
+        self.previous_time = time_stamp
+
+        _append_varint(data, len(payload))
+        data += payload
+        return bytes(data)
+
+
+# (time stamp, logger name, process name, file name, line number, function name, level, message)
+BinaryFields = Tuple[datetime, str, str, str, int, str, int, str]
+
+
+class _SegmentDecoder:
+    def __init__(self):
+        self.strings = []  # type: List[str]
+        self.time = 0
+        self.time_zones = {}  # type: Dict[int, timezone]
+        self._second_key = (None, None)  # type: Tuple[Union[int, None], Union[int, None]]  # (seconds, UTC offset) of _second and _time_zone
+        self._second = (1, 1, 1, 0, 0, 0)  # (year, month, day, hour, minute, second) of the time stamp
+        self._time_zone = timezone.utc
+
+    def iter_entries(self, log_file: BinaryIO, chunk_size: int = 1024 * 1024) -> Iterator[Tuple[bytes, int]]:
+        """
+        Read the entries of a segment, adding the strings to the dictionary.
+        :return: iterator of (data that contains the record entry, position of the record entry's payload after the entry type)
+        """
+        if log_file.read(len(binary_magic)) != binary_magic:
+            raise ValueError("not a Balsa binary log file")
+        data = b""
+        position = 0
+        end_of_file = False
+        while True:
+            # make sure the length varint (at most 10 bytes) and then the whole entry have been read
+            while len(data) - position < 10 and not end_of_file:
+                data, position = data[position:] + (chunk := log_file.read(chunk_size)), 0
+                end_of_file = len(chunk) == 0
+            if position >= len(data):
+                break
+            try:
+                length, payload_start = _read_varint(data, position)
+            except IndexError:
+                break  # partially written last entry
+            payload_end = payload_start + length
+            while payload_end > len(data) and not end_of_file:
+                data, payload_start, payload_end, position = data[position:], payload_start - position, payload_end - position, 0
+                data += (chunk := log_file.read(max(chunk_size, payload_end - len(data))))
+                end_of_file = len(chunk) == 0
+            if payload_end > len(data):
+                break  # partially written last entry
+            if (entry_type := data[payload_start]) == _string_entry:
+                self.strings.append(data[payload_start + 1 : payload_end].decode("utf-8", "replace"))
+            elif entry_type == _reset_entry:
+                self.strings = []
+                self.time = 0
+            else:
+                yield data, payload_start + 1  # (no copy of the entry)
+            position = payload_end
+
+    def decode(self, data: bytes, position: int, min_level: int) -> Union[BinaryFields, None]:
+        """
+        Decode a record entry.
+        :return: the record fields, or None if the record is below min_level
+        """
+        level, position = _read_varint(data, position)
+        time_delta, position = _read_varint(data, position)
+        self.time += _unzigzag(time_delta)  # (needed even for records that are skipped)
+        if level < min_level:
+            return None
+        (utc_offset, name_id, process_name_id, file_name_id, function_name_id, line_number, message_length), position = _read_varints(data, position, 7)
+        message = data[position : position + message_length].decode("utf-8", "replace")
+        seconds, microseconds = divmod(self.time, 1000000)
+        if (seconds, utc_offset) != self._second_key:
+            # datetime.fromtimestamp() with a time zone is relatively slow, so it's only done once per second (records are usually in time order)
+            if (time_zone := self.time_zones.get(utc_offset)) is None:
+                time_zone = self.time_zones[utc_offset] = timezone(timedelta(seconds=_unzigzag(utc_offset)))
+            second = datetime.fromtimestamp(seconds, time_zone)
+            self._second = (second.year, second.month, second.day, second.hour, second.minute, second.second)
+            self._time_zone = time_zone
+            self._second_key = (seconds, utc_offset)
+        year, month, day, hour, minute, second = self._second
+        time_stamp = datetime(year, month, day, hour, minute, second, microseconds, self._time_zone)  # (faster than datetime.replace())
+        strings = self.strings
+        return time_stamp, strings[name_id], strings[process_name_id], strings[file_name_id], line_number, strings[function_name_id], level, message
+
+
+def is_binary_log_file(log_file: BinaryIO) -> bool:
+    """
+    Determine if a log file is in the binary format (then seek back to the start of the file).
+    :param log_file: log file opened in binary mode
+    :return: True if binary
+    """
+    is_binary = log_file.read(len(binary_magic)) == binary_magic
+    log_file.seek(0)
+    return is_binary
+
+
+def iter_binary_fields(log_file: BinaryIO, min_level: int = logging.NOTSET) -> Iterator[BinaryFields]:
+    """
+    Read the records of a binary log file as fields (i.e. without creating BalsaRecord objects).
+    :param log_file: log file opened in binary mode, at the start of the file
+    :param min_level: skip records below this level (without decoding them)
+    :return: iterator of record fields
+    """
+    decoder = _SegmentDecoder()
+    for data, position in decoder.iter_entries(log_file):
+        if (fields := decoder.decode(data, position, min_level)) is not None:
+            yield fields
+
+
+def iter_binary_records(log_file: BinaryIO, min_level: int = logging.NOTSET) -> Iterator[BalsaRecord]:
+    """
+    Read the records of a binary log file.
+    :param log_file: log file opened in binary mode, at the start of the file
+    :param min_level: skip records below this level (without decoding them)
+    :return: iterator of BalsaRecord (the same as for the equivalent text log file)
+    """
+    for fields in iter_binary_fields(log_file, min_level):
+        yield BalsaRecord.from_fields(*fields)
+
+
+def fields_to_text(fields: BinaryFields) -> str:
+    """
+    Convert binary record fields to a log string in the default Balsa text format.
+    :param fields: record fields
+    :return: log string
+    """
+    time_stamp, name, process_name, file_name, line_number, function_name, level, message = fields
+    return f"{time_stamp.isoformat()} - {name} - {process_name} - {file_name} - {line_number} - {function_name} - {logging.getLevelName(level)} - {message}"
+
+
+def binary_to_text(binary_log_path: Union[Path, str], output: TextIO):
+    """
+    Convert a binary log file to the default Balsa text format.
+    :param binary_log_path: binary log file path
+    :param output: output text file (e.g. an open file or sys.stdout)
+    """
+    with Path(binary_log_path).open("rb") as log_file:
+        for fields in iter_binary_fields(log_file):
+            output.write(f"{fields_to_text(fields)}\n")
@@ -0,0 +1,146 @@
+import io
+import os
+import sys
+import logging
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import CodeType
+from typing import Union, Tuple, Dict, Iterator, Set
+
+# Caller info (file name, line number and function name) for log records. logging.Logger.findCaller() checks the file name of every frame it walks (to skip the
+# logging module's own frames). find_caller() does the same walk, but each code object is only checked once. Caller info can also be turned off for a logger
+# or for a region of code, in which case the record gets placeholders (that BalsaRecord still parses) and no frames are walked at all.
+
+unknown_file = "?"
+unknown_line = 0
+unknown_function = "?"
+
+_caller_info_enabled = ContextVar("balsa_caller_info", default=True)
+_internal_code = {}  # type: Dict[CodeType, bool]  # code object to True if it's internal to logging (the same test as logging's _is_internal_frame())
+_standard_find_caller = logging.Logger.findCaller
+_find_caller_loggers = set()  # type: Set[logging.Logger]  # loggers (e.g. Balsa's) that find_caller() is installed for, see _hold_find_caller()
+_held_find_caller = _standard_find_caller  # logging.Logger.findCaller before the first of those loggers
+_caller_info_generation = 0  # changes whenever a logger's caller info switch is set or cleared, so the switches cached on loggers are looked up again
+
+
+def _is_internal(code: CodeType) -> bool:
+    if (internal := _internal_code.get(code)) is None:
+        file_name = os.path.normcase(code.co_filename)
+        internal = _internal_code[code] = file_name == logging._srcfile or ("importlib" in file_name and "_bootstrap" in file_name)  # type: ignore
+    return internal
+
+
+def _get_caller_info(logger: logging.Logger) -> bool:
+    # A logger's caller info switch is inherited from its ancestors, the same as its level (e.g. Balsa(caller_info=False) sets it on the root logger, and
+    # applies to get_logger(name) too). The result is cached on the logger.
+    if (cached := logger.__dict__.get("balsa_caller_info_cache")) is not None and cached[0] == _caller_info_generation:
+        return cached[1]
+    enabled = True
+    ancestor = logger  # type: Union[logging.Logger, None]
+    while ancestor is not None:
+        if (ancestor_enabled := ancestor.__dict__.get("balsa_caller_info")) is not None:
+            enabled = ancestor_enabled
+            break
+        ancestor = ancestor.parent
+    logger.balsa_caller_info_cache = (_caller_info_generation, enabled)  # type: ignore
+    return enabled
+
+
+def find_caller(self: logging.Logger, stack_info: bool = False, stacklevel: int = 1) -> Tuple[str, int, str, Union[str, None]]:
+    """
+    Replacement for logging.Logger.findCaller() (see install_find_caller()). Returns the same as findCaller(), or placeholders if caller info is turned off.
+    """
+    if not stack_info and (not _caller_info_enabled.get() or not _get_caller_info(self)):
+        return unknown_file, unknown_line, unknown_function, None
+    internal_code = _internal_code
+    f = sys._getframe(1)  # start where findCaller() would, after its first step
+    if not ((internal := internal_code.get(f.f_code)) or (internal is None and _is_internal(f.f_code))):
+        stacklevel -= 1
+    while stacklevel > 0:
+        if (next_f := f.f_back) is None:
+            break
+        f = next_f
+        if not ((internal := internal_code.get(f.f_code)) or (internal is None and _is_internal(f.f_code))):
+            stacklevel -= 1
+    code = f.f_code
+    return code.co_filename, f.f_lineno, code.co_name, _get_stack_info(f) if stack_info else None
+
+
+def _get_stack_info(f) -> str:
+    # the same as findCaller()
+    with io.StringIO() as sio:
+        sio.write("Stack (most recent call last):\n")
+        traceback.print_stack(f, file=sio)
+        sinfo = sio.getvalue()
+        if sinfo[-1] == "\n":
+            sinfo = sinfo[:-1]
+    return sinfo
+
+
+def install_find_caller():
+    """
+    Use find_caller() for all loggers (it's the same as logging.Logger.findCaller(), but faster, and caller info can be turned off). Safe to call more than
+    once.
+    """
+    logging.Logger.findCaller = find_caller  # type: ignore
+
+
+def uninstall_find_caller():
+    """
+    Go back to logging.Logger.findCaller().
+    """
+    logging.Logger.findCaller = _standard_find_caller  # type: ignore
+
+
+def _hold_find_caller(logger: logging.Logger):
+    # Install find_caller() on behalf of a logger (e.g. for Balsa.init_logger()), until _release_find_caller() is called for every logger it was held for.
+    global _held_find_caller
+    if len(_find_caller_loggers) == 0:
+        _held_find_caller = logging.Logger.findCaller  # (e.g. the user already installed find_caller(), or has their own)
+    _find_caller_loggers.add(logger)
+    install_find_caller()
+
+
+def _release_find_caller(logger: logging.Logger):
+    # put back what logging.Logger.findCaller was (e.g. for Balsa.remove()) once no logger holds find_caller()
+    if logger in _find_caller_loggers:
+        _find_caller_loggers.discard(logger)
+        if len(_find_caller_loggers) == 0 and logging.Logger.findCaller is find_caller:
+            logging.Logger.findCaller = _held_find_caller  # type: ignore
+
+
+def set_caller_info(logger: Union[logging.Logger, str], enabled: bool):
+    """
+    Turn caller info on or off for a logger and its descendants (e.g. for a logger that's only used in a hot loop), unless a descendant has its own setting.
+    Records get placeholders for the file name ("?"), line number (0) and function name ("?") when it's off.
+    :param logger: logger or logger name
+    :param enabled: True for caller info
+    """
+    global _caller_info_generation
+    install_find_caller()
+    if isinstance(logger, str):
+        logger = logging.getLogger(logger)
+    logger.balsa_caller_info = enabled  # type: ignore
+    _caller_info_generation += 1
+
+
+def _clear_caller_info(logger: logging.Logger):
+    # back to inheriting the caller info switch (e.g. for Balsa.remove())
+    global _caller_info_generation
+    if logger.__dict__.pop("balsa_caller_info", None) is not None:
+        _caller_info_generation += 1
+
+
+@contextmanager
+def caller_info(enabled: bool) -> Iterator[None]:
+    """
+    Turn caller info on or off for a region of code (e.g. with caller_info(False): ...), for all loggers. Applies to the current thread (or async task) only.
+    :param enabled: True for caller info
+    """
+    install_find_caller()
+    token = _caller_info_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        _caller_info_enabled.reset(token)
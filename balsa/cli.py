@@ -0,0 +1,123 @@
+import argparse
+import json
+import logging
+import sys
+from collections import Counter
+from operator import add
+from typing import List, Union, Tuple
+
+from balsa.__version__ import __application_name__, __version__
+from balsa.structured import BalsaRecord, parse_time_stamp
+from balsa.parallel import iter_records_parallel, reduce_records_parallel
+from balsa.query import RecordFilter, query_records
+from balsa.export import export_records, default_partition_seconds
+from balsa.reader import iter_record_strings
+from balsa.merge import iter_merged_records, iter_merged_record_strings
+
+
+def _record_as_json(record: BalsaRecord) -> str:
+    return json.dumps(record.as_dict())
+
+
+def _count_level(level_counts: Counter, record: BalsaRecord) -> Counter:
+    level_counts[logging.getLevelName(record.log_level)] += 1
+    return level_counts
+
+
+def _parse_command(args: argparse.Namespace):
+    if args.count:
+        level_counts = reduce_records_parallel(args.path, _count_level, add, Counter(), args.workers, args.log_extension)
+        print(json.dumps(dict(level_counts)))
+    else:
+        for json_string in iter_records_parallel(args.path, _record_as_json, args.workers, args.log_extension):
+            sys.stdout.write(f"{json_string}\n")
+
+
+def _parse_key_value(key_value: str) -> Tuple[str, str]:
+    key, separator, value = key_value.partition("=")
+    if len(separator) == 0:
+        raise argparse.ArgumentTypeError(f'"{key_value}" is not KEY=VALUE')
+    return key, value
+
+
+def _parse_level(level_name: str) -> int:
+    if not isinstance(level := logging.getLevelName(level_name.upper()), int):
+        raise argparse.ArgumentTypeError(f'"{level_name}" is not a log level')
+    return level
+
+
+def _query_command(args: argparse.Namespace):
+    record_filter = RecordFilter(args.level, args.name, args.process, args.start, args.end, dict(args.key))
+    for record in query_records(args.path, record_filter, args.workers, args.log_extension, build_index=args.build_index):
+        sys.stdout.write(f"{_record_as_json(record) if args.json else str(record)}\n")
+
+
+def _export_command(args: argparse.Namespace):
+    record_count = export_records(args.path, args.archive, args.partition_seconds, args.log_extension)
+    print(f"exported {record_count} records to {args.archive}")
+
+
+def _text_command(args: argparse.Namespace):
+    for record_string in iter_record_strings(args.path, args.log_extension):
+        sys.stdout.write(f"{record_string}\n")
+
+
+def _merge_command(args: argparse.Namespace):
+    if args.json:
+        for record in iter_merged_records(args.paths, args.log_extension):
+            sys.stdout.write(f"{_record_as_json(record)}\n")
+    else:
+        for record_string in iter_merged_record_strings(args.paths, args.log_extension):
+            sys.stdout.write(f"{record_string}\n")
+
+
+def main(argv: Union[List[str], None] = None):
+    """
+    Balsa command line, e.g. "python -m balsa parse my_log_directory" or "python -m balsa query my_log_directory --level ERROR"
+    :param argv: command line arguments (None for sys.argv)
+    """
+    parser = argparse.ArgumentParser(prog=f"python -m {__application_name__}", description="Balsa log tools")
+    parser.add_argument("--version", action="version", version=__version__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="parse log files (using multiple processes) and output the records as JSON Lines")
+    parse_parser.add_argument("path", help="log file or directory of log files")
+    parse_parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default is one per CPU)")
+    parse_parser.add_argument("--count", action="store_true", help="only output the number of records at each level")
+    parse_parser.add_argument("--log_extension", default=".log", help="log file extension")
+    parse_parser.set_defaults(func=_parse_command)
+
+    query_parser = subparsers.add_parser("query", help="output the log records that match a query")
+    query_parser.add_argument("path", help="log file or directory of log files")
+    query_parser.add_argument("--level", type=_parse_level, default=logging.NOTSET, help="only records at or above this level (e.g. WARNING)")
+    query_parser.add_argument("--name", help="only records from this logger (or its children)")
+    query_parser.add_argument("--process", help="only records from this process name")
+    query_parser.add_argument("--start", type=parse_time_stamp, help="only records at or after this time (ISO 8601, local time if no UTC offset)")
+    query_parser.add_argument("--end", type=parse_time_stamp, help="only records before this time (ISO 8601, local time if no UTC offset)")
+    query_parser.add_argument("--key", type=_parse_key_value, action="append", default=[], help="only structured records with KEY=VALUE (can be repeated)")
+    query_parser.add_argument("--json", action="store_true", help="output JSON Lines (default is the log text)")
+    query_parser.add_argument("--workers", type=int, default=None, help="number of worker processes for a scan (default is one per CPU)")
+    query_parser.add_argument("--build_index", action="store_true", help="build (and save) the missing log indexes, for faster queries later")
+    query_parser.add_argument("--log_extension", default=".log", help="log file extension")
+    query_parser.set_defaults(func=_query_command)
+
+    export_parser = subparsers.add_parser("export", help="export log records to a columnar archive (e.g. for numpy or pandas)")
+    export_parser.add_argument("path", help="log file or directory of log files")
+    export_parser.add_argument("archive", help="archive directory")
+    export_parser.add_argument("--partition_seconds", type=float, default=default_partition_seconds, help="time partition size in seconds")
+    export_parser.add_argument("--log_extension", default=".log", help="log file extension")
+    export_parser.set_defaults(func=_export_command)
+
+    text_parser = subparsers.add_parser("text", help="output log records in the text format (e.g. to convert binary log files to text)")
+    text_parser.add_argument("path", help="log file or directory of log files")
+    text_parser.add_argument("--log_extension", default=".log", help="log file extension")
+    text_parser.set_defaults(func=_text_command)
+
+    merge_parser = subparsers.add_parser("merge", help="merge log files (e.g. from balsa_clone instances) into one time line")
+    merge_parser.add_argument("paths", nargs="+", help="log files and/or directories of log files")
+    merge_parser.add_argument("--json", action="store_true", help="output JSON Lines (default is the log text)")
+    merge_parser.add_argument("--log_extension", default=".log", help="log file extension")
+    merge_parser.set_defaults(func=_merge_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
@@ -0,0 +1,314 @@
+import ast
+import json
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+from typing import Union, Dict, List, Any, Iterator
+
+from balsa.structured import BalsaRecord
+from balsa.reader import iter_records
+from balsa.index import _to_seconds
+
+# numpy is optional - it's only needed to load the archive columns as (memory mapped) numpy arrays
+try:
+    import numpy
+
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+# A columnar archive is a directory of time partitions (e.g. one per hour), each with one or more parts. A part is a directory with one file per column:
+#   - numeric columns are .npy files (the numpy file format, written with the standard library), so they can be memory mapped with numpy.load(mmap_mode="r")
+#   - low cardinality string columns (logger name, process name, etc.) are dictionary encoded: a .npy file of int32 codes plus a JSON list of the strings
+#   - the message column is a .npy file of int64 byte offsets into a UTF-8 file of all the messages
+#   - structured record (from sf()) keys are flattened (e.g. {"a": {"b": 1}} is column "structured.a.b") and are float64 if all the values in the part are
+#     numbers (NaN if missing), otherwise dictionary encoded (code -1 if missing, non-string values as JSON)
+# metadata.json has the record count, time range and column kinds.
+
+default_partition_seconds = 3600.0
+default_max_part_records = 1000000
+
+archive_metadata_file_name = "metadata.json"
+structured_column_prefix = "structured."
+
+_numeric_kind = "numeric"
+_dictionary_kind = "dictionary"
+_text_kind = "text"
+
+_npy_magic = b"\x93NUMPY"
+_npy_descrs = {"d": "<f8", "H": "<u2", "i": "<i4", "q": "<i8"}  # array type code to numpy dtype descr
+_npy_type_codes = {descr: type_code for type_code, descr in _npy_descrs.items()}
+
+
+def _write_npy(path: Path, values: array):
+    """
+    Write a 1-D array in the numpy .npy format (version 1.0), without needing numpy.
+    :param path: file path
+    :param values: values (array type code "d", "H", "i" or "q")
+    """
+    header = f"{{'descr': '{_npy_descrs[values.typecode]}', 'fortran_order': False, 'shape': ({len(values)},), }}"
+    header += " " * (63 - (len(_npy_magic) + 4 + len(header)) % 64) + "\n"  # data is 64 byte aligned
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    with path.open("wb") as npy_file:
+        npy_file.write(_npy_magic + b"\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        values.tofile(npy_file)
+
+
+def _read_npy(path: Path) -> array:
+    """
+    Read a 1-D .npy file written by _write_npy(), without needing numpy.
+    :param path: file path
+    :return: values
+    """
+    npy_bytes = path.read_bytes()
+    if not npy_bytes.startswith(_npy_magic):
+        raise ValueError(f"{path} is not a .npy file")
+    if npy_bytes[len(_npy_magic)] == 1:
+        (header_length,) = struct.unpack_from("<H", npy_bytes, len(_npy_magic) + 2)
+        data_start = len(_npy_magic) + 4 + header_length
+    else:
+        (header_length,) = struct.unpack_from("<I", npy_bytes, len(_npy_magic) + 2)
+        data_start = len(_npy_magic) + 6 + header_length
+    header = ast.literal_eval(npy_bytes[data_start - header_length : data_start].decode("latin1"))
+    values = array(_npy_type_codes[header["descr"]])
+    values.frombytes(npy_bytes[data_start:])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _column_file_name(column_name: str, suffix: str) -> str:
+    return f"{quote(column_name, safe=' ._-')}{suffix}"  # structured record keys can have any characters
+
+
+def _flatten(structured_record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flattened = {}
+    for key, value in structured_record.items():
+        if isinstance(value, dict) and len(value) > 0:
+            flattened.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flattened[f"{prefix}{key}"] = value
+    return flattened
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _DictionaryColumn:
+    def __init__(self):
+        self.codes = array("i")
+        self.dictionary = {}  # type: Dict[str, int]
+
+    def encode(self, value: str) -> int:
+        if (code := self.dictionary.get(value)) is None:
+            code = self.dictionary[value] = len(self.dictionary)
+        return code
+
+    def append(self, value: str):
+        self.codes.append(self.encode(value))
+
+    def write(self, part_path: Path, column_name: str):
+        _write_npy(Path(part_path, _column_file_name(column_name, ".npy")), self.codes)
+        Path(part_path, _column_file_name(column_name, ".json")).write_text(json.dumps(list(self.dictionary)), encoding="utf-8")
+
+
+class _PartWriter:
+    """
+    Columns of one archive part, in memory until the part is written.
+    """
+
+    def __init__(self):
+        self.time_stamps = array("d")
+        self.log_levels = array("H")
+        self.line_numbers = array("i")
+        self.dictionary_columns = {column_name: _DictionaryColumn() for column_name in ["name", "process_name", "file_name", "function_name"]}
+        self.message_offsets = array("q", [0])
+        self.messages = bytearray()
+        self.structured = {}  # type: Dict[str, Dict[int, Any]]  # column name to {row: value}, since most keys are only in some of the records
+
+    def __len__(self) -> int:
+        return len(self.time_stamps)
+
+    def add(self, record: BalsaRecord):
+        row = len(self.time_stamps)
+        self.time_stamps.append(record.time_stamp.timestamp())
+        self.log_levels.append(record.log_level)
+        self.line_numbers.append(record.line_number)
+        for column_name, dictionary_column in self.dictionary_columns.items():
+            dictionary_column.append(getattr(record, column_name))
+        self.messages += record.message.encode("utf-8")
+        self.message_offsets.append(len(self.messages))
+        for key, value in _flatten(record.structured_record).items():
+            self.structured.setdefault(f"{structured_column_prefix}{key}", {})[row] = value
+
+    def write(self, part_path: Path):
+        part_path.mkdir(parents=True)
+        columns = {"time_stamp": _numeric_kind, "log_level": _numeric_kind, "line_number": _numeric_kind}
+        _write_npy(Path(part_path, "time_stamp.npy"), self.time_stamps)
+        _write_npy(Path(part_path, "log_level.npy"), self.log_levels)
+        _write_npy(Path(part_path, "line_number.npy"), self.line_numbers)
+        for column_name, dictionary_column in self.dictionary_columns.items():
+            dictionary_column.write(part_path, column_name)
+            columns[column_name] = _dictionary_kind
+        _write_npy(Path(part_path, "message.npy"), self.message_offsets)
+        Path(part_path, "message.utf8").write_bytes(self.messages)
+        columns["message"] = _text_kind
+
+        for column_name, values in self.structured.items():
+            if all(_is_number(value) for value in values.values()):
+                numeric_column = array("d", [math.nan]) * len(self)
+                for row, value in values.items():
+                    numeric_column[row] = value
+                _write_npy(Path(part_path, _column_file_name(column_name, ".npy")), numeric_column)
+                columns[column_name] = _numeric_kind
+            else:
+                dictionary_column = _DictionaryColumn()
+                dictionary_column.codes = array("i", [-1]) * len(self)
+                for row, value in values.items():
+                    dictionary_column.codes[row] = dictionary_column.encode(value if isinstance(value, str) else json.dumps(value))
+                dictionary_column.write(part_path, column_name)
+                columns[column_name] = _dictionary_kind
+
+        metadata = {"record_count": len(self), "start_time": min(self.time_stamps), "end_time": max(self.time_stamps), "columns": columns}
+        Path(part_path, archive_metadata_file_name).write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+
+
+class ColumnarArchiveWriter:
+    """
+    Write log records to a columnar archive (see above), streaming - only the parts being filled are in memory.
+    """
+
+    def __init__(self, archive_path: Union[Path, str], partition_seconds: float = default_partition_seconds, max_part_records: int = default_max_part_records):
+        """
+        :param archive_path: archive directory (records are added to an existing archive)
+        :param partition_seconds: time partition size
+        :param max_part_records: maximum number of records in one part (parts are held in memory until written)
+        """
+        self.archive_path = Path(archive_path)
+        self.partition_seconds = partition_seconds
+        self.max_part_records = max_part_records
+        self.part_writers = {}  # type: Dict[int, _PartWriter]
+        self.record_count = 0
+
+    def _write_part(self, partition: int):
+        partition_path = Path(self.archive_path, datetime.fromtimestamp(partition * self.partition_seconds, timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
+        part_number = len(list(partition_path.glob("part_*"))) if partition_path.exists() else 0
+        self.part_writers.pop(partition).write(Path(partition_path, f"part_{part_number:05d}"))
+
+    def add(self, record: BalsaRecord):
+        """
+        Add a record. Records are expected to be in (roughly) time order, e.g. from iter_records(). A record for a partition that was already written goes in a
+        new part.
+        :param record: record (invalid records are skipped)
+        """
+        if not record.valid:
+            return
+        partition = int(record.time_stamp.timestamp() // self.partition_seconds)
+        if (part_writer := self.part_writers.get(partition)) is None:
+            # write the parts of partitions that are done, keeping the previous one open for records that are slightly out of order (e.g. from threads)
+            for done_partition in [open_partition for open_partition in self.part_writers if open_partition < partition - 1]:
+                self._write_part(done_partition)
+            part_writer = self.part_writers[partition] = _PartWriter()
+        part_writer.add(record)
+        self.record_count += 1
+        if len(part_writer) >= self.max_part_records:
+            self._write_part(partition)
+
+    def close(self):
+        for partition in sorted(self.part_writers):
+            self._write_part(partition)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def export_records(
+    path: Union[Path, str], archive_path: Union[Path, str], partition_seconds: float = default_partition_seconds, log_extension: str = ".log"
+) -> int:
+    """
+    Export log files to a columnar archive, e.g. for analysis with numpy or pandas.
+    :param path: a log file, or a directory of log files
+    :param archive_path: archive directory
+    :param partition_seconds: time partition size
+    :param log_extension: log file extension
+    :return: number of records exported
+    """
+    with ColumnarArchiveWriter(archive_path, partition_seconds) as archive_writer:
+        for record in iter_records(path, log_extension):
+            archive_writer.add(record)
+    return archive_writer.record_count
+
+
+class ArchivePart:
+    """
+    One part of a columnar archive.
+    """
+
+    def __init__(self, part_path: Union[Path, str]):
+        self.path = Path(part_path)
+        self.metadata = json.loads(Path(self.path, archive_metadata_file_name).read_text(encoding="utf-8"))
+        self.record_count = self.metadata["record_count"]  # type: int
+        self.start_time = self.metadata["start_time"]  # type: float
+        self.end_time = self.metadata["end_time"]  # type: float
+        self.columns = self.metadata["columns"]  # type: Dict[str, str]
+
+    def array(self, column_name: str, mmap: bool = True) -> Any:
+        """
+        Get a numeric column, or the codes of a dictionary encoded column, or the message byte offsets.
+        :param column_name: column name
+        :param mmap: True to memory map the column (i.e. zero copy)
+        :return: numpy array if numpy is installed, otherwise an array.array (a copy)
+        """
+        npy_path = Path(self.path, _column_file_name(column_name, ".npy"))
+        if numpy_available:
+            return numpy.load(npy_path, mmap_mode="r" if mmap else None)
+        return _read_npy(npy_path)
+
+    def dictionary(self, column_name: str) -> List[str]:
+        """
+        Get the strings of a dictionary encoded column (index with the column's codes).
+        :param column_name: column name
+        :return: list of strings
+        """
+        return json.loads(Path(self.path, _column_file_name(column_name, ".json")).read_text(encoding="utf-8"))
+
+    def strings(self, column_name: str) -> List[Union[str, None]]:
+        """
+        Get a dictionary encoded column or the message column as strings.
+        :param column_name: column name
+        :return: list of strings (None where a structured column is missing)
+        """
+        if self.columns[column_name] == _text_kind:
+            offsets = _read_npy(Path(self.path, _column_file_name(column_name, ".npy")))
+            text = Path(self.path, _column_file_name(column_name, ".utf8")).read_bytes()
+            return [text[offsets[row] : offsets[row + 1]].decode("utf-8") for row in range(self.record_count)]
+        dictionary = self.dictionary(column_name)
+        return [None if code < 0 else dictionary[code] for code in _read_npy(Path(self.path, _column_file_name(column_name, ".npy")))]
+
+
+def iter_archive_parts(
+    archive_path: Union[Path, str], start_time: Union[datetime, float, None] = None, end_time: Union[datetime, float, None] = None
+) -> Iterator[ArchivePart]:
+    """
+    Get the parts of a columnar archive, in time order.
+    :param archive_path: archive directory
+    :param start_time: only parts with records at or after this time (datetime or seconds since the epoch)
+    :param end_time: only parts with records before this time (datetime or seconds since the epoch)
+    :return: iterator of archive parts
+    """
+    start_seconds = _to_seconds(start_time)
+    end_seconds = _to_seconds(end_time)
+    for metadata_path in sorted(Path(archive_path).glob(f"*/part_*/{archive_metadata_file_name}")):
+        archive_part = ArchivePart(metadata_path.parent)
+        if (start_seconds is None or archive_part.end_time >= start_seconds) and (end_seconds is None or archive_part.start_time < end_seconds):
+            yield archive_part
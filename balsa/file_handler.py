@@ -0,0 +1,659 @@
+import os
+import sys
+import shutil
+import logging
+import logging.handlers
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from multiprocessing.util import Finalize
+from typing import Union, List, Iterator
+
+from balsa.index import LogIndexWriter, get_index_path, index_extension
+from balsa.fork import register_fork_aware
+from balsa.binary_format import BinaryRecordEncoder
+from balsa.reader import compression_extensions, _compression_modules, get_rotated_sets, segment_time_format
+
+try:
+    import fcntl  # POSIX
+
+    def _lock(fd: int, exclusive: bool):
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _unlock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+except ImportError:
+    import msvcrt  # Windows (no shared locks, so writes are serialized too)
+
+    def _lock(fd: int, exclusive: bool):
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # type: ignore
+                return
+            except OSError:
+                pass  # LK_LOCK gives up after 10 seconds
+
+    def _unlock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)  # type: ignore
+
+# how often the flush thread checks whether it's been stopped while it waits for the handler lock
+flush_lock_timeout = 0.1
+
+# (in the lock file of a log file shared after a fork) the number of rollovers, so each process can find a backup after another process has renumbered it
+_rollover_count_struct = struct.Struct("<Q")
+
+
+def _rotate_file(source: Path, destination: Path):
+    if source.exists():
+        source.replace(destination)
+
+
+class BalsaRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that formats and encodes each record only once (the standard library RotatingFileHandler formats each record twice - once to check
+    for rollover and again to write it) and counts the bytes written instead of calling stream.tell(). It can also keep the log file's index up to date (see
+    balsa.index), compress the rotated backups, and name the rotated backups by timestamp so rollover is a single rename.
+    """
+
+    def __init__(
+        self,
+        filename: Path,
+        max_bytes: int = 0,
+        backup_count: int = 0,
+        index: bool = False,
+        compression: Union[str, None] = None,
+        timestamp_segments: bool = False,
+        encoding: str = "utf-8",
+        buffer_size: int = 0,
+        flush_interval: float = 1.0,
+        flush_level: int = logging.ERROR,
+        binary: bool = False,
+    ):
+        """
+        :param filename: log file path
+        :param max_bytes: roll over when the log file would reach this size (same as RotatingFileHandler's maxBytes)
+        :param backup_count: number of rotated backups to keep (same as RotatingFileHandler's backupCount)
+        :param index: True to keep a log index (sidecar file) up to date as records are written
+        :param compression: compress rotated backups with "gzip", "bz2" or "lzma" (or None to not compress them). Compression is done by a background thread so
+        rollover doesn't wait for it.
+        :param timestamp_segments: True to name rotated backups by the (UTC) rollover time (e.g. my_app.log.20231114T221320123456) instead of renumbering all
+        the backups (e.g. my_app.log.1 to my_app.log.2) on every rollover
+        :param encoding: log file encoding
+        :param buffer_size: buffer up to this many bytes of records and write them all at once, instead of writing (and flushing) each record (0 for no
+        buffering)
+        :param flush_interval: with buffering, write the buffer at least this often (in seconds)
+        :param flush_level: with buffering, write the buffer right away when a record at or above this level is logged (e.g. so errors are not lost on a crash)
+        :param binary: True to write the compact binary log format (see balsa.binary_format) instead of text. Each log file (segment) is readable on its own.
+        """
+        if compression is not None and compression not in compression_extensions:
+            raise ValueError(f'compression "{compression}" is not one of {list(compression_extensions)}')
+        if binary and index:
+            raise ValueError("binary log files are not indexed")
+        self.binary_encoder = BinaryRecordEncoder() if binary else None
+        self._header_size = 0  # binary segment header written by _open()
+        self.bytes_written = 0  # size of the log file, kept up to date as records are written
+        self.regular_file = True  # rollover only makes sense for a regular file (e.g. not /dev/null)
+        self.newline = os.linesep  # text log files have the platform's line endings, the same as a file written in text mode (e.g. "\r\n" on Windows)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer = []  # type: List[bytes]  # encoded records not yet written to the file (bytes_written includes them)
+        self._buffered_bytes = 0
+        self._flush_time = time.monotonic()
+        # lock file for coordinating rollover with the other processes writing to the same log file (see BalsaSharedFileHandler, and after a fork)
+        self.lock_path = Path(f"{Path(filename).absolute()}.lock")
+        self._lock_fd = None  # type: Union[int, None]
+        self._lock_pid = None  # type: Union[int, None]  # (a forked process needs its own lock file descriptor, since flock() locks are shared with the parent)
+        self._file_locked = False  # this process holds the lock file's lock
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.index_writer = LogIndexWriter(self.baseFilename) if index else None
+        self.timestamp_segments = timestamp_segments
+
+        # After os.fork(), the parent and the child both append to the log file. Then each binary write starts over with a new dictionary (see
+        # balsa.binary_format), and the index is left for the readers to bring up to date (see update_index()). Whichever process first finds the log file full
+        # rolls it over, coordinated through the lock file like BalsaSharedFileHandler: writes hold a shared lock and rollover holds an exclusive lock, so no
+        # process writes to a log file after it has been rotated (e.g. while it's compressed).
+        self._shared_by_fork = False
+        self._binary_restart_pending = False  # the next record encoded starts a new write
+
+        self.compression_extension = None if compression is None else compression_extensions[compression]
+        # The rotated backups that still need to be compressed. Rollover renames the backups, so rollover and compression share this lock, but the compression
+        # itself is done without holding it (so rollover never waits for it). A numbered backup is moved to a private name (that rollover doesn't renumber) while
+        # it's compressed. Every rollover renumbers all the numbered backups, so a numbered backup is kept track of by the rollover that made it (see
+        # _numbered_backup_path()). Timestamp segments are never renamed, so they're kept track of by their path.
+        self._compression_condition = threading.Condition()
+        self._compression_pending = []  # type: List[Union[Path, int]]
+        self._compressing = None  # type: Union[Path, None]
+        self._compression_thread = None  # type: Union[threading.Thread, None]
+        self._compression_finalizer = None  # type: Union[Finalize, None]
+        self._compression_closing = False
+        self._rollover_count = 0
+        if self.compression_extension is not None:
+            # finish compressing the backups of a previous run
+            for backup_path in self._get_backup_paths():
+                if backup_path.suffix not in _compression_modules:
+                    if self.timestamp_segments:
+                        self._compression_pending.append(backup_path)
+                    elif (backup_number := backup_path.name.rsplit(".", 1)[-1]).isdigit():
+                        self._compression_pending.append(self._rollover_count + 1 - int(backup_number))
+            self._start_compression()
+
+        self._flush_thread_stop = threading.Event()
+        self._flush_thread = None  # type: Union[threading.Thread, None]
+        self._flush_finalizer = None  # type: Union[Finalize, None]
+        if self.buffer_size > 0:
+            self._start_flush_thread()
+        register_fork_aware(self)
+
+    def _start_flush_thread(self):
+        # write the buffer when nothing has been logged for a while (started again on first use in a forked process)
+        self._flush_thread = threading.Thread(target=self._flush_worker, name=f"{Path(self.baseFilename).name} flush", daemon=True)
+        self._flush_thread.start()
+        # A multiprocessing child process exits with os._exit(), which doesn't run atexit (or logging.shutdown()), but does run multiprocessing finalizers. A
+        # forked child starts with no finalizers, so this is registered by whichever process starts the flush thread (e.g. a handler created in run()).
+        self._flush_finalizer = Finalize(self, self.flush, exitpriority=5)
+
+    def _before_fork(self):
+        self.acquire()  # so the child doesn't get a copy of the stream part way through a write (which can deadlock, or write a record twice)
+        self._write_buffer()  # (the buffered binary records depend on the ones before them, and the child may write to the log file first)
+        if not self._shared_by_fork and self.compression_extension is not None:
+            # from now on the processes keep the rollover count in the lock file
+            lock_fd = self._file_lock(exclusive=True)
+            try:
+                os.pwrite(lock_fd, _rollover_count_struct.pack(self._rollover_count), 0)
+            finally:
+                _unlock(lock_fd)
+
+    def _after_fork_in_parent(self):
+        self._share_log_file()
+        self.release()
+
+    def _after_fork_in_child(self):
+        # The parent compresses the backups it has rolled over (anything buffered was written before the fork). The child's threads are started when they're
+        # needed.
+        self._at_fork_reinit()
+        self._share_log_file()
+        self._file_locked = False
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        self._flush_time = time.monotonic()
+        self._flush_thread_stop = threading.Event()
+        self._flush_thread = None
+        self._flush_finalizer = None  # (the child has none of the parent's finalizers)
+        self._compression_condition = threading.Condition()
+        self._compression_pending = []
+        self._compressing = None
+        self._compression_thread = None
+        self._compression_finalizer = None
+        self._compression_closing = False
+        if self.stream is not None:
+            self.bytes_written = os.fstat(self.stream.fileno()).st_size
+
+    def _share_log_file(self):
+        # (call with the handler lock held)
+        self._shared_by_fork = True
+        self._binary_restart_pending = True
+        if self.index_writer is not None:
+            # record offsets aren't known with more than one process writing, so readers index the rest of the log file (see update_index())
+            self.index_writer.close()
+            self.index_writer = None
+
+    def _file_lock(self, exclusive: bool) -> int:
+        if self._lock_fd is None or self._lock_pid != os.getpid():
+            self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+            self._lock_pid = os.getpid()
+        _lock(self._lock_fd, exclusive)
+        return self._lock_fd
+
+    @contextmanager
+    def _fork_shared_lock(self, exclusive: bool) -> Iterator[None]:
+        # (call with the handler lock held) lock the lock file if the log file is shared after a fork (and this process doesn't already have it locked)
+        if not self._shared_by_fork or self._file_locked:
+            yield
+            return
+        lock_fd = self._file_lock(exclusive)
+        self._file_locked = True
+        try:
+            yield
+        finally:
+            self._file_locked = False
+            _unlock(lock_fd)
+
+    def _is_current(self) -> bool:
+        # False if another process has rotated the log file
+        try:
+            return os.path.samestat(os.fstat(self.stream.fileno()), os.stat(self.baseFilename))  # type: ignore
+        except FileNotFoundError:
+            return False
+
+    def _follow_rollover(self):
+        # (with the lock file locked) once another process has rolled the log file over, write to the new log file
+        if self.stream is not None and not self._is_current():
+            self.stream.close()
+            self.stream = self._open()
+            self._binary_restart_pending = True
+
+    def _shared_rollover(self, record_size: int):
+        # (call with the handler lock held) any of the processes sharing the log file after a fork can roll it over, and the exclusive lock makes sure only one does
+        with self._fork_shared_lock(exclusive=True):
+            self._follow_rollover()
+            self.bytes_written = os.fstat(self.stream.fileno()).st_size + self._buffered_bytes  # type: ignore
+            if self._should_rollover(record_size):
+                self.doRollover()
+
+    def _open(self):
+        # binary, since emit() encodes the records
+        stream = open(self.baseFilename, f"{self.mode}b")
+        stream.seek(0, os.SEEK_END)
+        self._header_size = 0
+        if self.binary_encoder is not None:
+            # a new segment (or continue the existing one, e.g. after a restart)
+            if len(header := self.binary_encoder.start_segment(self.baseFilename)) > 0:
+                stream.write(header)
+                stream.flush()
+                self._header_size = len(header)
+        self.bytes_written = stream.tell()
+        self.regular_file = os.path.isfile(self.baseFilename)
+        return stream
+
+    def _backup_path(self, backup_number: int, extension: str = "") -> Path:
+        return Path(self.rotation_filename(f"{self.baseFilename}.{backup_number}{extension}"))
+
+    def _get_backup_paths(self) -> List[Path]:
+        # rotated backups (not including the log file itself), oldest first
+        base_path = Path(self.baseFilename)
+        return [file_path for file_path in get_rotated_sets(base_path.parent, base_path.suffix).get(base_path.name, []) if file_path != base_path]
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        # emit() doesn't use this, since it checks for rollover with the record it has already formatted and encoded
+        return self._should_rollover(len(self._encode_text(record)))
+
+    def _should_rollover(self, record_size: int) -> bool:
+        # an empty log file is never rolled over (e.g. for a single record larger than max_bytes)
+        return self.maxBytes > 0 and self.backupCount > 0 and self.bytes_written > self._header_size and self.bytes_written + record_size >= self.maxBytes and self.regular_file
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                if self.mode == "w" and self._closed:  # type: ignore
+                    return  # closed (same as FileHandler)
+                self.stream = self._open()
+            if self._shared_by_fork:
+                self.bytes_written = os.fstat(self.stream.fileno()).st_size + self._buffered_bytes  # (including the other processes' records)
+            data = self._encode(record)
+            if self._should_rollover(len(data)):
+                if self._shared_by_fork:
+                    self._shared_rollover(len(data))
+                else:
+                    self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+                if self.binary_encoder is not None:
+                    self._binary_restart_pending = self._shared_by_fork  # (another process may write to the new log file first)
+                    data = self._encode(record)  # the new segment has its own dictionary
+            offset = self.bytes_written
+            if self.buffer_size > 0:
+                if self._flush_thread is None:
+                    self._start_flush_thread()
+                self._buffer.append(data)
+                self._buffered_bytes += len(data)
+                if self._buffered_bytes >= self.buffer_size or record.levelno >= self.flush_level or time.monotonic() - self._flush_time >= self.flush_interval:
+                    self._write_buffer()
+            else:
+                self._write_data(data)
+            self.bytes_written += len(data)
+            if self.index_writer is not None:
+                self.index_writer.add(record.created, offset, record.levelno)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _encode(self, record: logging.LogRecord) -> bytes:
+        if self.binary_encoder is not None:
+            if self._binary_restart_pending:
+                self._binary_restart_pending = False
+                return self.binary_encoder.restart() + self.binary_encoder.encode(record, self.formatter or logging.Formatter())
+            return self.binary_encoder.encode(record, self.formatter or logging.Formatter())
+        return self._encode_text(record)
+
+    def _encode_text(self, record: logging.LogRecord) -> bytes:
+        text = f"{self.format(record)}{self.terminator}"
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)  # the log file is opened in binary mode, so this is the newline translation that text mode would do
+        return text.encode(self.encoding, self.errors or "strict")  # type: ignore
+
+    def _write_data(self, data: bytes):
+        # (call with the handler lock held)
+        with self._fork_shared_lock(exclusive=False):
+            if self._shared_by_fork:
+                self._follow_rollover()
+            self.stream.write(data)  # type: ignore
+            self.stream.flush()  # type: ignore
+        self._binary_restart_pending = self._shared_by_fork
+
+    def _write_buffer(self):
+        # (call with the handler lock held)
+        if len(self._buffer) > 0 and self.stream is not None:
+            self._write_data(b"".join(self._buffer))  # one large write
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        self._flush_time = time.monotonic()
+
+    def flush(self):
+        with self.lock:  # type: ignore
+            self._write_buffer()
+        super().flush()
+
+    def _flush_worker(self):
+        while not self._flush_thread_stop.wait(self.flush_interval):
+            if time.monotonic() - self._flush_time >= self.flush_interval:
+                # close() waits for this thread, and logging.shutdown() holds the handler lock while it calls close(), so don't wait on the lock once stopped
+                while not self.lock.acquire(timeout=flush_lock_timeout):  # type: ignore
+                    if self._flush_thread_stop.is_set():
+                        return
+                try:
+                    self.flush()
+                finally:
+                    self.lock.release()  # type: ignore
+
+    def doRollover(self):
+        self._write_buffer()  # the buffered records belong in the file being rotated
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None  # type: ignore
+        if self.index_writer is not None:
+            self.index_writer.close()
+        if self.backupCount > 0:
+            with self._compression_condition:
+                if self.timestamp_segments:
+                    backup = self._rotate_segment()  # type: Union[Path, int]
+                else:
+                    if self._shared_by_fork and self.compression_extension is not None:
+                        self._rollover_count = _rollover_count_struct.unpack(os.pread(self._lock_fd, _rollover_count_struct.size, 0))[0]  # type: ignore
+                    self._rotate_numbered()
+                    self._rollover_count += 1
+                    if self._shared_by_fork and self.compression_extension is not None:
+                        os.pwrite(self._lock_fd, _rollover_count_struct.pack(self._rollover_count), 0)  # type: ignore
+                    backup = self._rollover_count
+                if self.compression_extension is not None:
+                    self._compression_pending.append(backup)
+                    self._compression_condition.notify()
+                    if self._compression_thread is None:
+                        self._start_compression()  # (e.g. in a forked process)
+        self.bytes_written = 0
+        if not self.delay:
+            self.stream = self._open()
+        if self.index_writer is not None:
+            self.index_writer = LogIndexWriter(self.baseFilename)
+
+    def _rotate_numbered(self):
+        """
+        Rotate like RotatingFileHandler (my_app.log.1 to my_app.log.2, etc., then my_app.log to my_app.log.1), along with the index files.
+        """
+        extensions = ["", index_extension] + ([] if self.compression_extension is None else [self.compression_extension])
+        for extension in extensions:
+            if (oldest_path := self._backup_path(self.backupCount, extension)).exists():
+                oldest_path.unlink()
+        for backup_number in range(self.backupCount - 1, 0, -1):
+            for extension in extensions:
+                _rotate_file(self._backup_path(backup_number, extension), self._backup_path(backup_number + 1, extension))
+        _rotate_file(Path(self.baseFilename), self._backup_path(1))
+        _rotate_file(get_index_path(self.baseFilename), get_index_path(self._backup_path(1)))
+
+    def _numbered_backup_path(self, rollover: int) -> Union[Path, None]:
+        """
+        Get the path of the numbered backup made by a rollover (every rollover since renumbers it).
+        :param rollover: the rollover count just after the backup was made
+        :return: the backup's path, or None if it has been deleted as the oldest backup
+        """
+        backup_number = self._rollover_count + 1 - rollover
+        return self._backup_path(backup_number) if backup_number <= self.backupCount else None
+
+    def _rotate_segment(self) -> Path:
+        """
+        Rename the log file to a timestamp segment (a single rename), then delete the oldest segments beyond the backup count.
+        :return: the new segment's path
+        """
+        segment_time = datetime.now(timezone.utc)
+        while (segment_path := Path(self.rotation_filename(f"{self.baseFilename}.{segment_time.strftime(segment_time_format)}"))).exists():
+            segment_time = segment_time.replace(microsecond=(segment_time.microsecond + 1) % 1000000)  # more than one rollover in the same microsecond
+        _rotate_file(Path(self.baseFilename), segment_path)
+        _rotate_file(get_index_path(self.baseFilename), get_index_path(segment_path))
+        self._delete_old_segments()
+        return segment_path
+
+    def _delete_old_segments(self):
+        # delete the oldest segments beyond the backup count (call with the compression lock held)
+        backup_paths = self._get_backup_paths()
+        for backup_path in backup_paths[: max(len(backup_paths) - self.backupCount, 0)]:
+            if backup_path != self._compressing:  # otherwise it's deleted once it's compressed
+                backup_path.unlink()
+                if (index_path := get_index_path(backup_path)).exists():
+                    index_path.unlink()
+                if backup_path in self._compression_pending:
+                    self._compression_pending.remove(backup_path)
+
+    def _start_compression(self):
+        self._compression_thread = threading.Thread(target=self._compression_worker, name=f"{Path(self.baseFilename).name} compression", daemon=True)
+        self._compression_thread.start()
+        # finish compressing when a multiprocessing child process exits (see _start_flush_thread())
+        self._compression_finalizer = Finalize(self, self._stop_compression, exitpriority=5)
+
+    @contextmanager
+    def _rollover_lock(self) -> Iterator[None]:
+        # (for the compression worker) hold off rollover - in the other processes too if the log file is shared after a fork - and get the rollover count
+        lock_fd = None  # type: Union[int, None]
+        if self._shared_by_fork:
+            lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)  # (its own lock file descriptor, since the handler's may be locked by emit())
+            _lock(lock_fd, True)
+        try:
+            with self._compression_condition:
+                if lock_fd is not None:
+                    self._rollover_count = _rollover_count_struct.unpack(os.pread(lock_fd, _rollover_count_struct.size, 0))[0]
+                yield
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)  # (also unlocks)
+
+    def _compression_worker(self):
+        while True:
+            with self._compression_condition:
+                while len(self._compression_pending) == 0 and not self._compression_closing:
+                    self._compression_condition.wait()
+                if len(self._compression_pending) == 0:
+                    break
+                if self.timestamp_segments:
+                    backup_path = self._compression_pending.pop(0)  # type: ignore
+                    if not backup_path.exists():
+                        continue
+                    self._compressing = backup_path
+            if self.timestamp_segments:
+                if (temporary_path := self._compress(backup_path)) is not None:
+                    self._replace_with_compressed(backup_path, temporary_path)
+                with self._compression_condition:
+                    self._compressing = None
+                    self._delete_old_segments()  # (in case it was one of the oldest when the log was rolled over)
+            else:
+                with self._rollover_lock():
+                    rollover = self._compression_pending.pop(0)  # type: ignore
+                    if (backup_path := self._numbered_backup_path(rollover)) is None or not backup_path.exists():  # type: ignore
+                        continue
+                    _rotate_file(backup_path, self._compressing_path)
+                temporary_path = self._compress(self._compressing_path)
+                with self._rollover_lock():
+                    if (backup_path := self._numbered_backup_path(rollover)) is None:  # type: ignore
+                        # deleted as the oldest backup while it was compressed
+                        self._compressing_path.unlink(missing_ok=True)
+                        if temporary_path is not None:
+                            temporary_path.unlink(missing_ok=True)
+                    elif temporary_path is None:
+                        _rotate_file(self._compressing_path, backup_path)  # put it back uncompressed
+                    else:
+                        self._replace_with_compressed(backup_path, temporary_path, self._compressing_path)
+
+    @property
+    def _compressing_path(self) -> Path:
+        # private name for the numbered backup this process is compressing (not a log file name, so readers and rollover don't see it)
+        return Path(f"{self.baseFilename}.{os.getpid()}.compressing")
+
+    def _compress(self, source_path: Path) -> Union[Path, None]:
+        """
+        Compress a backup to a temporary file (so a partially compressed file is never read as a backup).
+        :param source_path: backup to compress
+        :return: the temporary compressed file, or None if it couldn't be compressed
+        """
+        assert self.compression_extension is not None
+        temporary_path = Path(f"{source_path}{self.compression_extension}.tmp")
+        try:
+            with source_path.open("rb") as backup_file, _compression_modules[self.compression_extension].open(temporary_path, "wb") as compressed_file:  # type: ignore
+                shutil.copyfileobj(backup_file, compressed_file, 1024 * 1024)
+            return temporary_path
+        except OSError as e:
+            print(f"could not compress {source_path} : {e}", file=sys.stderr)  # can't log it - this is the log
+            return None
+
+    def _replace_with_compressed(self, backup_path: Path, temporary_path: Path, source_path: Union[Path, None] = None):
+        """
+        Replace an uncompressed backup with its compressed version.
+        :param backup_path: backup path (the compressed backup is this path plus the compression extension)
+        :param temporary_path: compressed file from _compress()
+        :param source_path: the uncompressed file, if it's not at backup_path
+        """
+        assert self.compression_extension is not None
+        try:
+            temporary_path.replace(Path(f"{backup_path}{self.compression_extension}"))
+            (backup_path if source_path is None else source_path).unlink(missing_ok=True)  # (another process may have deleted it as the oldest)
+            index_path = get_index_path(backup_path)  # offsets in the index are for the uncompressed file
+            if index_path.exists():
+                index_path.unlink()
+        except OSError as e:
+            print(f"could not compress {backup_path} : {e}", file=sys.stderr)
+
+    def close(self):
+        if self._flush_finalizer is not None:
+            self._flush_finalizer.cancel()
+            self._flush_finalizer = None
+        if self._flush_thread is not None:
+            self._flush_thread_stop.set()
+            if self._flush_thread is not threading.current_thread():
+                self._flush_thread.join()
+            self._flush_thread = None
+        with self.lock:  # type: ignore
+            self._write_buffer()  # (logging.shutdown() flushes and closes all handlers at exit, so nothing buffered is lost on a normal exit)
+            if self.index_writer is not None:
+                self.index_writer.close()
+        self._stop_compression()
+        super().close()
+        if self._lock_fd is not None and self._lock_pid == os.getpid():
+            os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def _stop_compression(self):
+        # finish compressing (e.g. at exit), so there are no partially compressed files left
+        if self._compression_finalizer is not None:
+            self._compression_finalizer.cancel()
+            self._compression_finalizer = None
+        if self._compression_thread is not None:
+            with self._compression_condition:
+                self._compression_closing = True
+                self._compression_condition.notify()
+            if self._compression_thread is not threading.current_thread():
+                self._compression_thread.join()
+            self._compression_thread = None
+
+
+class BalsaSharedFileHandler(BalsaRotatingFileHandler):
+    """
+    Rotating file handler for a log file that's shared by several processes (e.g. the same Balsa name, without instance_name), with no central process. Each
+    record is written with a single O_APPEND write, so records from different processes are never interleaved. Rollover is coordinated through a lock file
+    (e.g. my_app.log.lock): writers hold a shared lock, and rollover holds an exclusive lock, so no process writes to a log file after it has been rotated.
+    Rollover is done by whichever process first finds the log file full. A log file can go over max_bytes by up to one record per process.
+    """
+
+    def __init__(
+        self,
+        filename: Path,
+        max_bytes: int = 0,
+        backup_count: int = 0,
+        timestamp_segments: bool = False,
+        encoding: str = "utf-8",
+        buffer_size: int = 0,
+        flush_interval: float = 1.0,
+        flush_level: int = logging.ERROR,
+    ):
+        """
+        :param filename: log file path
+        :param max_bytes: roll over when the log file would reach this size (same as RotatingFileHandler's maxBytes)
+        :param backup_count: number of rotated backups to keep (same as RotatingFileHandler's backupCount)
+        :param timestamp_segments: True to name rotated backups by the (UTC) rollover time instead of renumbering all the backups on every rollover
+        :param encoding: log file encoding
+        :param buffer_size: buffer up to this many bytes of records and write them all at once (0 for no buffering)
+        :param flush_interval: with buffering, write the buffer at least this often (in seconds)
+        :param flush_level: with buffering, write the buffer right away when a record at or above this level is logged
+        """
+        # (indexes, compression and the binary format are per process state, so they can't be used with a shared log file)
+        super().__init__(filename, max_bytes, backup_count, timestamp_segments=timestamp_segments, encoding=encoding, buffer_size=buffer_size, flush_interval=flush_interval, flush_level=flush_level)
+
+    def _open(self):
+        # unbuffered, so each write() is a single O_APPEND write
+        stream = open(self.baseFilename, f"{self.mode}b", buffering=0)
+        self.regular_file = os.path.isfile(self.baseFilename)
+        return stream
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None and self.mode == "w" and self._closed:  # type: ignore
+                return  # closed (same as FileHandler)
+            data = self._encode(record)
+            if self.buffer_size > 0:
+                if self._flush_thread is None:
+                    self._start_flush_thread()
+                self._buffer.append(data)
+                self._buffered_bytes += len(data)
+                if self._buffered_bytes >= self.buffer_size or record.levelno >= self.flush_level or time.monotonic() - self._flush_time >= self.flush_interval:
+                    self._write_buffer()
+            else:
+                self._write(data)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _write_buffer(self):
+        # (call with the handler lock held)
+        if len(self._buffer) > 0:
+            data = b"".join(self._buffer)
+            self._buffer.clear()
+            self._write(data)
+        self._buffered_bytes = 0
+        self._flush_time = time.monotonic()
+
+    def _write(self, data: bytes):
+        # (call with the handler lock held)
+        if self.stream is not None and self.maxBytes > 0 and self.backupCount > 0:
+            self.bytes_written = os.fstat(self.stream.fileno()).st_size  # (including the other processes' records)
+            if self._should_rollover(len(data)):
+                lock_fd = self._file_lock(exclusive=True)
+                try:
+                    if self._is_current():  # (otherwise another process has just rolled it over)
+                        self.bytes_written = os.fstat(self.stream.fileno()).st_size
+                        if self._should_rollover(len(data)):
+                            self.doRollover()
+                finally:
+                    _unlock(lock_fd)
+        lock_fd = self._file_lock(exclusive=False)
+        try:
+            if self.stream is None or not self._is_current():
+                if self.stream is not None:
+                    self.stream.close()
+                self.stream = self._open()
+            self.stream.write(data)
+        finally:
+            _unlock(lock_fd)
@@ -0,0 +1,58 @@
+import os
+import sys
+import itertools
+import weakref
+from typing import List
+
+# Balsa's background machinery (worker threads, their locks, buffered records, network connections) doesn't survive os.fork() - only the thread that called
+# fork() exists in the child. Objects that own such machinery register here. Before a fork, _before_fork() is called (e.g. to hold a handler's lock, so no
+# other thread is part way through a write when the process is copied). After the fork, _after_fork_in_parent() is called in the parent (e.g. to release it),
+# and _after_fork_in_child() is called in the child to reinitialize locks, drop what was inherited from the parent (the parent still writes or sends it), and
+# arrange for worker threads to be restarted when they're next needed. Each of these methods is optional.
+
+_fork_aware = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary  # in the order they were registered
+_fork_aware_keys = itertools.count()
+_forking = []  # type: List[object]  # the objects that were told about the fork in progress, in order
+
+
+def register_fork_aware(instance: object):
+    """
+    Have an object's _before_fork(), _after_fork_in_parent() and _after_fork_in_child() methods called around os.fork() (e.g. by multiprocessing's "fork"
+    start method, or a pre-fork server like gunicorn). The object isn't kept alive by being registered.
+    :param instance: object with any of these methods
+    """
+    _fork_aware[next(_fork_aware_keys)] = instance
+
+
+def _call(instance: object, method_name: str):
+    if (method := getattr(instance, method_name, None)) is not None:
+        try:
+            method()
+        except Exception as e:
+            print(f"{method_name}() failed for {instance} : {e}", file=sys.stderr)  # can't log it - this is the logging
+
+
+def _before_fork():
+    global _forking
+    _forking = list(_fork_aware.values())
+    for instance in _forking:
+        _call(instance, "_before_fork")
+
+
+def _after_fork_in_parent():
+    global _forking
+    for instance in reversed(_forking):
+        _call(instance, "_after_fork_in_parent")
+    _forking = []
+
+
+def _after_fork_in_child():
+    global _forking
+    for instance in _forking:
+        _call(instance, "_after_fork_in_child")
+    _forking = []
+
+
+if hasattr(os, "register_at_fork"):  # (not on Windows, which doesn't fork)
+    # (registered after logging's own hooks, so handler locks have been reinitialized by logging before _after_fork_in_child() runs)
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child)
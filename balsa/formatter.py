@@ -1,16 +1,293 @@
-from typing import Union
+import re
+import math
+import json
+from operator import attrgetter
+from typing import Union, Tuple, Dict, Any, Callable
 from datetime import datetime
-from logging import Formatter, LogRecord
+from logging import Formatter, LogRecord, PercentStyle
+
+from yasf import structured_sentinel, sf_separate, convert_serializable_special_cases
+
+from balsa.structured_message import StructuredMessage, _escape_sentinel, _args_to_csv
+
+
+def _split_timestamp(timestamp: float) -> Tuple[int, int]:
+    """
+    Split a timestamp into whole seconds and microseconds, rounding the same way datetime.fromtimestamp() does (round half to even).
+    :param timestamp: seconds since the epoch
+    :return: seconds, microseconds
+    """
+    fraction, seconds = math.modf(timestamp)
+    microseconds = round(fraction * 1e6)
+    if microseconds >= 1000000:
+        microseconds -= 1000000
+        seconds += 1.0
+    elif microseconds < 0:
+        microseconds += 1000000
+        seconds -= 1.0
+    return int(seconds), microseconds
+
+
+# Structured fields can be given with sf() or lsf() in the message, or natively on the record with extra={"structured": {...}} (so they don't have to be serialized and
+# then parsed back). Each record's message and structured fields are worked out once and cached on the record, so all the handlers (file, console, string
+# list, JSON Lines, CloudWatch, etc.) share them. A handler's filter can replace the message (e.g. to redact it), so each cached value is only used while the
+# record's msg, args and native structured fields are still the same objects they were when it was cached. A filter that changes these objects in place (e.g.
+# a dict in args), or changes other record attributes (e.g. levelname), must make a new record instead (on Python 3.12+ a filter can return one).
+
+
+def _get_message_source(record: LogRecord) -> Tuple[Any, Any, Any]:
+    return record.msg, record.args, record.__dict__.get("structured")
+
+
+def _get_cached(record: LogRecord, name: str) -> Any:
+    """
+    Get a value cached on a record.
+    :param record: log record
+    :param name: cache attribute name
+    :return: the cached value, or None if there isn't one or the record's message has been replaced since
+    """
+    if (cached := record.__dict__.get(name)) is not None:
+        source, value = cached
+        if all(cached_part is part for cached_part, part in zip(source, _get_message_source(record))):
+            return value
+    return None
+
+
+def _set_cached(record: LogRecord, name: str, value: Any):
+    record.__dict__[name] = (_get_message_source(record), value)
+
+
+def _copy_cached(record: LogRecord, copy: LogRecord):
+    # for a copy of a record that renders the same but has its own msg and args (e.g. a snapshot with the message already rendered)
+    for name in ("balsa_structured", "balsa_message", "balsa_formatted", "balsa_json"):
+        if (value := _get_cached(record, name)) is not None:
+            _set_cached(copy, name, value)
+
+
+def get_structured(record: LogRecord) -> Tuple[str, Dict[str, Any]]:
+    """
+    Get a record's message (without any sf() structured part) and its structured fields.
+    :param record: log record
+    :return: message, structured fields
+    """
+    if (structured := _get_cached(record, "balsa_structured")) is not None:
+        return structured
+    if isinstance(record.msg, StructuredMessage) and not record.args:
+        message, structured_record = record.msg.get_parts()  # (no need to serialize and parse the structured fields)
+    elif structured_sentinel in (message := record.getMessage()):
+        args_string, kwargs_string = sf_separate(message)
+        try:
+            structured_record = json.loads(kwargs_string)  # type: ignore
+            message = "" if args_string is None else args_string
+        except (TypeError, json.JSONDecodeError):
+            structured_record = {}  # not from sf() - keep the whole message
+    else:
+        structured_record = {}
+    if (native_record := record.__dict__.get("structured")) is not None:
+        structured_record.update(native_record)
+    structured = (message, structured_record)
+    _set_cached(record, "balsa_structured", structured)
+    return structured
+
+
+def get_message(record: LogRecord) -> str:
+    """
+    Get a record's message as text, including its native structured fields (if any) in the same form as sf(), so BalsaRecord can parse it.
+    :param record: log record
+    :return: message
+    """
+    if (message := _get_cached(record, "balsa_message")) is None:
+        if record.__dict__.get("structured"):
+            args_string, structured_record = get_structured(record)
+            if len(args_string) > 0 and not isinstance(record.msg, StructuredMessage) and args_string == record.getMessage():
+                args_string = _args_to_csv((args_string,))  # a plain message (not from sf()), so escape and quote it the same as sf(message, ...)
+            kwargs_string = json.dumps({_escape_sentinel(key): _escape_sentinel(value) for key, value in structured_record.items()}, default=convert_serializable_special_cases)
+            message = " ".join(([args_string] if len(args_string) > 0 else []) + [structured_sentinel, kwargs_string, structured_sentinel])
+        else:
+            message = record.getMessage()
+        _set_cached(record, "balsa_message", message)
+    return message
 
 
 class BalsaFormatter(Formatter):
     """
     Format time in ISO 8601
+
+    Each record is formatted once per distinct format (e.g. once for the file, console and string list handlers, which all use the same format), and the result
+    is cached on the record for the other handlers (until a filter replaces the record's message - see _get_cached()).
     """
 
+    def __init__(self, *args, prefix: str = "", **kwargs):
+        """
+        :param args: logging.Formatter args (e.g. fmt)
+        :param prefix: prepended to every formatted record (e.g. "\r" or "\n" for the console), without formatting the record again
+        :param kwargs: logging.Formatter kwargs
+        """
+        super().__init__(*args, **kwargs)
+        self.prefix = prefix
+        self._cache_key = (type(self), type(self._style), self._fmt, self.datefmt)  # formatters with the same key give the same output
+
+    def format(self, record: LogRecord) -> str:
+        if (formatted := _get_cached(record, "balsa_formatted")) is None:
+            formatted = {}  # cache key to formatted record (without the prefix)
+            _set_cached(record, "balsa_formatted", formatted)
+        if (formatted_string := formatted.get(self._cache_key)) is None:
+            formatted_string = formatted[self._cache_key] = self._render(record)
+        return f"{self.prefix}{formatted_string}" if len(self.prefix) > 0 else formatted_string
+
+    def _render(self, record: LogRecord) -> str:
+        # format a record that isn't in the cache
+        return super().format(record)
+
+    def formatMessage(self, record: LogRecord) -> str:
+        record.message = get_message(record)  # (includes native structured fields)
+        return super().formatMessage(record)
+
+    # (seconds, date and time string, UTC offset string) of the most recently formatted second
+    _time_cache = (None, "", "")  # type: Tuple[Union[int, None], str, str]
+
     def formatTime(self, record: LogRecord, datefmt: Union[str, None] = None) -> str:
         if datefmt is not None:
             # an explicit datefmt overrides the ISO 8601 default
             return super().formatTime(record, datefmt)
-        time_stamp = datetime.fromtimestamp(record.created)
-        return time_stamp.astimezone().isoformat()
+
+        # Same output as datetime.fromtimestamp(record.created).astimezone().isoformat(), but the local timezone lookup and the rendering of everything except the
+        # microseconds is only done once per second. The UTC offset can only change (e.g. for DST) on a whole second, so caching per second is always correct.
+        seconds, microseconds = _split_timestamp(record.created)
+        cached_seconds, date_time_string, utc_offset_string = self._time_cache
+        if seconds != cached_seconds:
+            iso_string = datetime.fromtimestamp(seconds).astimezone().isoformat()
+            date_time_string = iso_string[:19]  # YYYY-MM-DDTHH:MM:SS
+            utc_offset_string = iso_string[19:]
+            self._time_cache = (seconds, date_time_string, utc_offset_string)  # one assignment, so other threads see a consistent cache
+        if microseconds == 0:
+            return f"{date_time_string}{utc_offset_string}"  # isoformat() leaves out the fractional seconds when they are zero
+        return f"{date_time_string}.{microseconds:06d}{utc_offset_string}"
+
+
+# a %-style field, e.g. %(name)s
+_percent_field_regex = re.compile(r"%\(([^)]+)\)([#0 +-]*[0-9*]*(?:\.[0-9*]+)?[diouxXeEfFgGcrsa%])|%%")
+
+
+class BalsaCompiledFormatter(BalsaFormatter):
+    """
+    Drop-in BalsaFormatter that compiles its format string once, when it's created. Each record is rendered by a single positional %-format of only the fields
+    the format uses (fetched with one attrgetter call), instead of the generic logging.Formatter machinery (usesTime(), a %-format with a dict lookup for every
+    field, etc.). The output is identical. Other styles (e.g. "{"), defaults and "*" widths aren't compiled and are formatted the usual way.
+    """
+
+    def __init__(self, *args, prefix: str = "", **kwargs):
+        super().__init__(*args, prefix=prefix, **kwargs)
+        self._template = None  # type: Union[str, None]  # %-format template with positional fields
+        self._get_fields = None  # type: Union[Callable[[LogRecord], Any], None]
+        self._uses_time = False
+        if isinstance(self._style, PercentStyle) and type(self._style) is PercentStyle and not getattr(self._style, "_defaults", None):
+            self._compile(self._fmt or PercentStyle.default_format)
+
+    def _compile(self, fmt: str):
+        # the same format with positional fields (e.g. "%(name)s - %(message)s" becomes "%s - %s"), so the fields can be given as a tuple
+        template_parts = []
+        field_names = []
+        position = 0
+        for match in _percent_field_regex.finditer(fmt):
+            if "%" in (literal := fmt[position : match.start()]) or "*" in match.group(0):
+                return  # not a valid (or not a named) %-style field - left for the generic formatter
+            template_parts.append(literal)
+            position = match.end()
+            if match.group(0) == "%%":
+                template_parts.append("%%")
+            else:
+                template_parts.append(f"%{match.group(2)}")
+                field_names.append(match.group(1))
+        if "%" in (literal := fmt[position:]):
+            return
+        template_parts.append(literal)
+
+        self._template = "".join(template_parts)
+        if len(field_names) == 0:
+            self._get_fields = lambda record: ()
+        elif len(field_names) == 1:
+            get_field = attrgetter(field_names[0])
+            self._get_fields = lambda record: (get_field(record),)  # (attrgetter of one field doesn't return a tuple)
+        else:
+            self._get_fields = attrgetter(*field_names)  # all the fields in one call
+        self._uses_time = "asctime" in field_names
+
+    def _render(self, record: LogRecord) -> str:
+        if self._template is None or self._get_fields is None:
+            return super()._render(record)
+        # the same as logging.Formatter.format()
+        record.message = get_message(record)
+        if self._uses_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        try:
+            formatted_string = self._template % self._get_fields(record)
+        except AttributeError as e:
+            raise ValueError(f"Formatting field not found in record: {e}")
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if formatted_string[-1:] != "\n":
+                formatted_string += "\n"
+            formatted_string += record.exc_text
+        if record.stack_info:
+            if formatted_string[-1:] != "\n":
+                formatted_string += "\n"
+            formatted_string += self.formatStack(record.stack_info)
+        return formatted_string
+
+
+# JSON Lines record fields (the same names as the BalsaRecord attributes, where there is one). "time_stamp" is always first, so a reader can find the start of
+# each record. Structured fields (from sf()) are merged in, with a leading underscore if they are the same as one of these.
+json_record_fields = (
+    "time_stamp",
+    "name",
+    "process_name",
+    "file_name",
+    "line_number",
+    "function_name",
+    "log_level",
+    "message",
+    "exception",
+    "stack",
+    "process",
+    "thread",
+    "thread_name",
+    "module",
+    "path_name",
+)
+
+
+class BalsaJSONFormatter(BalsaFormatter):
+    """
+    Format records as JSON Lines (one JSON object per line), with the structured fields (from sf()) merged in.
+    """
+
+    def format(self, record: LogRecord) -> str:
+        if (json_string := _get_cached(record, "balsa_json")) is not None:
+            return json_string  # already serialized for another handler
+
+        message, structured_record = get_structured(record)
+        json_record = {
+            "time_stamp": self.formatTime(record),
+            "name": record.name,
+            "process_name": record.processName,
+            "file_name": record.filename,
+            "line_number": record.lineno,
+            "function_name": record.funcName,
+            "log_level": record.levelname,
+            "message": message,
+        }  # type: Dict[str, Any]
+        if record.exc_info is not None and record.exc_text is None:
+            record.exc_text = self.formatException(record.exc_info)  # cached on the record, like Formatter.format()
+        if record.exc_text:
+            json_record["exception"] = record.exc_text
+        if record.stack_info:
+            json_record["stack"] = self.formatStack(record.stack_info)
+        json_record.update(process=record.process, thread=record.thread, thread_name=record.threadName, module=record.module, path_name=record.pathname)
+        for key, value in structured_record.items():
+            json_record[f"_{key}" if key in json_record_fields else key] = value
+
+        json_string = json.dumps(json_record, ensure_ascii=False, default=convert_serializable_special_cases)
+        _set_cached(record, "balsa_json", json_string)  # all the JSON Lines handlers (e.g. file and console) share one serialization
+        return json_string
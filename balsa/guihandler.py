@@ -6,6 +6,7 @@ import threading
 from tobool import to_bool_strict
 
 from . import __application_name__
+from .fork import register_fork_aware
 
 use_mttkinter = to_bool_strict(os.environ.get(f"{__application_name__}_USE_MTTKINTER", True))  # in case the user doesn't want to use mttkinter (multi-threaded tkinter)
 
@@ -84,6 +85,18 @@ def init_tkinter() -> "tkinter.Tk | None":
     return tk
 
 
+def _after_fork_in_child():
+    # A forked process can't use the parent's Tcl interpreter (nor its display connection), so the thread that forked gets a new Tk root when it next shows a
+    # dialog box. The parent's root stays referenced, for the same reason as _drop_thread_tk_root().
+    global _tk_creation_lock
+    _tk_creation_lock = threading.Lock()
+    _tk_per_thread.tk = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 def _drop_thread_tk_root():
     """
     Forget the current thread's cached Tk root (e.g. after a TclError) so the next dialog box attempt starts with a fresh one. The broken root stays referenced
@@ -111,6 +124,10 @@ class DialogBoxHandler(logging.NullHandler):
         self._in_handle = threading.local()  # re-entrancy guard (a dialog box failure that gets logged must not try to pop up another dialog box)
 
         super().__init__()
+        register_fork_aware(self)
+
+    def _after_fork_in_child(self):
+        self.rate_limit_lock = threading.Lock()
 
     @staticmethod
     def _get_message_box(levelno: int):
@@ -1,5 +1,12 @@
 from enum import Enum
+from collections import deque
+from itertools import islice
+from typing import List, Deque
 import logging
+import threading
+
+from balsa.fork import register_fork_aware
+from balsa.formatter import get_message, _copy_cached
 
 
 class HandlerType(Enum):
@@ -10,6 +17,8 @@ class HandlerType(Enum):
     Sentry = 5
     StringList = 6
     AWSCloudWatch = 7
+    Queue = 8
+    Forwarding = 9
 
 
 class BalsaNullHandler(logging.NullHandler):
@@ -29,14 +38,49 @@ class BalsaNullHandler(logging.NullHandler):
 class BalsaStringListHandler(logging.NullHandler):
     """
     keeps a buffer of the most recent log entries
+
+    The records are kept (in a ring buffer) and only formatted when the strings are read, since in most applications they are rarely (if ever) read. Each
+    record is formatted at most once. A snapshot of each record is kept, with its message and exception text already rendered, so a caller changing the
+    arguments after the log call doesn't change the string, and exceptions don't keep their traceback frames (and those frames' locals) alive.
     """
 
-    def __init__(self, max_entries):
+    def __init__(self, max_entries: int):
         super().__init__()
         self.max_entries = max_entries
-        self.strings = []
+        self.records = deque(maxlen=max_entries)  # type: Deque[logging.LogRecord]
+        self._record_count = 0  # total number of records ever handled
+        self._formatted = deque(maxlen=max_entries)  # type: Deque[str]
+        self._formatted_count = 0  # total number of records ever formatted
+        self._strings = []  # type: List[str]
+        self._string_list_lock = threading.Lock()  # logging.NullHandler doesn't have a lock (its lock is None)
+        register_fork_aware(self)
+
+    def _after_fork_in_child(self):
+        self._string_list_lock = threading.Lock()  # (in case another thread held it when the process forked)
 
     def handle(self, record):
-        self.strings.append(self.format(record))
-        if len(self.strings) > self.max_entries:
-            self.strings.pop(0)
+        message = get_message(record)  # (cached on the record, including any native structured fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)  # (cached on the record, the same as Formatter.format())
+        snapshot = logging.makeLogRecord(record.__dict__)
+        snapshot.msg = record.getMessage() if record.__dict__.get("structured") else message
+        snapshot.args = None
+        snapshot.exc_info = None
+        _copy_cached(record, snapshot)  # (so it's not formatted again if another handler has already formatted the record)
+        with self._string_list_lock:
+            self.records.append(snapshot)
+            self._record_count += 1
+
+    @property
+    def strings(self) -> List[str]:
+        """
+        Get the most recent log entries as formatted strings. Only the records handled since the last read are formatted.
+        :return: list of strings, oldest first
+        """
+        with self._string_list_lock:
+            if (new_count := self._record_count - self._formatted_count) > 0:
+                new_records = list(islice(reversed(self.records), min(new_count, len(self.records))))  # (the newest records, without indexing the deque)
+                self._formatted.extend(self.format(new_record) for new_record in reversed(new_records))
+                self._formatted_count = self._record_count
+                self._strings = list(self._formatted)
+            return self._strings
@@ -0,0 +1,283 @@
+import struct
+import logging
+from contextlib import nullcontext
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Union, List, Iterator, Tuple, BinaryIO
+
+from balsa.structured import BalsaRecord
+from balsa.reader import get_log_file_paths, _iter_raw_records, _decode_record, _RangeReader, iter_range_records, is_sequential
+
+# A log index is a small "sidecar" file next to each log file (e.g. my_app.log.idx for my_app.log). It has an entry with the time, byte offset and level of:
+#   - the first record in each time bucket (e.g. each second), so time range queries can seek close to the first record in the range
+#   - every record at or above the index level (e.g. WARNING), so e.g. ERRORs can be found without reading the rest of the log
+# Entries are only ever appended, so the index can be kept up to date incrementally as the log is written.
+
+index_extension = ".idx"
+default_bucket_seconds = 1.0
+default_index_level = logging.WARNING
+
+_index_magic = b"BALSAIDX"
+_index_header = struct.Struct("<8sdH")  # magic, bucket seconds, index level
+_index_entry = struct.Struct("<dQH")  # time (seconds since the epoch), byte offset, level
+
+_time_tolerance = 0.001  # index times are from the LogRecord, which can have more resolution than the timestamp in the log
+
+
+def get_index_path(log_path: Union[Path, str]) -> Path:
+    """
+    Get the index (sidecar) file path for a log file.
+    :param log_path: log file path
+    :return: index file path
+    """
+    log_path = Path(log_path)
+    return Path(log_path.parent, f"{log_path.name}{index_extension}")
+
+
+def _get_bucket(time_stamp: float, bucket_seconds: float) -> int:
+    return int(time_stamp // bucket_seconds)
+
+
+def _to_seconds(time_stamp: Union[datetime, float, None]) -> Union[float, None]:
+    if isinstance(time_stamp, datetime):
+        return time_stamp.timestamp()  # naive datetimes are local time
+    return time_stamp
+
+
+class LogIndex:
+    """
+    Contents of a log index.
+    """
+
+    def __init__(self, bucket_seconds: float = default_bucket_seconds, index_level: int = default_index_level):
+        self.bucket_seconds = bucket_seconds
+        self.index_level = index_level
+        self.times = []  # type: List[float]
+        self.offsets = []  # type: List[int]
+        self.levels = []  # type: List[int]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def needs_entry(self, time_stamp: float, level: int) -> bool:
+        """
+        Determine if a record (the next one after all the records already indexed) gets an index entry.
+        :param time_stamp: record time
+        :param level: record level
+        :return: True if the record gets an index entry
+        """
+        return level >= self.index_level or len(self.times) == 0 or _get_bucket(time_stamp, self.bucket_seconds) != _get_bucket(self.times[-1], self.bucket_seconds)
+
+    def append(self, time_stamp: float, offset: int, level: int):
+        self.times.append(time_stamp)
+        self.offsets.append(offset)
+        self.levels.append(level)
+
+    def get_ranges(self, start_seconds: Union[float, None], end_seconds: Union[float, None], file_size: int) -> List[Tuple[int, int]]:
+        """
+        Get the parts of the log file that can have records in a time range. The records from one entry up to the next entry are all in the first entry's time
+        bucket (otherwise they would have their own entry), so this is exact at the bucket level, even if the records aren't in time order.
+        :param start_seconds: start of the time range (or None)
+        :param end_seconds: end of the time range (or None)
+        :param file_size: log file size
+        :return: list of (start byte offset, end byte offset)
+        """
+        ranges = []  # type: List[Tuple[int, int]]
+        for entry_number, (time_stamp, offset) in enumerate(zip(self.times, self.offsets)):
+            bucket_start = _get_bucket(time_stamp, self.bucket_seconds) * self.bucket_seconds - _time_tolerance
+            bucket_end = bucket_start + self.bucket_seconds + 2.0 * _time_tolerance
+            if (end_seconds is None or bucket_start < end_seconds) and (start_seconds is None or bucket_end > start_seconds):
+                end_offset = self.offsets[entry_number + 1] if entry_number + 1 < len(self.offsets) else file_size
+                if len(ranges) > 0 and ranges[-1][1] == offset:
+                    ranges[-1] = (ranges[-1][0], end_offset)
+                else:
+                    ranges.append((offset, end_offset))
+        return ranges
+
+
+def read_index(index_path: Union[Path, str]) -> Union[LogIndex, None]:
+    """
+    Read a log index file.
+    :param index_path: index file path
+    :return: the log index, or None if the file doesn't exist or isn't a log index
+    """
+    try:
+        index_bytes = Path(index_path).read_bytes()
+    except FileNotFoundError:
+        return None
+    if len(index_bytes) < _index_header.size:
+        return None
+    magic, bucket_seconds, index_level = _index_header.unpack_from(index_bytes)
+    if magic != _index_magic:
+        return None
+    log_index = LogIndex(bucket_seconds, index_level)
+    entries_size = (len(index_bytes) - _index_header.size) // _index_entry.size * _index_entry.size  # ignore a partially written last entry
+    for time_stamp, offset, level in _index_entry.iter_unpack(index_bytes[_index_header.size : _index_header.size + entries_size]):
+        log_index.append(time_stamp, offset, level)
+    return log_index
+
+
+def _read_record(log_file: BinaryIO, offset: int) -> Union[BalsaRecord, None]:
+    """
+    Read the log record at a byte offset.
+    :param log_file: log file opened in binary mode
+    :param offset: byte offset of the start of the record
+    :return: the record, or None if there's no record there
+    """
+    log_file.seek(offset)
+    for _, raw_record in _iter_raw_records(log_file, 64 * 1024):
+        return BalsaRecord(_decode_record(raw_record))
+    return None
+
+
+def _is_valid(log_index: LogIndex, log_file: BinaryIO, file_size: int) -> bool:
+    """
+    Check that a log index matches its log file (e.g. the log file wasn't replaced or truncated without its index).
+    """
+    if len(log_index) == 0:
+        return True
+    if log_index.offsets[-1] >= file_size:
+        return False
+    record = _read_record(log_file, log_index.offsets[-1])
+    return record is not None and record.valid and abs(record.time_stamp.timestamp() - log_index.times[-1]) < _time_tolerance
+
+
+def has_valid_index(log_path: Union[Path, str]) -> bool:
+    """
+    Determine if a log file has an index that matches it (the index may not have entries for records written after it was last updated).
+    :param log_path: log file path
+    :return: True if the log file has a valid index
+    """
+    log_path = Path(log_path)
+    if (log_index := read_index(get_index_path(log_path))) is None:
+        return False
+    with log_path.open("rb") as log_file:
+        return _is_valid(log_index, log_file, log_path.stat().st_size)
+
+
+def _write_entry(index_file: BinaryIO, time_stamp: float, offset: int, level: int):
+    index_file.write(_index_entry.pack(time_stamp, offset, min(max(level, 0), 0xFFFF)))
+
+
+def update_index(log_path: Union[Path, str], bucket_seconds: float = default_bucket_seconds, index_level: int = default_index_level, write: bool = True) -> LogIndex:
+    """
+    Bring a log file's index up to date, building it if it doesn't exist (or doesn't match the log file). Only the part of the log file after the last index entry
+    is read.
+    :param log_path: log file path
+    :param bucket_seconds: time bucket size for a new index (an existing index keeps its own)
+    :param index_level: index level for a new index (an existing index keeps its own)
+    :param write: True to write the updates to the index file. Use False for a log file that is still being written, since its file handler maintains the
+    index file.
+    :return: the up to date log index
+    """
+    log_path = Path(log_path)
+    index_path = get_index_path(log_path)
+    with log_path.open("rb") as log_file:
+        file_size = log_path.stat().st_size
+        log_index = read_index(index_path)
+        if log_index is None or not _is_valid(log_index, log_file, file_size):
+            log_index = LogIndex(bucket_seconds, index_level)
+            if write:
+                index_path.write_bytes(_index_header.pack(_index_magic, log_index.bucket_seconds, log_index.index_level))
+        start = 0 if len(log_index) == 0 else log_index.offsets[-1]
+        log_file.seek(start)
+        with index_path.open("ab") if write else nullcontext() as index_file:
+            for offset, raw_record in _iter_raw_records(log_file):
+                offset += start
+                if offset == start and len(log_index) > 0:
+                    continue  # already indexed
+                if (record := BalsaRecord(_decode_record(raw_record))).valid:
+                    time_stamp = record.time_stamp.timestamp()
+                    if log_index.needs_entry(time_stamp, record.log_level):
+                        log_index.append(time_stamp, offset, record.log_level)
+                        if index_file is not None:
+                            _write_entry(index_file, time_stamp, offset, record.log_level)
+    return log_index
+
+
+class LogIndexWriter:
+    """
+    Keeps a log file's index up to date as the log file is written (used by the file handler).
+    """
+
+    def __init__(self, log_path: Union[Path, str], bucket_seconds: float = default_bucket_seconds, index_level: int = default_index_level):
+        """
+        :param log_path: log file path (the log file may already exist, e.g. when appending to an existing log)
+        :param bucket_seconds: time bucket size
+        :param index_level: records at or above this level always get an index entry
+        """
+        log_path = Path(log_path)
+        if log_path.exists():
+            self.log_index = update_index(log_path, bucket_seconds, index_level)  # catch up on anything written without an index
+        else:
+            self.log_index = LogIndex(bucket_seconds, index_level)
+            get_index_path(log_path).write_bytes(_index_header.pack(_index_magic, bucket_seconds, index_level))
+        self.index_file = get_index_path(log_path).open("ab")
+
+    def add(self, time_stamp: float, offset: int, level: int):
+        """
+        Add a record (call for every record written to the log file, in order).
+        :param time_stamp: record time (e.g. LogRecord.created)
+        :param offset: byte offset in the log file of the start of the record
+        :param level: record level
+        """
+        if self.log_index.needs_entry(time_stamp, level):
+            self.log_index.append(time_stamp, offset, level)
+            _write_entry(self.index_file, time_stamp, offset, level)
+            self.index_file.flush()  # entries are relatively rare (at most one per bucket plus the higher level records)
+
+    def close(self):
+        self.index_file.close()
+
+
+def iter_indexed_records(
+    path: Union[Path, str],
+    start_time: Union[datetime, float, None] = None,
+    end_time: Union[datetime, float, None] = None,
+    min_level: int = logging.NOTSET,
+    log_extension: str = ".log",
+    write_index: bool = True,
+) -> Iterator[BalsaRecord]:
+    """
+    Read the log records in a time range and/or at or above a level, using the log indexes to only read the relevant parts of the log files. Indexes are built or
+    brought up to date as needed.
+    :param path: a log file, or a directory of log files
+    :param start_time: only records at or after this time (datetime or seconds since the epoch), or None for no start time
+    :param end_time: only records before this time (datetime or seconds since the epoch), or None for no end time
+    :param min_level: only records at or above this level
+    :param log_extension: log file extension
+    :param write_index: True to save the built or updated indexes of rotated backups, False to only build them in memory (e.g. to not write to the log directory)
+    :return: iterator of records, in the same order as iter_records()
+    """
+    start_seconds = _to_seconds(start_time)
+    end_seconds = _to_seconds(end_time)
+
+    def in_range(record: BalsaRecord) -> bool:
+        if not record.valid or record.log_level < min_level:
+            return False
+        time_stamp = record.time_stamp.timestamp()
+        return (start_seconds is None or time_stamp >= start_seconds) and (end_seconds is None or time_stamp < end_seconds)
+
+    for log_file_path in get_log_file_paths(path, log_extension):
+        if is_sequential(log_file_path):
+            # compressed and binary log files aren't indexed since they can't be read from an offset, so they're scanned
+            yield from filter(in_range, iter_range_records(log_file_path))
+            continue
+        # a rotated backup is never written again, so its index can be saved (the current log file's index is kept up to date by its file handler)
+        try:
+            log_index = update_index(log_file_path, write=write_index and not log_file_path.name.endswith(log_extension))
+        except PermissionError:
+            log_index = update_index(log_file_path, write=False)  # e.g. a read-only log directory
+        with log_file_path.open("rb") as log_file:
+            for start_offset, end_offset in log_index.get_ranges(start_seconds, end_seconds, log_file_path.stat().st_size):
+                if min_level >= log_index.index_level:
+                    # every record at this level has an index entry, so only those records need to be read
+                    for entry_number in range(bisect_left(log_index.offsets, start_offset), bisect_left(log_index.offsets, end_offset)):
+                        if log_index.levels[entry_number] >= min_level and (record := _read_record(log_file, log_index.offsets[entry_number])) is not None and in_range(record):
+                            yield record
+                else:
+                    log_file.seek(start_offset)
+                    for _, raw_record in _iter_raw_records(_RangeReader(log_file, end_offset)):  # type: ignore
+                        if in_range(record := BalsaRecord(_decode_record(raw_record))):
+                            yield record
@@ -0,0 +1,112 @@
+import heapq
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Union, List, Iterable, Iterator, Tuple
+
+from balsa.structured import BalsaRecord
+from balsa.reader import get_rotated_sets, open_log_file, _iter_raw_records, _decode_record
+from balsa.binary_format import is_binary_log_file, iter_binary_fields, fields_to_text
+
+# Each log file being merged has a read buffer of this size, so merging many log files (e.g. from many balsa_clone instances) doesn't take much memory.
+default_merge_chunk_size = 64 * 1024
+
+_json_time_stamp_prefix = '{"time_stamp": "'
+
+
+def get_merge_sets(paths: Union[Path, str, Iterable[Union[Path, str]]], log_extension: str = ".log") -> List[List[Path]]:
+    """
+    Get the log files to merge, as rotated sets. Each rotated set is in time order, and is read as one sequence of records.
+    :param paths: log file(s) and/or directories of log files. A directory's rotated sets (e.g. my_app_worker_1.log.1, my_app_worker_1.log, and
+    my_app_worker_2.log from two balsa_clone instances) are ordered by name.
+    :param log_extension: log file extension
+    :return: list of rotated sets (each a list of log file paths, oldest first)
+    """
+    merge_sets = []  # type: List[List[Path]]
+    for path in [paths] if isinstance(paths, (Path, str)) else paths:
+        if (path := Path(path)).is_dir():
+            rotated_sets = get_rotated_sets(path, log_extension)
+            merge_sets.extend(rotated_sets[base_name] for base_name in sorted(rotated_sets))
+        else:
+            merge_sets.append([path])
+    return merge_sets
+
+
+def _get_time_stamp(record_string: str) -> Union[datetime, None]:
+    """
+    Get a record's timestamp without parsing the whole record (the merge only needs the timestamp).
+    :param record_string: log record string
+    :return: timestamp, or None if the record isn't valid
+    """
+    if record_string.startswith(_json_time_stamp_prefix):
+        time_stamp_string = record_string[len(_json_time_stamp_prefix) : record_string.find('"', len(_json_time_stamp_prefix))]
+    else:
+        time_stamp_string = record_string.partition(" - ")[0]
+    try:
+        return datetime.fromisoformat(time_stamp_string)  # what Balsa writes
+    except ValueError:
+        record = BalsaRecord(record_string)  # e.g. an older format
+        return record.time_stamp if record.valid else None
+
+
+def _iter_timed(log_file_paths: List[Path], as_records: bool, chunk_size: int) -> Iterator[Tuple[float, Union[BalsaRecord, str]]]:
+    """
+    Read a rotated set's records (sequentially), with the time to merge them by.
+    :param log_file_paths: rotated set, oldest first
+    :param as_records: True for BalsaRecord, False for log record strings
+    :param chunk_size: read size
+    :return: iterator of (seconds since the epoch, record)
+    """
+    seconds = float("-inf")  # a record that can't be parsed (e.g. lines before the first record) stays right after the record before it
+    for log_file_path in log_file_paths:
+        with open_log_file(log_file_path) as log_file:
+            if is_binary_log_file(log_file):
+                for fields in iter_binary_fields(log_file):
+                    seconds = fields[0].timestamp()
+                    yield seconds, BalsaRecord.from_fields(*fields) if as_records else fields_to_text(fields)
+            else:
+                for _, raw_record in _iter_raw_records(log_file, chunk_size):
+                    record_string = _decode_record(raw_record)
+                    if as_records:
+                        record = BalsaRecord(record_string)
+                        if record.valid:
+                            seconds = record.time_stamp.timestamp()
+                        yield seconds, record
+                    else:
+                        if (time_stamp := _get_time_stamp(record_string)) is not None:
+                            seconds = time_stamp.timestamp()
+                        yield seconds, record_string
+
+
+def _iter_merged(paths: Union[Path, str, Iterable[Union[Path, str]]], as_records: bool, log_extension: str, chunk_size: int) -> Iterator[Union[BalsaRecord, str]]:
+    # heapq.merge() is stable, so records with the same time are in rotated set order (then in the order they were written)
+    merged = heapq.merge(*[_iter_timed(merge_set, as_records, chunk_size) for merge_set in get_merge_sets(paths, log_extension)], key=itemgetter(0))
+    return (record for _, record in merged)
+
+
+def iter_merged_records(
+    paths: Union[Path, str, Iterable[Union[Path, str]]], log_extension: str = ".log", chunk_size: int = default_merge_chunk_size
+) -> Iterator[BalsaRecord]:
+    """
+    Merge log files into one time line (e.g. the per-instance log files from balsa_clone), with a k-way merge by timestamp. Each rotated set is read
+    sequentially, so memory use doesn't depend on the log file sizes. Each rotated set is expected to be in time order (as written). Records with the same
+    timestamp are ordered by rotated set (see get_merge_sets()), so the result is always the same.
+    :param paths: log file(s) and/or directories of log files
+    :param log_extension: log file extension
+    :param chunk_size: read size (for each log file)
+    :return: iterator of BalsaRecord, in time order
+    """
+    return _iter_merged(paths, True, log_extension, chunk_size)  # type: ignore
+
+
+def iter_merged_record_strings(
+    paths: Union[Path, str, Iterable[Union[Path, str]]], log_extension: str = ".log", chunk_size: int = default_merge_chunk_size
+) -> Iterator[str]:
+    """
+    Merge log files into one time line, as log record strings (only the timestamps are parsed). See iter_merged_records().
+    :param paths: log file(s) and/or directories of log files
+    :param log_extension: log file extension
+    :param chunk_size: read size (for each log file)
+    :return: iterator of log record strings, in time order
+    """
+    return _iter_merged(paths, False, log_extension, chunk_size)  # type: ignore
@@ -0,0 +1,153 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import reduce
+from pathlib import Path
+from typing import Union, List, Iterator, Iterable, Tuple, Callable, Any, BinaryIO, Deque
+
+from balsa.structured import BalsaRecord
+from balsa.reader import get_log_file_paths, _record_start_regex, iter_range_records, is_sequential
+
+default_split_size = 16 * 1024 * 1024  # files larger than this are split into multiple work units
+
+# (file path, start byte offset, end byte offset)
+WorkUnit = Tuple[str, int, int]
+
+
+def _find_record_start(log_file: BinaryIO, offset: int, file_size: int) -> int:
+    """
+    Find the first record start at or after a byte offset.
+    :param log_file: log file opened in binary mode
+    :param offset: byte offset
+    :param file_size: file size
+    :return: byte offset of the record start (or the file size if there are no more records)
+    """
+    window_size = 64 * 1024
+    overlap = 32  # long enough for a newline and the start of a record that straddles two windows
+    position = max(offset - 1, 0)  # include the preceding byte so a record starting right at offset is found (its newline precedes it)
+    while position < file_size:
+        log_file.seek(position)
+        window = log_file.read(window_size)
+        if (match := _record_start_regex.search(window, 1)) is not None:
+            return position + match.start()
+        if len(window) < window_size:
+            break
+        position += window_size - overlap
+    return file_size
+
+
+def get_work_units(path: Union[Path, str], log_extension: str = ".log", split_size: int = default_split_size) -> List[WorkUnit]:
+    """
+    Divide log file(s) into work units. Each file is one work unit, except files larger than split_size, which are split at record boundaries. Compressed and binary
+    files are not split (they can only be read from the start).
+    :param path: a log file, or a directory of log files
+    :param log_extension: log file extension
+    :param split_size: approximate work unit size in bytes
+    :return: work units, in the same order as the records in the log files
+    """
+    work_units = []
+    for log_file_path in get_log_file_paths(path, log_extension):
+        if is_sequential(log_file_path):
+            work_units.append((str(log_file_path), 0, sys.maxsize))  # the end is the end of the (decompressed) data
+            continue
+        file_size = log_file_path.stat().st_size
+        start = 0
+        if file_size > split_size:
+            with log_file_path.open("rb") as log_file:
+                while (end := _find_record_start(log_file, start + split_size, file_size)) < file_size:
+                    work_units.append((str(log_file_path), start, end))
+                    start = end
+        work_units.append((str(log_file_path), start, file_size))
+    return work_units
+
+
+def _iter_parallel(calls: Iterable[Tuple[Callable, Tuple]], max_workers: Union[int, None]) -> Iterator[Any]:
+    """
+    Run function calls in worker processes and get the results in order. At most 2 * max_workers calls are submitted ahead of the result being yielded, so results
+    stream as they're consumed (rather than all the calls being queued up front, with their results held until they're consumed).
+    :param calls: (function, args) of each call (the function must be picklable, e.g. a module level function)
+    :param max_workers: number of worker processes (None for one per CPU)
+    :return: iterator of results, in the same order as the calls
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+        if sys.platform == "win32":
+            max_workers = min(max_workers, 61)  # (ProcessPoolExecutor's limit on Windows)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()  # type: Deque[Future]
+        try:
+            for function, args in calls:
+                if len(in_flight) >= 2 * max_workers:
+                    yield in_flight.popleft().result()
+                in_flight.append(executor.submit(function, *args))
+            while len(in_flight) > 0:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()  # e.g. the caller stopped iterating, so don't wait for calls that haven't started
+
+
+def _parse_work_unit(work_unit: WorkUnit, function: Union[Callable[[BalsaRecord], Any], None], reducer: Union[Callable[[Any, BalsaRecord], Any], None], initial: Any) -> Any:
+    """
+    Parse one work unit (runs in a worker process).
+    :param work_unit: work unit
+    :param function: function applied to each record (or None for the records themselves). Results that are None are dropped.
+    :param reducer: reducer(accumulated, record) (or None to return the results)
+    :param initial: initial value of the reduction
+    :return: list of results, or the reduced result
+    """
+    file_path, start, end = work_unit
+    records = iter_range_records(file_path, start, end)
+    if reducer is not None:
+        return reduce(reducer, records, initial)
+    if function is None:
+        return list(records)
+    return [result for result in map(function, records) if result is not None]
+
+
+def iter_records_parallel(
+    path: Union[Path, str],
+    function: Union[Callable[[BalsaRecord], Any], None] = None,
+    max_workers: Union[int, None] = None,
+    log_extension: str = ".log",
+    split_size: int = default_split_size,
+) -> Iterator[Any]:
+    """
+    Parse log files in parallel, using multiple processes. The results are in the same order as the records in the log files (i.e. the same as iter_records()).
+    :param path: a log file, or a directory of log files
+    :param function: function applied to each record in the worker processes, e.g. to select fields (must be picklable, e.g. a module level function). Results
+    that are None are dropped, so the function can also filter. If None, the records themselves are returned.
+    :param max_workers: number of worker processes (None for one per CPU)
+    :param log_extension: log file extension
+    :param split_size: files larger than this (in bytes) are split into multiple work units
+    :return: iterator of results
+    """
+    calls = ((_parse_work_unit, (work_unit, function, None, None)) for work_unit in get_work_units(path, log_extension, split_size))
+    for results in _iter_parallel(calls, max_workers):
+        yield from results
+
+
+def reduce_records_parallel(
+    path: Union[Path, str],
+    reducer: Callable[[Any, BalsaRecord], Any],
+    combiner: Callable[[Any, Any], Any],
+    initial: Any,
+    max_workers: Union[int, None] = None,
+    log_extension: str = ".log",
+    split_size: int = default_split_size,
+) -> Any:
+    """
+    Parse log files in parallel, using multiple processes, and reduce the records. Each worker process reduces its own records, so only the reduced results are
+    sent back to this process, where they are combined in order.
+    :param path: a log file, or a directory of log files
+    :param reducer: reducer(accumulated, record) returns the new accumulated value, like functools.reduce() (must be picklable, e.g. a module level function)
+    :param combiner: combiner(accumulated, work_unit_result) combines the results of two work units
+    :param initial: initial value of each reduction (each work unit starts with its own copy) and of the combination (the result if there are no records)
+    :param max_workers: number of worker processes (None for one per CPU)
+    :param log_extension: log file extension
+    :param split_size: files larger than this (in bytes) are split into multiple work units
+    :return: combined result
+    """
+    calls = ((_parse_work_unit, (work_unit, None, reducer, initial)) for work_unit in get_work_units(path, log_extension, split_size))
+    return reduce(combiner, _iter_parallel(calls, max_workers), initial)
@@ -0,0 +1,26 @@
+import re
+from multiprocessing import current_process
+from multiprocessing.util import Finalize
+from typing import Dict, Any, Union, Type
+
+from balsa.balsa import Balsa, balsa_clone
+
+
+def init_pool_worker(config_dict: Dict[str, Any], balsa_class: Union[Type[Balsa], None] = None):
+    """
+    Initializer for process pools that reuse their worker processes (multiprocessing.Pool or concurrent.futures.ProcessPoolExecutor), so logging is set up
+    once per worker instead of once per task. For example:
+
+        with ProcessPoolExecutor(initializer=init_pool_worker, initargs=(balsa.config_as_dict(),)) as executor:
+
+    Each worker gets a Balsa instance (see get_global_balsa()) named after the worker process (e.g. "ForkPoolWorker-1"), which stays the same for the worker's
+    lifetime. The Balsa instance is removed (which writes anything buffered) when the worker exits.
+
+    :param config_dict: config dict from the "parent" Balsa instance (see Balsa.config_as_dict())
+    :param balsa_class: Balsa derived class to use (it must be importable by the worker processes). If not given, the base Balsa class is used.
+    """
+    instance_name = re.sub(r"[^\w.-]", "_", current_process().name)  # (the instance name is part of the log file name)
+    balsa = balsa_clone(config_dict, instance_name, None if balsa_class is None else balsa_class())
+    balsa.init_logger()
+    # pool workers exit with os._exit(), which doesn't run atexit (or logging.shutdown()), but does run multiprocessing finalizers
+    Finalize(balsa, balsa.remove, exitpriority=20)  # (before the handlers' own finalizers, e.g. BalsaForwardingHandler's)
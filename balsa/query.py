@@ -0,0 +1,142 @@
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Union, Dict, List, Tuple, Iterator, Callable
+
+from balsa.structured import BalsaRecord
+from balsa.reader import iter_range_records, get_log_file_paths, is_sequential
+from balsa.parallel import get_work_units, default_split_size, WorkUnit, _iter_parallel
+from balsa.index import iter_indexed_records, has_valid_index, default_index_level, _to_seconds
+
+
+class RecordFilter:
+    """
+    Log record query criteria. Picklable, so it can be sent to worker processes.
+    """
+
+    def __init__(
+        self,
+        min_level: int = logging.NOTSET,
+        name: Union[str, None] = None,
+        process_name: Union[str, None] = None,
+        start_time: Union[datetime, float, None] = None,
+        end_time: Union[datetime, float, None] = None,
+        structured: Union[Dict[str, str], None] = None,
+    ):
+        """
+        :param min_level: only records at or above this level
+        :param name: only records from this logger or its children (e.g. "my_app" matches "my_app" and "my_app.db")
+        :param process_name: only records from this process name
+        :param start_time: only records at or after this time (datetime or seconds since the epoch)
+        :param end_time: only records before this time (datetime or seconds since the epoch)
+        :param structured: only records whose structured record (from sf()) has these key/value pairs. Values are compared as strings, with non-string values
+        as JSON (e.g. "42" or "true").
+        """
+        self.min_level = min_level
+        self.name = name
+        self.process_name = process_name
+        self.start_seconds = _to_seconds(start_time)
+        self.end_seconds = _to_seconds(end_time)
+        self.structured = {} if structured is None else structured
+
+        # byte strings that any matching record must contain (one of each tuple - text or JSON Lines format), so most other records can be skipped without
+        # parsing them
+        self.required_bytes = []  # type: List[Tuple[bytes, ...]]
+        if name is not None:
+            self.required_bytes.append((f" - {name}".encode("utf-8"), f'"name": {json.dumps(name, ensure_ascii=False)[:-1]}'.encode("utf-8")))
+        if process_name is not None:
+            self.required_bytes.append((f" - {process_name} - ".encode("utf-8"), f'"process_name": {json.dumps(process_name, ensure_ascii=False)}'.encode("utf-8")))
+        # (non-ASCII keys may be escaped in the JSON)
+        self.required_bytes.extend((json.dumps(key).encode("utf-8"),) for key in self.structured if key.isascii())
+
+    def might_match(self, raw_record: bytes) -> bool:
+        """
+        Quick check of an unparsed record.
+        :param raw_record: record bytes
+        :return: False if the record can't match
+        """
+        return all(any(required in raw_record for required in alternatives) for alternatives in self.required_bytes)
+
+    def __call__(self, record: BalsaRecord) -> Union[BalsaRecord, None]:
+        """
+        :param record: record
+        :return: the record if it matches, otherwise None
+        """
+        if not record.valid or record.log_level < self.min_level:
+            return None
+        if self.name is not None and record.name != self.name and not record.name.startswith(f"{self.name}."):
+            return None
+        if self.process_name is not None and record.process_name != self.process_name:
+            return None
+        if self.start_seconds is not None or self.end_seconds is not None:
+            time_stamp = record.time_stamp.timestamp()
+            if (self.start_seconds is not None and time_stamp < self.start_seconds) or (self.end_seconds is not None and time_stamp >= self.end_seconds):
+                return None
+        for key, value in self.structured.items():
+            if key not in record.structured_record:
+                return None
+            record_value = record.structured_record[key]
+            if (record_value if isinstance(record_value, str) else json.dumps(record_value)) != value:
+                return None
+        return record
+
+
+def _query_work_unit(work_unit: WorkUnit, record_filter: RecordFilter) -> List[BalsaRecord]:
+    """
+    Query one work unit (runs in a worker process).
+    :param work_unit: work unit
+    :param record_filter: query criteria
+    :return: matching records
+    """
+    file_path, start, end = work_unit
+    return [record for record in iter_range_records(file_path, start, end, record_filter.might_match) if record_filter(record) is not None]
+
+
+def _query_indexed_file(file_path: str, record_filter: RecordFilter, log_extension: str, build_index: bool) -> List[BalsaRecord]:
+    """
+    Query one log file using its index (runs in a worker process).
+    :param file_path: log file path
+    :param record_filter: query criteria
+    :param log_extension: log file extension
+    :param build_index: True to save the index if it had to be built or updated
+    :return: matching records
+    """
+    records = iter_indexed_records(file_path, record_filter.start_seconds, record_filter.end_seconds, record_filter.min_level, log_extension, build_index)
+    return [record for record in records if record_filter(record) is not None]
+
+
+def query_records(
+    path: Union[Path, str],
+    record_filter: RecordFilter,
+    max_workers: Union[int, None] = None,
+    log_extension: str = ".log",
+    use_index: bool = True,
+    split_size: int = default_split_size,
+    build_index: bool = False,
+) -> Iterator[BalsaRecord]:
+    """
+    Find the log records that match a query, using multiple processes. For queries with a time range or a high enough level, log files that have a valid index
+    (see balsa.index) only have the relevant parts read. Other log files are scanned, skipping most non-matching records without parsing them.
+    :param path: a log file, or a directory of log files
+    :param record_filter: query criteria
+    :param max_workers: number of worker processes (None for one per CPU)
+    :param log_extension: log file extension
+    :param use_index: True to use the log indexes that already exist
+    :param split_size: files larger than this (in bytes) are split into multiple work units for a scan
+    :param build_index: True to also build (and save) the missing log indexes, which makes later queries faster. Otherwise, a query doesn't write to the log
+    directory.
+    :return: iterator of matching records, in the same order as iter_records()
+    """
+    indexable = record_filter.start_seconds is not None or record_filter.end_seconds is not None or record_filter.min_level >= default_index_level
+
+    def calls() -> Iterator[Tuple[Callable, Tuple]]:
+        for log_file_path in get_log_file_paths(path, log_extension):
+            if use_index and indexable and not is_sequential(log_file_path) and (build_index or has_valid_index(log_file_path)):
+                yield _query_indexed_file, (str(log_file_path), record_filter, log_extension, build_index)
+            else:
+                for work_unit in get_work_units(log_file_path, log_extension, split_size):
+                    yield _query_work_unit, (work_unit, record_filter)
+
+    for results in _iter_parallel(calls(), max_workers):
+        yield from results
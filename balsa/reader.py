@@ -0,0 +1,202 @@
+import re
+import sys
+import gzip
+import bz2
+import lzma
+from pathlib import Path
+from typing import Union, List, Dict, Iterator, Tuple, BinaryIO, Callable
+
+from balsa.structured import BalsaRecord
+from balsa.binary_format import is_binary_log_file, iter_binary_fields, iter_binary_records, fields_to_text
+
+default_chunk_size = 1024 * 1024
+
+# A line that starts with an ISO 8601 date (text format) or with the JSON Lines time_stamp field is the start of a new record. Any other line (e.g. a traceback
+# line) is a continuation of the previous record.
+_record_start_regex = re.compile(rb'^(?:[0-9]{4}-[0-9]{2}-[0-9]{2}T|\{"time_stamp": ")', flags=re.MULTILINE)
+
+
+# rotated backups can be compressed (see BalsaRotatingFileHandler)
+compression_extensions = {"gzip": ".gz", "bz2": ".bz2", "lzma": ".xz"}
+_compression_modules = {".gz": gzip, ".bz2": bz2, ".xz": lzma}
+
+
+# timestamp segment names (e.g. "my_app.log.20231114T221320123456") are UTC with microseconds, so they sort in chronological order
+segment_time_format = "%Y%m%dT%H%M%S%f"
+
+
+def _log_file_regex(log_extension: str) -> "re.Pattern[str]":
+    # base log file (e.g. "my_app.log"), a numbered rotated backup (e.g. "my_app.log.3") or a timestamp segment (e.g. "my_app.log.20231114T221320123456"),
+    # any of which may be compressed (e.g. "my_app.log.3.gz")
+    compressed = "|".join(re.escape(extension) for extension in _compression_modules)
+    return re.compile(rf"(.+{re.escape(log_extension)})(?:\.([0-9]+)|\.([0-9]{{8}}T[0-9]{{12}}))?({compressed})?")
+
+
+def is_compressed(log_file_path: Union[Path, str]) -> bool:
+    return Path(log_file_path).suffix in _compression_modules
+
+
+def open_log_file(log_file_path: Union[Path, str]) -> BinaryIO:
+    """
+    Open a log file for reading, decompressing it if it's compressed.
+    :param log_file_path: log file path
+    :return: binary file object
+    """
+    log_file_path = Path(log_file_path)
+    if (compression_module := _compression_modules.get(log_file_path.suffix)) is not None:
+        return compression_module.open(log_file_path, "rb")  # type: ignore
+    return log_file_path.open("rb")
+
+
+def is_sequential(log_file_path: Union[Path, str]) -> bool:
+    """
+    Determine if a log file can only be read from the start, i.e. it can't be split or indexed by byte offset (a compressed or binary log file).
+    :param log_file_path: log file path
+    :return: True if the log file can only be read from the start
+    """
+    if is_compressed(log_file_path):
+        return True
+    with open_log_file(log_file_path) as log_file:
+        return is_binary_log_file(log_file)
+
+
+def get_rotated_sets(directory: Union[Path, str], log_extension: str = ".log") -> Dict[str, List[Path]]:
+    """
+    Get the rotated sets of log files in a directory.
+    :param directory: log directory
+    :param log_extension: log file extension
+    :return: dict of base log file name (e.g. "my_app.log") to the log file paths of its rotated set in chronological order (oldest first): numbered backups
+    (e.g. my_app.log.3, my_app.log.2, my_app.log.1), then timestamp segments, then the base log file itself
+    """
+    log_file_regex = _log_file_regex(log_extension)
+    rotated_sets = {}  # type: Dict[str, Dict[tuple, Path]]
+    for file_path in Path(directory).iterdir():
+        if file_path.is_file() and (match := log_file_regex.fullmatch(file_path.name)) is not None:
+            if match.group(2) is not None:
+                order = (0, -int(match.group(2)))  # type: tuple
+            elif match.group(3) is not None:
+                order = (1, match.group(3))
+            else:
+                order = (2,)
+            backups = rotated_sets.setdefault(match.group(1), {})
+            # while a backup is being compressed both versions can exist, and only the uncompressed one is complete
+            if order not in backups or match.group(4) is None:
+                backups[order] = file_path
+    return {base_name: [file_path for _, file_path in sorted(backups.items())] for base_name, backups in rotated_sets.items()}
+
+
+def get_log_file_paths(path: Union[Path, str], log_extension: str = ".log") -> List[Path]:
+    """
+    Get the log file paths to read, in chronological order.
+    :param path: a log file, or a directory of log files. For a directory, each log file's rotated set (e.g. my_app.log.3, my_app.log.2, my_app.log.1, my_app.log)
+    is in chronological order (oldest first). Multiple rotated sets (e.g. from balsa_clone instances) are ordered by name. Rotated backups can be compressed
+    (e.g. my_app.log.3.gz) or named by timestamp (see get_rotated_sets()).
+    :param log_extension: log file extension
+    :return: list of log file paths
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return [path]
+    rotated_sets = get_rotated_sets(path, log_extension)
+    return [file_path for base_name in sorted(rotated_sets) for file_path in rotated_sets[base_name]]
+
+
+class _RangeReader:
+    """
+    File-like reader for a byte range of a file.
+    """
+
+    def __init__(self, log_file: BinaryIO, end: int):
+        self.log_file = log_file
+        self.end = end
+
+    def read(self, size: int) -> bytes:
+        return self.log_file.read(max(min(size, self.end - self.log_file.tell()), 0))
+
+
+def _iter_raw_records(log_file: BinaryIO, chunk_size: int = default_chunk_size) -> Iterator[Tuple[int, bytes]]:
+    """
+    Read a log file in large chunks and split it into records. Continuation lines (e.g. tracebacks) are kept with their record.
+    :param log_file: log file opened in binary mode
+    :param chunk_size: read size
+    :return: iterator of (byte offset in the file, record bytes without the trailing newline)
+    """
+    pending = b""  # read but not yet yielded - always starts at the start of a record (or the start of the file)
+    pending_offset = 0
+    while True:
+        chunk = log_file.read(chunk_size)
+        pending += chunk
+        # only complete lines can be split into records, except at the end of the file
+        complete = pending.rfind(b"\n") + 1 if len(chunk) > 0 else len(pending)
+        position = 0
+        for match in _record_start_regex.finditer(pending, 1, complete):
+            yield pending_offset + position, pending[position : match.start() - 1]
+            position = match.start()
+        pending = pending[position:]
+        pending_offset += position
+        if len(chunk) == 0:
+            if len(pending) > 0:
+                yield pending_offset, pending.rstrip(b"\n")
+            break
+
+
+def _decode_record(raw_record: bytes) -> str:
+    if b"\r" in raw_record:
+        raw_record = raw_record.replace(b"\r\n", b"\n").rstrip(b"\r")  # written in text mode on Windows
+    return raw_record.decode("utf-8", errors="replace")
+
+
+def iter_record_strings(path: Union[Path, str], log_extension: str = ".log", chunk_size: int = default_chunk_size) -> Iterator[str]:
+    """
+    Read log records as strings (i.e. without parsing them), one at a time. See iter_records().
+    :param path: a log file, or a directory of log files
+    :param log_extension: log file extension
+    :param chunk_size: read size
+    :return: iterator of log record strings
+    """
+    for log_file_path in get_log_file_paths(path, log_extension):
+        with open_log_file(log_file_path) as log_file:
+            if is_binary_log_file(log_file):
+                yield from (fields_to_text(fields) for fields in iter_binary_fields(log_file))
+            else:
+                for _, raw_record in _iter_raw_records(log_file, chunk_size):
+                    yield _decode_record(raw_record)
+
+
+def iter_range_records(
+    log_file_path: Union[Path, str], start: int = 0, end: int = sys.maxsize, raw_filter: Union[Callable[[bytes], bool], None] = None
+) -> Iterator[BalsaRecord]:
+    """
+    Read the log records in a byte range of one log file. A sequential (compressed or binary) log file is always read in full.
+    :param log_file_path: log file path
+    :param start: byte offset of the start of a record
+    :param end: byte offset of the end of the range
+    :param raw_filter: skip text records where raw_filter(record bytes) is False without parsing them
+    :return: iterator of BalsaRecord
+    """
+    with open_log_file(log_file_path) as log_file:
+        if is_binary_log_file(log_file):
+            yield from iter_binary_records(log_file)
+            return
+        log_file.seek(start)
+        for _, raw_record in _iter_raw_records(_RangeReader(log_file, end)):  # type: ignore
+            if raw_filter is None or raw_filter(raw_record):
+                yield BalsaRecord(_decode_record(raw_record))
+
+
+def iter_records(path: Union[Path, str], log_extension: str = ".log", chunk_size: int = default_chunk_size) -> Iterator[BalsaRecord]:
+    """
+    Read log records, one at a time. Memory use does not depend on the log file size, so even very large log files can be read.
+    Multi-line records (e.g. with a traceback) are returned as one record. Lines before the first record (if any) are returned as an invalid record.
+    :param path: a log file, or a directory of log files (each rotated set is read oldest to newest)
+    :param log_extension: log file extension
+    :param chunk_size: read size
+    :return: iterator of BalsaRecord
+    """
+    for log_file_path in get_log_file_paths(path, log_extension):
+        with open_log_file(log_file_path) as log_file:
+            if is_binary_log_file(log_file):
+                yield from iter_binary_records(log_file)  # already parsed (no log strings)
+            else:
+                for _, raw_record in _iter_raw_records(log_file, chunk_size):
+                    yield BalsaRecord(_decode_record(raw_record))
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Dict, Any
 import re
 import logging
 import json
@@ -8,6 +9,7 @@ from yasf import structured_sentinel
 import dateutil.parser
 
 from balsa.__version__ import __application_name__
+from balsa.formatter import json_record_fields
 
 log = getLogger(__application_name__)
 
@@ -18,11 +20,37 @@ log = getLogger(__application_name__)
 balsa_log_regex = re.compile(r"([0-9+\-:TZ.]+) - (\S+) - (?:(\S+) - )?(\S+) - ([0-9]+) - (\S+) - (NOTSET|DEBUG|INFO|WARN|WARNING|ERROR|FATAL|CRITICAL) - (.*)", flags=re.IGNORECASE | re.DOTALL)
 
 
+# log level names the regex accepts, and their values
+_log_levels = {level_name: getattr(logging, level_name) for level_name in ["NOTSET", "DEBUG", "INFO", "WARN", "WARNING", "ERROR", "FATAL", "CRITICAL"]}
+
+_time_stamp_characters = "0123456789+-:TZ."  # same as the balsa_log_regex timestamp character set
+
+
+def _is_field(field: str) -> bool:
+    # same as \S+ in balsa_log_regex (at least one character and no whitespace)
+    return len(field) > 0 and field.split() == [field]
+
+
+def parse_time_stamp(time_stamp_string: str) -> datetime:
+    """
+    Parse a log timestamp string. Balsa writes ISO 8601, which datetime.fromisoformat() can parse directly. Any other format is parsed with dateutil (much slower).
+    :param time_stamp_string: timestamp string
+    :return: timestamp
+    """
+    try:
+        return datetime.fromisoformat(time_stamp_string)
+    except ValueError:
+        return dateutil.parser.parse(time_stamp_string)
+
+
 class BalsaRecord:
     """
     Balsa log record as a class.
     """
 
+    # __slots__ since there can be (very) many of these, e.g. when reading large log files
+    __slots__ = ("time_stamp", "name", "process_name", "file_name", "line_number", "function_name", "log_level", "message", "structured_record", "valid")
+
     time_stamp: datetime
     name: str
     process_name: str  # empty string if the log string does not contain a process name
@@ -39,6 +67,99 @@ class BalsaRecord:
         Convert log string to Balsa record.
         :param log_string: log string
         """
+        if log_string.startswith("{"):
+            self._json_parse(log_string)
+        elif not self._fast_parse(log_string):
+            self._regex_parse(log_string)
+
+    @classmethod
+    def from_fields(
+        cls, time_stamp: datetime, name: str, process_name: str, file_name: str, line_number: int, function_name: str, log_level: int, structured_string: str
+    ) -> "BalsaRecord":
+        """
+        Create a Balsa record from already parsed fields (e.g. from a binary log file). The record is the same as for the equivalent log string.
+        :param structured_string: message part of the log string (the message and the structured record, if any)
+        :return: Balsa record
+        """
+        record = cls.__new__(cls)
+        record.valid = True
+        record.time_stamp = time_stamp
+        record.name = name
+        record.process_name = process_name
+        record.file_name = file_name
+        record.line_number = line_number
+        record.function_name = function_name
+        record.log_level = log_level
+        record._set_message(structured_string.strip())
+        return record
+
+    def _fast_parse(self, log_string: str) -> bool:
+        """
+        Parse a log string in the current default Balsa format (with a process name and an ISO 8601 timestamp) by splitting it, which is much faster than the
+        regex. Other log strings are left for _regex_parse().
+        :param log_string: log string
+        :return: True if parsed
+        """
+        fields = log_string.split(" - ", 7)
+        if len(fields) != 8:
+            return False
+        time_stamp_string, name, process_name, file_name, line_number, function_name, level_name, structured_string = fields
+        if (
+            level_name not in _log_levels
+            or not (line_number.isascii() and line_number.isdigit())
+            or len(time_stamp_string.strip(_time_stamp_characters)) > 0
+            or not all(_is_field(field) for field in (name, process_name, file_name, function_name))
+        ):
+            return False
+        try:
+            self.time_stamp = datetime.fromisoformat(time_stamp_string)
+        except ValueError:
+            return False
+        self.valid = True
+        self.name = name
+        self.process_name = process_name
+        self.file_name = file_name
+        self.line_number = int(line_number)
+        self.function_name = function_name
+        self.log_level = _log_levels[level_name]
+        self._set_message(structured_string.strip())
+        return True
+
+    def _json_parse(self, log_string: str):
+        """
+        Parse a JSON Lines log string (see BalsaJSONFormatter). No regex is needed. The record is the same as for the equivalent text log string.
+        :param log_string: log string
+        """
+        try:
+            json_record = json.loads(log_string)
+            self.time_stamp = parse_time_stamp(json_record["time_stamp"])
+            self.name = json_record["name"]
+            self.process_name = json_record["process_name"]
+            self.file_name = json_record["file_name"]
+            self.line_number = json_record["line_number"]
+            self.function_name = json_record["function_name"]
+            self.log_level = _log_levels[json_record["log_level"]]
+            message = json_record["message"]
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError):
+            self._regex_parse(log_string)  # not a Balsa JSON record (will be invalid)
+            return
+        self.valid = True
+        self.structured_record = {}
+        for key, value in json_record.items():
+            if key not in json_record_fields:
+                self.structured_record[key[1:] if key[1:] in json_record_fields else key] = value
+        if len(self.structured_record) > 0:
+            message = f"{message} {structured_sentinel} " if len(message) > 0 else f"{structured_sentinel} "  # the same as for a text log string
+        for extra in ["exception", "stack"]:
+            if extra in json_record:
+                message += f"\n{json_record[extra]}"
+        self.message = message
+
+    def _regex_parse(self, log_string: str):
+        """
+        Parse a log string with balsa_log_regex (e.g. older formats without a process name, or timestamps that are not ISO 8601).
+        :param log_string: log string
+        """
         if (groups := balsa_log_regex.match(log_string)) is None:
             self.valid = False
             self.time_stamp = datetime.now()
@@ -52,27 +173,32 @@ class BalsaRecord:
             self.structured_record = {}
         else:
             self.valid = True
-            self.time_stamp = dateutil.parser.parse(groups.group(1))
+            self.time_stamp = parse_time_stamp(groups.group(1))
             self.name = groups.group(2)
             self.process_name = groups.group(3) if groups.group(3) is not None else ""
             self.file_name = groups.group(4)
             self.line_number = int(groups.group(5))
             self.function_name = groups.group(6)
             self.log_level = getattr(logging, groups.group(7).upper())  # log level as an integer value (.upper() since the regex is case-insensitive)
+            self._set_message(groups.group(8).strip())
 
-            self.structured_record = {}
-            structured_string = groups.group(8).strip()
-            if structured_string.endswith(structured_sentinel) and (start_structured_string := structured_string.find(structured_sentinel)) >= 0:
-                start_json = start_structured_string + len(structured_sentinel) + 1
-                json_string = structured_string[start_json : -len(structured_sentinel)]
-                self.message = structured_string[:start_json]
-                try:
-                    self.structured_record = json.loads(json_string)
-                except json.JSONDecodeError:
-                    log.warning(f"could not JSON decode : {json_string}")
-                    self.message += f" {structured_sentinel} {json_string} {structured_sentinel}"  # fallback if we can't decode the JSON, at least have it as part of the message string
-            else:
-                self.message = structured_string  # no JSON part
+    def _set_message(self, structured_string: str):
+        """
+        Set the message and the structured record (if any) from the message part of the log string.
+        :param structured_string: message part of the log string
+        """
+        self.structured_record = {}
+        if structured_string.endswith(structured_sentinel) and (start_structured_string := structured_string.find(structured_sentinel)) >= 0:
+            start_json = start_structured_string + len(structured_sentinel) + 1
+            json_string = structured_string[start_json : -len(structured_sentinel)]
+            self.message = structured_string[:start_json]
+            try:
+                self.structured_record = json.loads(json_string)
+            except json.JSONDecodeError:
+                log.warning(f"could not JSON decode : {json_string}")
+                self.message += f" {structured_sentinel} {json_string} {structured_sentinel}"  # fallback if we can't decode the JSON, at least have it as part of the message string
+        else:
+            self.message = structured_string  # no JSON part
 
     def __repr__(self):
         """
@@ -98,3 +224,21 @@ class BalsaRecord:
 
         output_string = " - ".join(fields)
         return output_string
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Get this record as a JSON serializable dict (e.g. for JSON Lines output).
+        :return: dict of the record's fields
+        """
+        time_stamp = self.time_stamp if self.time_stamp.tzinfo is not None else self.time_stamp.astimezone()
+        return {
+            "time_stamp": time_stamp.isoformat(),
+            "name": self.name,
+            "process_name": self.process_name,
+            "file_name": self.file_name,
+            "line_number": self.line_number,
+            "function_name": self.function_name,
+            "log_level": logging.getLevelName(self.log_level),
+            "message": self.message,
+            "structured_record": self.structured_record,
+        }
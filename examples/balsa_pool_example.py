@@ -0,0 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from balsa import Balsa, get_logger, init_pool_worker
+from ismain import is_main
+
+application_name = "my_application"
+author = "me"
+
+
+def my_task(value: int) -> int:
+    # logging was set up once for this worker process, by init_pool_worker()
+    log = get_logger(application_name)
+    log.info(f"processing {value}")
+    return value * value
+
+
+def test_pool():
+
+    balsa = Balsa(application_name, author, verbose=True)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    log.info("pool started")
+
+    with ProcessPoolExecutor(initializer=init_pool_worker, initargs=(balsa.config_as_dict(),)) as executor:
+        results = list(executor.map(my_task, range(10)))
+
+    log.info(f"pool finished : {results=}")
+
+
+if is_main():
+    test_pool()
@@ -1,3 +1,17 @@
+import pytest
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", help="also run the benchmarks (tests marked with @pytest.mark.benchmark)")
+
+
+def pytest_collection_modifyitems(config, items):
+    # benchmarks compare wall clock times, so they're not part of the default run
+    if not config.getoption("--benchmark"):
+        skip_benchmark = pytest.mark.skip(reason="benchmark (run with --benchmark)")
+        for item in items:
+            if item.get_closest_marker("benchmark") is not None:
+                item.add_marker(skip_benchmark)
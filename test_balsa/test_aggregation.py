@@ -0,0 +1,108 @@
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any
+from multiprocessing import Process
+from multiprocessing.connection import Listener
+
+from ismain import is_main
+
+from balsa import get_logger, balsa_clone, iter_records, lsf
+from balsa.aggregation import BalsaForwardingHandler
+
+from .tst_balsa import TstCLIBalsa
+
+application_name = "test_balsa_aggregation"
+worker_count = 32
+records_per_worker = 250
+
+
+class WorkerProcess(Process):
+    def __init__(self, parent_balsa_as_dict: Dict[str, Any], worker_number: int):
+        super().__init__(name=f"worker_{worker_number}")
+        self.parent_balsa_as_dict = parent_balsa_as_dict
+        self.worker_number = worker_number
+
+    def run(self):
+        balsa = balsa_clone(self.parent_balsa_as_dict, self.name)
+        balsa.init_logger()
+        log = get_logger(application_name)
+        for count in range(records_per_worker):
+            log.info(lsf("work", worker=self.worker_number, count=count))
+        try:
+            raise ValueError(f"problem in {self.name}")
+        except ValueError:
+            log.exception("exception")
+        balsa.remove()
+
+
+def test_aggregation():
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_aggregation = True
+    balsa.aggregation_reorder_window = 5.0  # (plenty, even for a loaded test machine)
+    balsa.verbose = False  # (no console output)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    log.info("started")
+
+    start = time.perf_counter()
+    processes = [WorkerProcess(balsa.config_as_dict(), worker_number) for worker_number in range(worker_count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    log.info("finished")
+    balsa.remove()
+    duration = time.perf_counter() - start
+    print(f"{worker_count * (records_per_worker + 1) / duration:.0f} records/s from {worker_count} processes")
+
+    # one merged log file
+    assert [log_path.name for log_path in Path("log", application_name).glob("*.log")] == [balsa.log_path.name]
+    records = list(iter_records(balsa.log_path))
+    assert records[-1].message == "finished"
+    times = [record.time_stamp for record in records]
+    assert times == sorted(times)  # merged in time order
+
+    counts = {}  # type: Dict[int, list]
+    for record in records:
+        if record.message == "work <<>> ":
+            counts.setdefault(record.structured_record["worker"], []).append(record.structured_record["count"])
+            assert record.process_name == f"worker_{record.structured_record['worker']}"
+            assert record.function_name == "run"
+    assert counts == {worker_number: list(range(records_per_worker)) for worker_number in range(worker_count)}
+    log_text = balsa.log_path.read_text()
+    assert all(f"ValueError: problem in worker_{worker_number}" in log_text for worker_number in range(worker_count))
+
+
+def test_forwarding_close_with_lock_held():
+    # logging.shutdown() holds the handler lock while it calls close(), and the flush thread may be waiting for that lock
+    authkey = b"test_forwarding_close_with_lock_held"
+    batches = []
+    with Listener(authkey=authkey) as listener:
+
+        def receive():
+            with listener.accept() as connection:
+                batches.append(connection.recv())
+
+        receive_thread = threading.Thread(target=receive)
+        receive_thread.start()
+        handler = BalsaForwardingHandler(listener.address, authkey, flush_interval=0.05)
+        handler.handle(logging.LogRecord(application_name, logging.INFO, __file__, 1, "message", None, None))
+
+        def shutdown():
+            with handler.lock:  # type: ignore
+                time.sleep(0.2)  # (the flush thread is now waiting for the lock)
+                handler.close()
+
+        shutdown_thread = threading.Thread(target=shutdown)
+        shutdown_thread.start()
+        shutdown_thread.join(10.0)
+        assert not shutdown_thread.is_alive()
+        receive_thread.join(10.0)
+    assert len(batches) == 1 and len(batches[0]) == 1  # (sent by close())
+
+
+if is_main():
+    test_aggregation()
+    test_forwarding_close_with_lock_held()
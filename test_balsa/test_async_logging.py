@@ -0,0 +1,184 @@
+import logging
+import statistics
+import threading
+import time
+from typing import List
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, HandlerType, BalsaQueueHandler
+
+from .tst_balsa import TstCLIBalsa
+
+
+def test_async_logging():
+    application_name = "test_async_logging"
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_async = True
+    balsa.init_logger()
+
+    # only the enqueueing handler is on the logger - the real handlers are behind the listener thread
+    assert len(balsa.log.handlers) == 1
+    assert isinstance(balsa.log.handlers[0], BalsaQueueHandler)
+    assert HandlerType.File in balsa.handlers
+
+    log = get_logger(application_name)
+    message_count = 1000
+    for count in range(message_count):
+        log.info(f"message {count}")
+
+    balsa.remove()  # drains the queue
+
+    string_list = balsa.handlers[HandlerType.StringList].strings
+    assert string_list[-1].endswith(f"message {message_count - 1}")
+    assert "test_async_logging.py" in string_list[-1]  # caller info is captured on the logging thread
+    log_text = balsa.log_path.read_text()
+    assert all(f"message {count}\n" in log_text for count in range(message_count))
+
+
+def test_async_logging_callback():
+    application_name = "test_async_logging_callback"
+
+    callback_records = []
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_async = True
+    balsa.error_callback = callback_records.append
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    log.error("an error")
+    assert len(callback_records) == 1  # the error callback is called synchronously, on the logging thread
+
+    balsa.remove()
+
+
+class BlockedHandler(logging.Handler):
+    """
+    A slow sink - handling waits until the test lets it continue.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.messages = []  # type: List[str]
+
+    def emit(self, record: logging.LogRecord):
+        self.unblock.wait()
+        if (message := record.getMessage()).startswith("message "):  # (not Balsa's own records, e.g. the log file path)
+            self.messages.append(message)
+
+
+def test_async_logging_slow_sink():
+    application_name = "test_async_logging_slow_sink"
+    message_count = 100
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_async = True
+    balsa.init_logger()
+    blocked_handler = BlockedHandler()
+    balsa.queue_listener.add_handler(blocked_handler)
+
+    # the log calls return while the sink is blocked, since they only put the records on the queue
+    log = get_logger(application_name)
+    for count in range(message_count):
+        log.info(f"message {count}")
+    assert blocked_handler.messages == []
+    blocked_handler.unblock.set()
+    balsa.remove()  # drains the queue
+    assert blocked_handler.messages == [f"message {count}" for count in range(message_count)]  # all delivered, in order
+    assert logging.getLogger(application_name).handlers == []
+
+
+def test_async_logging_full_queue():
+    application_name = "test_async_logging_full_queue"
+    message_count = 100
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_async = True
+    balsa.async_queue_size = 10
+    balsa.init_logger()
+    blocked_handler = BlockedHandler()
+    balsa.queue_listener.add_handler(blocked_handler)
+
+    # once the queue is full, the log calls wait for the (blocked) sink rather than drop records
+    log = get_logger(application_name)
+    logging_thread = threading.Thread(target=lambda: [log.info(f"message {count}") for count in range(message_count)])
+    logging_thread.start()
+    logging_thread.join(0.5)
+    assert logging_thread.is_alive()
+    blocked_handler.unblock.set()
+    logging_thread.join(10.0)
+    assert not logging_thread.is_alive()
+    balsa.remove()
+    assert blocked_handler.messages == [f"message {count}" for count in range(message_count)]
+
+
+def test_async_logging_message_snapshot():
+    application_name = "test_async_logging_message_snapshot"
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_async = True
+    balsa.init_logger()
+    blocked_handler = BlockedHandler()
+    balsa.queue_listener.add_handler(blocked_handler)
+
+    # the message is rendered on the logging thread, so changing the arguments afterwards (while the record is still queued) doesn't change it
+    log = get_logger(application_name)
+    state = {"n": 1}
+    log.info("message state=%s", state)
+    state["n"] = 999
+    blocked_handler.unblock.set()
+    balsa.remove()
+    assert blocked_handler.messages == ["message state={'n': 1}"]
+
+
+class SlowHandler(logging.Handler):
+    """
+    A sink with a fixed cost per record (e.g. a network or slow disk write).
+    """
+
+    def emit(self, record: logging.LogRecord):
+        time.sleep(0.0001)
+
+
+@pytest.mark.benchmark
+def test_async_logging_latency():
+    application_name = "test_async_logging_latency"
+    message_count = 5000  # (fewer than the queue size, so the log calls never wait for room)
+
+    def log_call_latency(use_async: bool) -> List[float]:
+        balsa = TstCLIBalsa(application_name)
+        balsa.use_async = use_async
+        balsa.verbose = False  # (the console would dominate the sync case)
+        balsa.init_logger()
+        if use_async:
+            balsa.queue_listener.add_handler(SlowHandler())
+        else:
+            balsa.log.addHandler(SlowHandler())
+        log = get_logger(application_name)
+        durations = []
+        for count in range(message_count):
+            start = time.perf_counter()
+            log.info("message %d", count)
+            durations.append(time.perf_counter() - start)
+        balsa.remove()
+        return durations
+
+    latencies = {}
+    for use_async in (False, True):
+        percentiles = statistics.quantiles(log_call_latency(use_async), n=100)
+        latencies[use_async] = (1e6 * percentiles[49], 1e6 * percentiles[98])
+        print(f"{use_async=} : log call latency p50={latencies[use_async][0]:.1f} us, p99={latencies[use_async][1]:.1f} us")
+    assert latencies[True][1] < latencies[False][0]  # the async p99 beats even the sync p50
+
+
+if is_main():
+    test_async_logging()
+    test_async_logging_callback()
+    test_async_logging_slow_sink()
+    test_async_logging_full_queue()
+    test_async_logging_message_snapshot()
+    test_async_logging_latency()
@@ -1,7 +1,13 @@
+import time
+import json
+import logging
+
+import pytest
 from ismain import is_main
 
 from yasf import sf
 from balsa import get_logger, HandlerType
+from balsa.aws_cloudwatch_logs import AWSCloudWatchLogHandler, split_log_events, cloudwatch_event_overhead, cloudwatch_max_batch_span
 
 from .tst_balsa import TstCLIBalsa
 
@@ -39,5 +45,138 @@ def test_inhibit_cloud_services_disables_aws_cloudwatch_logs():
     balsa.remove()
 
 
+class FakeLogsAccess:
+    """
+    Local stand-in for AWSimple LogsAccess - records what would have been sent to AWS CloudWatch
+    """
+
+    def __init__(self, put_time: float = 0.0):
+        self.put_time = put_time  # simulated network round trip time
+        self.messages = []
+        self.batches = []
+
+    def put(self, message: str):
+        time.sleep(self.put_time)
+        self.messages.append(message)
+
+    def put_events(self, log_events: list):
+        time.sleep(self.put_time)
+        self.batches.append(log_events)
+
+
+def get_batch_handler_logger(logger_name: str, fake_logs_access: FakeLogsAccess, **kwargs):
+    handler = AWSCloudWatchLogHandler(logger_name, **kwargs)
+    handler.logs_access = fake_logs_access
+    logger = logging.getLogger(logger_name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return handler, logger
+
+
+def test_aws_cloudwatch_batch_count():
+    fake_logs_access = FakeLogsAccess()
+    handler, logger = get_batch_handler_logger("test_aws_cloudwatch_batch_count", fake_logs_access, batch=True, batch_max_count=100, batch_max_age=60.0)
+    record_count = 1050
+    for count in range(record_count):
+        logger.info(sf("message", count=count))
+    handler.close()
+
+    assert sum(len(batch) for batch in fake_logs_access.batches) == record_count
+    assert all(len(batch) <= 100 for batch in fake_logs_access.batches)
+    for batch in fake_logs_access.batches:
+        time_stamps = [log_event["timestamp"] for log_event in batch]
+        assert time_stamps == sorted(time_stamps)
+    counts = [json.loads(log_event["message"])["count"] for batch in fake_logs_access.batches for log_event in batch]
+    assert sorted(counts) == list(range(record_count))
+    assert len(fake_logs_access.messages) == 0  # nothing sent one record at a time
+
+
+def test_aws_cloudwatch_batch_bytes():
+    fake_logs_access = FakeLogsAccess()
+    max_bytes = 20000
+    handler, logger = get_batch_handler_logger("test_aws_cloudwatch_batch_bytes", fake_logs_access, batch=True, batch_max_bytes=max_bytes, batch_max_age=60.0)
+    for count in range(100):
+        logger.info("x" * 1000)
+    handler.close()
+
+    assert sum(len(batch) for batch in fake_logs_access.batches) == 100
+    for batch in fake_logs_access.batches:
+        assert sum(len(log_event["message"]) + cloudwatch_event_overhead for log_event in batch) <= max_bytes
+
+
+def test_aws_cloudwatch_batch_age():
+    fake_logs_access = FakeLogsAccess()
+    handler, logger = get_batch_handler_logger("test_aws_cloudwatch_batch_age", fake_logs_access, batch=True, batch_max_age=0.1)
+    for count in range(3):
+        logger.info(f"message {count}")
+    time.sleep(1.0)
+    assert len(fake_logs_access.batches) == 1  # put by the worker thread, without close() or flush()
+    assert len(fake_logs_access.batches[0]) == 3
+    # later batches are put by age too (not only the first one)
+    for count in range(2):
+        logger.info(f"message {count}")
+    time.sleep(1.0)
+    assert [len(batch) for batch in fake_logs_access.batches] == [3, 2]
+    handler.close()
+
+
+@pytest.mark.benchmark
+def test_aws_cloudwatch_batch_throughput():
+    record_count = 200
+
+    def records_per_second(batch: bool) -> float:
+        fake_logs_access = FakeLogsAccess(put_time=0.001)
+        handler, logger = get_batch_handler_logger("test_aws_cloudwatch_batch_throughput", fake_logs_access, batch=batch)
+        start = time.perf_counter()
+        for count in range(record_count):
+            logger.warning(sf("message", count=count))
+        duration = time.perf_counter() - start
+        handler.close()
+        assert len(fake_logs_access.messages) + sum(len(batch) for batch in fake_logs_access.batches) == record_count
+        return record_count / duration
+
+    unbatched = records_per_second(False)
+    batched = records_per_second(True)
+    print(f"AWS CloudWatch handler records/sec : {unbatched=:.0f} {batched=:.0f}")
+    assert batched > 2.0 * unbatched
+
+
+def test_split_log_events():
+    log_events = [{"timestamp": 1000 * count, "message": "a" * 100} for count in range(10)]
+    assert [len(batch) for batch in split_log_events(log_events, 4, 100000)] == [4, 4, 2]
+    assert [len(batch) for batch in split_log_events(log_events, 100, 3 * (100 + cloudwatch_event_overhead))] == [3, 3, 3, 1]
+    log_events = [{"timestamp": 0, "message": "a"}, {"timestamp": cloudwatch_max_batch_span, "message": "b"}]
+    assert len(split_log_events(log_events, 100, 100000)) == 2  # a batch can't span 24 hours
+
+
+def test_balsa_aws_cloudwatch_logs_batch():
+    application_name = "test_balsa_aws_cloudwatch_logs_batch"
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_aws_cloudwatch_logs = True
+    balsa.aws_cloudwatch_batch = True
+    balsa.init_logger()
+
+    fake_logs_access = FakeLogsAccess()
+    handler = balsa.handlers[HandlerType.AWSCloudWatch]
+    handler.logs_access = fake_logs_access
+
+    log = get_logger(application_name)
+    log.warning(sf("another message", issue="something really went wrong"))
+    handler.flush()
+    assert len(fake_logs_access.batches) == 1
+    put_dict = json.loads(fake_logs_access.batches[0][0]["message"])
+    assert put_dict["message"] == "another message"
+    assert put_dict["issue"] == "something really went wrong"
+
+    # remove() puts what's still batched and stops the batch thread
+    log.warning("last message")
+    balsa.remove()
+    assert len(fake_logs_access.batches) == 2
+    assert json.loads(fake_logs_access.batches[1][0]["message"])["message"] == "last message"
+    assert handler._batch_thread is None
+
+
 if is_main():
     test_balsa_aws_cloudwatch_logs()
@@ -0,0 +1,128 @@
+import io
+import time
+import logging
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, sf, iter_records, iter_record_strings, BalsaRecord, BalsaFormatter, RecordFilter, query_records, iter_indexed_records
+from balsa import BalsaRotatingFileHandler, binary_to_text, iter_binary_records
+from balsa.binary_format import binary_magic
+from balsa.parallel import get_work_units
+from balsa.cli import main
+
+from .tst_balsa import TstCLIBalsa
+from .test_file_handler import make_log_directory
+from .test_json_lines import write_logs
+
+
+def test_binary_format(capsys):
+    binary_balsa = write_logs("test_binary_format_binary", "binary")
+    text_balsa = write_logs("test_binary_format_text", "text")
+    assert binary_balsa.log_path.read_bytes().startswith(binary_magic)
+
+    binary_records = list(iter_records(binary_balsa.log_path))
+    text_records = list(iter_records(text_balsa.log_path))
+    assert len(binary_records) == len(text_records)
+    assert all(record.valid for record in binary_records)
+    for binary_record, text_record in zip(binary_records, text_records):
+        # a record read from the binary format is the same as from the text format
+        binary_dict = binary_record.as_dict()
+        text_dict = text_record.as_dict()
+        for record_dict in [binary_dict, text_dict]:
+            del record_dict["time_stamp"]
+            record_dict["name"] = record_dict["name"].replace("_binary", "").replace("_text", "")
+            record_dict["message"] = record_dict["message"].replace("_binary", "").replace("_text", "")
+        assert binary_dict == text_dict
+        assert binary_record.time_stamp.utcoffset() == text_record.time_stamp.utcoffset()
+
+    # converted to text
+    text_output = io.StringIO()
+    binary_to_text(binary_balsa.log_path, text_output)
+    record_strings = list(iter_record_strings(binary_balsa.log_path))
+    assert text_output.getvalue() == "".join(f"{record_string}\n" for record_string in record_strings)
+    for record_string, binary_record in zip(record_strings, binary_records):
+        assert BalsaRecord(record_string).as_dict() == binary_record.as_dict()
+    capsys.readouterr()
+    main(["text", str(binary_balsa.log_path)])
+    assert capsys.readouterr().out == text_output.getvalue()
+
+
+def test_binary_format_rollover():
+    log_directory = make_log_directory("test_binary_format_rollover")
+    log_path = log_directory / "test_binary_format_rollover.log"
+
+    log = logging.getLogger("test_binary_format_rollover")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    record_count = 0
+    for _ in range(2):  # the second time appends to the existing log file (e.g. after a restart)
+        handler = BalsaRotatingFileHandler(log_path, max_bytes=4000, backup_count=100, binary=True)
+        handler.setFormatter(BalsaFormatter())
+        log.addHandler(handler)
+        for _ in range(500):
+            log.info(sf(f"message {record_count}", count=record_count))
+            record_count += 1
+        log.removeHandler(handler)
+        handler.close()
+
+    log_file_paths = sorted(log_directory.iterdir())
+    assert len(log_file_paths) > 10
+    for log_file_path in log_file_paths:
+        # each segment has its own dictionary, so it can be read on its own
+        assert log_file_path.stat().st_size <= 4000
+        with log_file_path.open("rb") as log_file:
+            assert all(record.name == "test_binary_format_rollover" for record in iter_binary_records(log_file))
+
+    records = list(iter_records(log_directory))
+    assert [record.structured_record["count"] for record in records] == list(range(record_count))
+    assert all(earlier.time_stamp <= later.time_stamp for earlier, later in zip(records, records[1:]))
+
+    # binary log files are read in full (not split or indexed)
+    assert len(get_work_units(log_directory, split_size=1000)) == len(log_file_paths)
+    query_results = list(query_records(log_directory, RecordFilter(structured={"count": "600"}), max_workers=2))
+    assert [record.message for record in query_results] == ["message 600 <<>> "]
+    assert len(list(iter_indexed_records(log_directory, start_time=records[100].time_stamp, end_time=records[200].time_stamp))) >= 100
+
+
+def write_size_logs(name: str, record_count: int) -> dict:
+    # the same records in the text and binary formats
+    log_paths = {}
+    for log_format in ["text", "binary"]:
+        application_name = f"{name}_{log_format}"
+        balsa = TstCLIBalsa(application_name)
+        balsa.log_format = log_format
+        balsa.verbose = False  # (the console only shows warnings and above, so it is not timed)
+        balsa.init_logger()
+        log = get_logger(application_name)
+        for count in range(record_count):
+            log.info(f"processed item {count}")
+        balsa.remove()
+        log_paths[log_format] = balsa.log_path
+    return log_paths
+
+
+def test_binary_format_size():
+    record_count = 20000
+    log_paths = write_size_logs("test_binary_format_size", record_count)
+    for log_path in log_paths.values():
+        assert [record.message for record in iter_records(log_path)][1:] == [f"processed item {count}" for count in range(record_count)]  # (after the log file path)
+    assert log_paths["binary"].stat().st_size < log_paths["text"].stat().st_size / 2
+
+
+@pytest.mark.benchmark
+def test_binary_format_read_benchmark():
+    record_count = 20000
+    durations = {}
+    for log_format, log_path in write_size_logs("test_binary_format_read_benchmark", record_count).items():
+        start = time.perf_counter()
+        assert sum(1 for _ in iter_records(log_path)) == record_count + 1
+        durations[log_format] = time.perf_counter() - start
+        print(f"{log_format} : {log_path.stat().st_size} bytes, {1e6 * durations[log_format] / record_count:.1f} us per record read")
+    assert durations["binary"] < durations["text"]
+
+
+if is_main():
+    test_binary_format_rollover()
+    test_binary_format_size()
+    test_binary_format_read_benchmark()
@@ -0,0 +1,140 @@
+import inspect
+import logging
+
+from ismain import is_main
+
+from balsa import get_logger, BalsaRecord, find_caller, install_find_caller, uninstall_find_caller, set_caller_info, caller_info
+
+from .tst_balsa import TstCLIBalsa
+
+
+class CallerHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.callers = []
+
+    def emit(self, record: logging.LogRecord):
+        self.callers.append((record.pathname, record.lineno, record.funcName, record.stack_info))
+
+
+def wrapped_log(log: logging.Logger, message: str):
+    log.info(message, stacklevel=2)
+
+
+def log_calls(log: logging.Logger):
+    log.info("direct")
+    log.warning("%s", "args")
+    log.log(logging.INFO, "log")
+    log.info("stack info", stack_info=True)
+    wrapped_log(log, "wrapped")
+    log.info("too deep", stacklevel=1000)
+    try:
+        raise ValueError("problem")
+    except ValueError:
+        log.exception("exception")
+
+
+def test_find_caller_same_as_standard():
+    log = logging.getLogger("test_find_caller_same_as_standard")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handler = CallerHandler()
+    log.addHandler(handler)
+    callers = {}
+    for fast in [False, True]:
+        if fast:
+            install_find_caller()
+        handler.callers.clear()
+        try:
+            log_calls(log)
+        finally:
+            uninstall_find_caller()
+        callers[fast] = list(handler.callers)
+    assert len(callers[True]) == 7
+    assert callers[True] == callers[False]
+    assert callers[True][0][0] == __file__ and callers[True][0][2] == "log_calls"
+    assert callers[True][4][2] == "log_calls"  # stacklevel=2 skips wrapped_log()
+    assert find_caller(log)[:3] == logging.Logger.findCaller(log)[:3]
+
+
+def test_caller_info_switches():
+    application_name = "test_caller_info_switches"
+    balsa = TstCLIBalsa(application_name)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    hot_log = get_logger(f"{application_name}.hot")
+    try:
+        log.info("with caller info")
+        with caller_info(False):
+            log.info("region without caller info")
+        log.info("caller info again")
+        set_caller_info(hot_log, False)
+        hot_log.info("logger without caller info")
+        hot_log.info("stack info is still found", stack_info=True)
+        log.info("other loggers still have caller info")
+        string_list = balsa.get_string_list()
+    finally:
+        set_caller_info(hot_log, True)
+        uninstall_find_caller()
+        balsa.remove()
+
+    records = [BalsaRecord(s) for s in string_list]
+    assert [(record.file_name, record.line_number, record.function_name) != ("?", 0, "?") for record in records] == [True, False, True, False, True, True]
+    assert records[0].file_name == "test_caller.py" and records[0].function_name == "test_caller_info_switches"
+    assert records[1].message == "region without caller info"
+    assert records[3].name == f"{application_name}.hot"
+
+    # the placeholders are also parsed from the log file
+    log_text = balsa.log_path.read_text()
+    assert " - ? - 0 - ? - INFO - logger without caller info" in log_text
+
+
+def test_fast_caller_info():
+    application_name = "test_fast_caller_info"
+    standard_find_caller = logging.Logger.findCaller
+    balsa = TstCLIBalsa(application_name)
+    balsa.use_fast_caller_info = True
+    balsa.init_logger()
+    assert logging.Logger.findCaller is find_caller
+    log = get_logger(application_name)
+    log.info("direct")
+    direct_line_number = inspect.currentframe().f_lineno - 1  # type: ignore
+    wrapped_log(log, "wrapped")
+    wrapped_line_number = inspect.currentframe().f_lineno - 1  # type: ignore
+    string_list = balsa.get_string_list()
+    balsa.remove()
+    assert logging.Logger.findCaller is standard_find_caller  # put back by remove()
+
+    records = {record.message: record for record in (BalsaRecord(s) for s in string_list)}
+    assert (records["direct"].file_name, records["direct"].line_number, records["direct"].function_name) == ("test_caller.py", direct_line_number, "test_fast_caller_info")
+    assert (records["wrapped"].file_name, records["wrapped"].line_number, records["wrapped"].function_name) == ("test_caller.py", wrapped_line_number, "test_fast_caller_info")
+
+
+def test_caller_info_off_root():
+    # the default is_root=True - the switch is on the root logger, and applies to the application's loggers
+    application_name = "test_caller_info_off_root"
+    balsa = TstCLIBalsa(application_name, is_root=True)
+    balsa.caller_info = False
+    balsa.init_logger()
+    try:
+        get_logger(application_name).info("application logger")
+        get_logger(f"{application_name}.module").info("module logger")
+        set_caller_info(f"{application_name}.module", True)  # (a descendant's own setting)
+        get_logger(f"{application_name}.module").info("module logger with caller info")
+        string_list = balsa.get_string_list()
+    finally:
+        balsa.remove()
+
+    records = {record.message: record for record in (BalsaRecord(s) for s in string_list)}
+    assert (records["application logger"].file_name, records["application logger"].line_number, records["application logger"].function_name) == ("?", 0, "?")
+    assert (records["module logger"].file_name, records["module logger"].line_number, records["module logger"].function_name) == ("?", 0, "?")
+    assert records["module logger with caller info"].function_name == "test_caller_info_off_root"
+    # remove() clears the root logger's switch
+    assert find_caller(logging.getLogger(application_name))[2] == "test_caller_info_off_root"
+
+
+if is_main():
+    test_find_caller_same_as_standard()
+    test_caller_info_switches()
+    test_fast_caller_info()
+    test_caller_info_off_root()
@@ -0,0 +1,87 @@
+import sys
+import time
+import logging
+
+import pytest
+from ismain import is_main
+
+from balsa import BalsaFormatter, BalsaCompiledFormatter, lsf
+
+from .test_format_cache import log_format
+
+formats = [
+    log_format,
+    "%(message)s",
+    "100%% {literal braces} %(levelname)s : %(message)s",
+    "%(asctime)s %(name)s",
+    "%(levelname)-8s %(message)s",
+    "%(lineno)d %(process)08x %(message)s",
+    None,  # the logging default format
+]
+
+
+def make_records(exc_info=None, stack_info=None):
+    # the same record twice (each formatter caches its output on the record)
+    records = []
+    for _ in range(2):
+        record = logging.LogRecord("test_compiled_formatter", logging.WARNING, __file__, 42, "message %s", ("args",), exc_info, "make_records", stack_info)
+        records.append(record)
+    records[1].created = records[0].created
+    records[1].msecs = records[0].msecs
+    records[1].relativeCreated = records[0].relativeCreated
+    return records
+
+
+def test_compiled_formatter_same_output():
+    try:
+        raise ValueError("problem")
+    except ValueError:
+        exc_info = sys.exc_info()
+    for fmt in formats:
+        for kwargs in [{}, {"exc_info": exc_info}, {"stack_info": "Stack (most recent call last):\n  line"}]:
+            compiled_record, record = make_records(**kwargs)
+            assert BalsaCompiledFormatter(fmt).format(compiled_record) == BalsaFormatter(fmt).format(record)
+        compiled_record, record = make_records()
+        assert BalsaCompiledFormatter(fmt, datefmt="%H:%M").format(compiled_record) == BalsaFormatter(fmt, datefmt="%H:%M").format(record)
+        compiled_record, record = make_records()
+        assert BalsaCompiledFormatter(fmt, prefix="\r").format(compiled_record) == BalsaFormatter(fmt, prefix="\r").format(record)
+
+    assert BalsaCompiledFormatter(log_format)._template is not None
+    assert BalsaCompiledFormatter("%(levelname)-8s %(message)s")._template == "%-8s %s"
+    assert BalsaCompiledFormatter("{levelname} {message}", style="{")._template is None
+
+    # structured messages
+    compiled_record, record = make_records()
+    compiled_record.msg = record.msg = lsf("structured", answer=42)
+    compiled_record.args = record.args = ()
+    assert BalsaCompiledFormatter(log_format).format(compiled_record) == BalsaFormatter(log_format).format(record)
+
+    # a field that isn't in the record
+    compiled_record, record = make_records()
+    for formatter, test_record in [(BalsaCompiledFormatter("%(missing)s"), compiled_record), (BalsaFormatter("%(missing)s"), record)]:
+        try:
+            formatter.format(test_record)
+            assert False
+        except ValueError:
+            pass
+
+
+@pytest.mark.benchmark
+def test_compiled_formatter_benchmark():
+    record_count = 20000
+    durations = {}
+    for _ in range(3):  # best of 3, interleaved (the first round also warms up)
+        for formatter in [logging.Formatter(log_format), BalsaFormatter(log_format), BalsaCompiledFormatter(log_format)]:
+            records = [logging.LogRecord("test_compiled_formatter_benchmark", logging.INFO, __file__, count, "message %s", (count,), None) for count in range(record_count)]
+            start = time.perf_counter()
+            for record in records:
+                formatter.format(record)
+            duration = time.perf_counter() - start
+            durations[formatter.__class__.__name__] = min(duration, durations.get(formatter.__class__.__name__, duration))
+    print(", ".join(f"{formatter_name}={1e6 * duration / record_count:.2f} uS" for formatter_name, duration in durations.items()))
+    assert durations["BalsaCompiledFormatter"] < durations["BalsaFormatter"]
+
+
+if is_main():
+    test_compiled_formatter_same_output()
+    test_compiled_formatter_benchmark()
@@ -0,0 +1,130 @@
+import gzip
+import logging
+import threading
+from pathlib import Path
+from typing import Union
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, iter_records, iter_indexed_records, get_log_file_paths, query_records, RecordFilter, BalsaRotatingFileHandler, BalsaFormatter
+
+from .tst_balsa import TstCLIBalsa
+
+
+def write_compressed_logs(application_name: str, compression: str, use_log_index: bool = False) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 20000
+    balsa.backup_count = 10
+    balsa.log_compression = compression
+    balsa.use_log_index = use_log_index
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    for count in range(2000):
+        if count % 100 == 0:
+            log.error(f"error {count}")
+        else:
+            log.info(f"message {count}")
+    balsa.remove()  # closes the log file, which waits for the compression to finish
+    return balsa
+
+
+@pytest.mark.parametrize("compression, extension", [("gzip", ".gz"), ("bz2", ".bz2"), ("lzma", ".xz")])
+def test_compression(compression: str, extension: str):
+    application_name = f"test_compression_{compression}"
+    balsa = write_compressed_logs(application_name, compression)
+
+    log_file_paths = get_log_file_paths(balsa.log_directory)
+    assert len(log_file_paths) == balsa.backup_count + 1
+    assert log_file_paths[-1] == balsa.log_path  # current log file isn't compressed
+    assert log_file_paths[-2] == Path(f"{balsa.log_path}.1{extension}")
+    assert all(log_file_path.name.endswith(extension) for log_file_path in log_file_paths[:-1])
+    assert not any(file_path.name.endswith(".tmp") for file_path in balsa.log_directory.iterdir())
+
+    messages = [record.message for record in iter_records(balsa.log_directory) if record.name == application_name]
+    assert messages[-1] == "message 1999"
+    assert [int(message.split()[1]) for message in messages] == list(range(2000 - len(messages), 2000))  # in order, with nothing missing
+
+
+def test_compression_query():
+    application_name = "test_compression_query"
+    balsa = write_compressed_logs(application_name, "gzip", True)
+    all_records = [record for record in iter_records(balsa.log_directory) if record.valid]
+    assert not any(file_path.name.endswith(".gz.idx") for file_path in balsa.log_directory.iterdir())
+
+    errors = [str(record) for record in all_records if record.log_level >= logging.ERROR]
+    assert len(errors) > 0
+    assert [str(record) for record in iter_indexed_records(balsa.log_directory, min_level=logging.ERROR)] == errors
+    assert [str(record) for record in query_records(balsa.log_directory, RecordFilter(min_level=logging.ERROR))] == errors
+    assert [str(record) for record in query_records(balsa.log_directory, RecordFilter(), max_workers=2)] == [str(record) for record in all_records]
+
+
+def test_compression_previous_run():
+    # uncompressed backups from a run without compression are compressed
+    application_name = "test_compression_previous_run"
+    log_directory = Path("temp", application_name)
+    log_directory.mkdir(parents=True, exist_ok=True)
+    for file_path in log_directory.iterdir():
+        file_path.unlink()
+    backup_path = Path(log_directory, f"{application_name}.log.1")
+    backup_path.write_text("2021-10-23T21:20:26.677123-07:00 - test - MainProcess - test.py - 15 - main - INFO - a\n")
+
+    file_handler = BalsaRotatingFileHandler(Path(log_directory, f"{application_name}.log"), 1000, 3, compression="gzip")
+    file_handler.close()
+    assert not backup_path.exists()
+    assert gzip.decompress(Path(f"{backup_path}.gz").read_bytes()).endswith(b"INFO - a\n")
+
+    with pytest.raises(ValueError):
+        BalsaRotatingFileHandler(Path(log_directory, f"{application_name}.log"), compression="zip")
+
+
+class BlockedCompressionHandler(BalsaRotatingFileHandler):
+    """
+    Compression waits until the test lets it continue.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.unblock = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _compress(self, source_path: Path) -> Union[Path, None]:
+        self.unblock.wait()
+        return super()._compress(source_path)
+
+
+def test_compression_during_rollover():
+    application_name = "test_compression_during_rollover"
+    log_directory = Path("temp", application_name)
+    log_directory.mkdir(parents=True, exist_ok=True)
+    for file_path in log_directory.iterdir():
+        file_path.unlink()
+    backup_count = 3
+
+    file_handler = BlockedCompressionHandler(Path(log_directory, f"{application_name}.log"), 2000, backup_count, compression="gzip")
+    file_handler.setFormatter(BalsaFormatter("%(asctime)s - %(name)s - %(processName)s - %(filename)s - %(lineno)s - %(funcName)s - %(levelname)s - %(message)s"))
+    logger = logging.getLogger(application_name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [file_handler]
+
+    # the log rolls over (and the backups are renumbered) while a backup is being compressed - including the backup being compressed becoming the oldest
+    logging_thread = threading.Thread(target=lambda: [logger.info(f"message {count}") for count in range(200)])
+    logging_thread.start()
+    logging_thread.join(10.0)
+    assert not logging_thread.is_alive()  # rollover didn't wait for the compression
+    assert file_handler._compressing_path.exists()
+
+    file_handler.unblock.set()
+    file_handler.close()
+    assert not file_handler._compressing_path.exists()
+    log_file_paths = get_log_file_paths(log_directory)
+    assert [log_file_path.name for log_file_path in log_file_paths] == [f"{application_name}.log.{number}.gz" for number in range(backup_count, 0, -1)] + [f"{application_name}.log"]
+    messages = [record.message for record in iter_records(log_directory)]
+    assert [int(message.split()[1]) for message in messages] == list(range(200 - len(messages), 200))  # in order, with nothing missing
+
+
+if is_main():
+    test_compression("gzip", ".gz")
+    test_compression_query()
+    test_compression_during_rollover()
@@ -0,0 +1,107 @@
+import math
+import shutil
+import logging
+from pathlib import Path
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, sf, iter_records, export_records, iter_archive_parts, ColumnarArchiveWriter, BalsaRecord
+from balsa.export import _read_npy
+from balsa.cli import main
+
+from .tst_balsa import TstCLIBalsa
+
+
+def write_logs(application_name: str) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 50000
+    balsa.backup_count = 1000
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    for count in range(1000):
+        if count % 10 == 0:
+            log.warning(sf("reading", count=count, sensor={"name": f"sensor_{count % 3}", "value": count / 10}, note="ok" if count % 20 == 0 else 1))
+        else:
+            log.info(f"message {count} é")
+    balsa.remove()
+    return balsa
+
+
+def test_export():
+    application_name = "test_export"
+    balsa = write_logs(application_name)
+    archive_path = Path("temp", application_name)
+    shutil.rmtree(archive_path, ignore_errors=True)
+
+    records = [record for record in iter_records(balsa.log_directory) if record.valid]
+    assert export_records(balsa.log_directory, archive_path) == len(records)
+
+    parts = list(iter_archive_parts(archive_path))
+    assert sum(part.record_count for part in parts) == len(records)
+    messages = [message for part in parts for message in part.strings("message")]
+    assert messages == [record.message for record in records]
+    names = [name for part in parts for name in part.strings("name")]
+    assert names == [record.name for record in records]
+    assert [level for part in parts for level in _read_npy(Path(part.path, "log_level.npy"))] == [record.log_level for record in records]
+
+    part = parts[-1]
+    assert part.columns["structured.count"] == "numeric"
+    assert part.columns["structured.sensor.value"] == "numeric"
+    assert part.columns["structured.sensor.name"] == "dictionary"
+    assert part.columns["structured.note"] == "dictionary"  # mixed types
+    assert len(part.dictionary("structured.sensor.name")) == 3
+    notes = part.strings("structured.note")
+    assert set(notes) == {"ok", "1", None}
+
+    assert len(list(iter_archive_parts(archive_path, start_time=parts[-1].end_time + 1.0))) == 0
+
+
+def test_export_partitions():
+    archive_path = Path("temp", "test_export_partitions")
+    shutil.rmtree(archive_path, ignore_errors=True)
+    log_strings = [
+        "2021-10-23T21:20:26.000000-07:00 - a - MainProcess - a.py - 1 - main - INFO - one",
+        "2021-10-23T21:20:27.000000-07:00 - a - MainProcess - a.py - 2 - main - INFO - two",
+        "2021-10-23T22:20:26.000000-07:00 - a - MainProcess - a.py - 3 - main - INFO - three",
+        "2021-10-23T21:59:59.000000-07:00 - a - MainProcess - a.py - 4 - main - INFO - four",  # slightly out of order
+        "2021-10-24T21:20:26.000000-07:00 - a - MainProcess - a.py - 5 - main - INFO - five",
+        "2021-10-23T21:20:28.000000-07:00 - a - MainProcess - a.py - 6 - main - INFO - six",  # very out of order
+    ]
+    with ColumnarArchiveWriter(archive_path, max_part_records=1000) as archive_writer:
+        for log_string in log_strings:
+            archive_writer.add(BalsaRecord(log_string))
+        archive_writer.add(BalsaRecord("not a record"))
+    assert archive_writer.record_count == len(log_strings)
+
+    parts = list(iter_archive_parts(archive_path))
+    assert [part.path.parent.name for part in parts] == ["20211024T040000Z", "20211024T040000Z", "20211024T050000Z", "20211025T040000Z"]
+    assert [part.strings("message") for part in parts] == [["one", "two", "four"], ["six"], ["three"], ["five"]]
+
+
+def test_export_numpy():
+    numpy = pytest.importorskip("numpy")
+    application_name = "test_export_numpy"
+    balsa = write_logs(application_name)
+    archive_path = Path("temp", application_name)
+    shutil.rmtree(archive_path, ignore_errors=True)
+    main(["export", str(balsa.log_directory), str(archive_path)])
+
+    for part in iter_archive_parts(archive_path):
+        time_stamps = part.array("time_stamp")
+        assert isinstance(time_stamps, numpy.memmap)
+        assert len(time_stamps) == part.record_count
+        assert time_stamps.min() == part.start_time
+        log_levels = part.array("log_level")
+        values = part.array("structured.sensor.value")
+        assert numpy.all(numpy.isnan(values[log_levels != logging.WARNING]))
+        assert numpy.all(values[log_levels == logging.WARNING] >= 0.0)
+        name_codes = part.array("structured.sensor.name")
+        assert numpy.all((name_codes >= 0) == (log_levels == logging.WARNING))
+        assert not math.isnan(float(numpy.nanmax(values)))
+
+
+if is_main():
+    test_export()
+    test_export_partitions()
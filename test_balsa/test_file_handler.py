@@ -0,0 +1,238 @@
+import os
+import time
+import threading
+import shutil
+import statistics
+import logging
+import logging.handlers
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from ismain import is_main
+
+from balsa import BalsaRotatingFileHandler, BalsaFormatter, get_log_file_paths, iter_record_strings, get_logger
+
+from .tst_balsa import TstCLIBalsa
+
+log_format = "%(asctime)s - %(name)s - %(processName)s - %(filename)s - %(lineno)s - %(funcName)s - %(levelname)s - %(message)s"
+
+
+def make_log_directory(name: str) -> Path:
+    log_directory = Path("temp", name)
+    shutil.rmtree(log_directory, ignore_errors=True)
+    log_directory.mkdir(parents=True)
+    return log_directory
+
+
+def write_records(handler: logging.Handler, record_count: int, name: str = "test_file_handler"):
+    handler.setFormatter(BalsaFormatter(log_format))
+    for count in range(record_count):
+        handler.handle(logging.LogRecord(name, logging.INFO, __file__, 1, f"message {count} é", None, None, "write_records"))
+    handler.close()
+
+
+def test_rotation_matches_standard_library():
+    # same max_bytes and backup_count behavior as the standard library RotatingFileHandler
+    max_bytes = 5000
+    backup_count = 5
+    standard_directory = make_log_directory("test_rotation_standard")
+    balsa_directory = make_log_directory("test_rotation_balsa")
+    write_records(logging.handlers.RotatingFileHandler(Path(standard_directory, "test.log"), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"), 1000)
+    write_records(BalsaRotatingFileHandler(Path(balsa_directory, "test.log"), max_bytes, backup_count), 1000)
+
+    standard_paths = get_log_file_paths(standard_directory)
+    balsa_paths = get_log_file_paths(balsa_directory)
+    assert [path.name for path in balsa_paths] == [path.name for path in standard_paths]
+    assert all(path.stat().st_size < max_bytes for path in balsa_paths)
+    # (the standard library counts characters, not bytes, so the files can differ a little)
+    assert list(iter_record_strings(balsa_directory))[-1].endswith("message 999 é")
+
+
+def test_timestamp_segments():
+    max_bytes = 5000
+    backup_count = 5
+    log_directory = make_log_directory("test_timestamp_segments")
+    log_path = Path(log_directory, "test.log")
+    write_records(BalsaRotatingFileHandler(log_path, max_bytes, backup_count, timestamp_segments=True), 1000)
+
+    log_file_paths = get_log_file_paths(log_directory)
+    assert len(log_file_paths) == backup_count + 1
+    assert log_file_paths[-1] == log_path
+    assert all(len(path.suffix) == len(".20231114T221320123456") for path in log_file_paths[:-1])
+    assert log_file_paths[:-1] == sorted(log_file_paths[:-1])
+    assert all(path.stat().st_size < max_bytes for path in log_file_paths)
+
+    messages = [record_string.split(" - ")[-1] for record_string in iter_record_strings(log_directory)]
+    assert messages[-1] == "message 999 é"
+    assert [int(message.split()[1]) for message in messages] == list(range(1000 - len(messages), 1000))  # in order, with nothing missing
+
+    # appending to an existing log keeps counting from its size
+    write_records(BalsaRotatingFileHandler(log_path, max_bytes, backup_count, timestamp_segments=True), 100)
+    assert len(get_log_file_paths(log_directory)) == backup_count + 1
+    assert all(path.stat().st_size < max_bytes for path in get_log_file_paths(log_directory))
+
+
+def test_timestamp_segments_compression():
+    log_directory = make_log_directory("test_timestamp_segments_compression")
+    write_records(BalsaRotatingFileHandler(Path(log_directory, "test.log"), 5000, 5, compression="gzip", timestamp_segments=True), 1000)
+    log_file_paths = get_log_file_paths(log_directory)
+    assert len(log_file_paths) == 6
+    assert all(path.suffix == ".gz" for path in log_file_paths[:-1])
+    messages = [record_string.split(" - ")[-1] for record_string in iter_record_strings(log_directory)]
+    assert [int(message.split()[1]) for message in messages] == list(range(1000 - len(messages), 1000))
+
+
+def test_line_endings():
+    # text log files have the platform's line endings, like a file written in text mode (the log file is written in binary mode)
+    log_directory = make_log_directory("test_line_endings")
+    log_path = Path(log_directory, "test.log")
+    handler = BalsaRotatingFileHandler(log_path)
+    assert handler.newline == os.linesep
+    handler.newline = "\r\n"  # (as on Windows)
+    handler.setFormatter(BalsaFormatter(log_format))
+    handler.handle(logging.LogRecord("test_line_endings", logging.INFO, __file__, 1, "first line\nsecond line", None, None, "test_line_endings"))
+    handler.handle(logging.LogRecord("test_line_endings", logging.INFO, __file__, 1, "one line", None, None, "test_line_endings"))
+    handler.close()
+
+    log_bytes = log_path.read_bytes()
+    assert log_bytes.count(b"\r\n") == log_bytes.count(b"\n") == 3
+    assert [record_string.split(" - ")[-1] for record_string in iter_record_strings(log_path)] == ["first line\nsecond line", "one line"]
+
+
+def make_record(count: int, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, "message %d", (count,), None, "make_record")
+
+
+def test_buffered():
+    log_directory = make_log_directory("test_buffered")
+    log_path = Path(log_directory, "test.log")
+    handler = BalsaRotatingFileHandler(log_path, 1000000, 3, buffer_size=100000, flush_interval=0.2)
+    handler.setFormatter(BalsaFormatter(log_format))
+    for count in range(10):
+        handler.handle(make_record(count))
+    assert log_path.stat().st_size == 0  # buffered
+    handler.handle(make_record(10, logging.ERROR))
+    assert len(list(iter_record_strings(log_path))) == 11  # error flushes the buffer
+
+    handler.handle(make_record(11))
+    time.sleep(1.0)
+    assert len(list(iter_record_strings(log_path))) == 12  # flushed after the flush interval
+
+    handler.handle(make_record(12))
+    handler.close()
+    assert list(iter_record_strings(log_path))[-1].endswith("message 12")
+
+
+def test_buffered_rotation():
+    max_bytes = 5000
+    backup_count = 5
+    log_directory = make_log_directory("test_buffered_rotation")
+    handler = BalsaRotatingFileHandler(Path(log_directory, "test.log"), max_bytes, backup_count, index=True, buffer_size=1000)
+    write_records(handler, 1000)
+    log_file_paths = get_log_file_paths(log_directory)
+    assert len(log_file_paths) == backup_count + 1
+    assert all(path.stat().st_size < max_bytes for path in log_file_paths)
+    messages = [record_string.split(" - ")[-1] for record_string in iter_record_strings(log_directory)]
+    assert [int(message.split()[1]) for message in messages] == list(range(1000 - len(messages), 1000))
+
+
+def test_buffered_balsa():
+    application_name = "test_buffered_balsa"
+    balsa = TstCLIBalsa(application_name)
+    balsa.log_buffer_size = 1000000
+    balsa.log_flush_interval = 100.0
+    balsa.init_logger()
+    log = get_logger(application_name)
+    for count in range(100):
+        log.info(f"message {count}")
+    balsa.remove()  # writes the buffer
+    assert list(iter_record_strings(balsa.log_path))[-1].endswith("message 99")
+
+
+def test_buffered_close_with_lock_held():
+    # logging.shutdown() holds the handler lock while it calls close(), and the flush thread may be waiting for that lock
+    log_path = Path(make_log_directory("test_buffered_close_with_lock_held"), "test.log")
+    handler = BalsaRotatingFileHandler(log_path, 1000000, 3, buffer_size=100000, flush_interval=0.05)
+    handler.setFormatter(BalsaFormatter(log_format))
+    handler.handle(make_record(0))
+
+    def shutdown():
+        with handler.lock:  # type: ignore
+            time.sleep(0.2)  # (the flush thread is now waiting for the lock)
+            handler.close()
+
+    shutdown_thread = threading.Thread(target=shutdown)
+    shutdown_thread.start()
+    shutdown_thread.join(10.0)
+    assert not shutdown_thread.is_alive()
+    assert list(iter_record_strings(log_path))[-1].endswith("message 0")
+
+
+file_handler_names = ["RotatingFileHandler", "BalsaRotatingFileHandler", "BalsaRotatingFileHandler buffered"]
+
+
+def run_file_handlers(name: str, record_count: int) -> Dict[str, float]:
+    """
+    Write the same records with the standard library and Balsa file handlers.
+    :param name: log directory name prefix (each handler has its own log directory)
+    :param record_count: number of records
+    :return: median time per record for each handler (in seconds)
+    """
+    chunk_size = 500
+    max_bytes = 1000000
+    handlers = {}  # type: dict
+    for handler_name in file_handler_names:
+        log_directory = make_log_directory(f"{name}_{handler_name}")
+        if handler_name == "RotatingFileHandler":
+            handler = logging.handlers.RotatingFileHandler(Path(log_directory, "test.log"), maxBytes=max_bytes, backupCount=3, encoding="utf-8")
+        elif handler_name == "BalsaRotatingFileHandler":
+            handler = BalsaRotatingFileHandler(Path(log_directory, "test.log"), max_bytes, 3)
+        else:
+            handler = BalsaRotatingFileHandler(Path(log_directory, "test.log"), max_bytes, 3, buffer_size=64 * 1024)
+        handler.setFormatter(BalsaFormatter(log_format))
+        handlers[handler_name] = handler
+
+    # the handlers take turns a chunk at a time, and the median chunk time is used, so a busy machine doesn't favor one handler
+    durations = {}  # type: dict
+    for chunk_start in range(0, record_count, chunk_size):
+        for handler_name, handler in handlers.items():
+            records = [make_record(count) for count in range(chunk_start, min(chunk_start + chunk_size, record_count))]
+            start = time.perf_counter()
+            for record in records:
+                handler.handle(record)
+            durations.setdefault(handler_name, []).append((time.perf_counter() - start) / len(records))
+    for handler in handlers.values():
+        handler.close()
+    return {handler_name: statistics.median(handler_durations) for handler_name, handler_durations in durations.items()}
+
+
+def test_file_handlers_same_records():
+    name = "test_file_handlers_same_records"
+    record_count = 20000
+    run_file_handlers(name, record_count)
+    expected_messages = [f"message {count}" for count in range(record_count)]
+    for handler_name in file_handler_names:
+        log_directory = Path("temp", f"{name}_{handler_name}")
+        assert len(get_log_file_paths(log_directory)) > 1  # rolled over
+        assert [record_string.split(" - ")[-1] for record_string in iter_record_strings(log_directory)] == expected_messages
+
+
+@pytest.mark.benchmark
+def test_file_handler_benchmark():
+    durations = run_file_handlers("test_file_handler_benchmark", 20000)
+    print(", ".join(f"{handler_name}={1e6 * duration:.2f} uS" for handler_name, duration in durations.items()))
+    assert durations["BalsaRotatingFileHandler"] < durations["RotatingFileHandler"]
+    assert durations["BalsaRotatingFileHandler buffered"] < durations["BalsaRotatingFileHandler"]
+
+
+if is_main():
+    test_rotation_matches_standard_library()
+    test_timestamp_segments()
+    test_timestamp_segments_compression()
+    test_line_endings()
+    test_buffered()
+    test_buffered_rotation()
+    test_buffered_close_with_lock_held()
+    test_file_handlers_same_records()
+    test_file_handler_benchmark()
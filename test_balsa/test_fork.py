@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+import multiprocessing
+from typing import Dict, Any
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, iter_records, iter_indexed_records, get_log_file_paths, balsa_clone
+
+from .tst_balsa import TstCLIBalsa
+
+application_name = "test_balsa_fork"
+child_count = 10
+records_per_child = 200
+max_bytes = 20 * 1000  # (the parent rolls the log file over while the children are writing to it)
+modes = ["buffered", "binary", "index", "async", "aggregation"]
+
+
+def child_logging(name: str, child_number: int):
+    # a forked child uses the parent's logging as-is (no balsa_clone() or init_pool_worker())
+    log = get_logger(name)
+    for count in range(records_per_child):
+        log.info(f"child {child_number} {count}")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="os.fork() not available")
+@pytest.mark.parametrize("mode", modes)
+def test_fork_while_logging(mode: str):
+    balsa = TstCLIBalsa(f"{application_name}_{mode}")
+    balsa.verbose = False  # (no console output)
+    balsa.max_bytes = max_bytes
+    balsa.backup_count = 1000
+    balsa.log_buffer_size = 10 * 1000 if mode in ("buffered", "binary") else 0
+    balsa.log_format = "binary" if mode == "binary" else "text"
+    balsa.use_log_index = mode == "index"
+    balsa.use_async = mode == "async"
+    balsa.use_aggregation = mode == "aggregation"
+    balsa.init_logger()
+    log = get_logger(balsa.name)
+    start = datetime.now().astimezone()
+
+    # fork while another thread is logging, so the parent's handlers are in use (and have records buffered or queued) when the process is copied
+    stop = threading.Event()
+
+    def parent_logging():
+        count = 0
+        while not stop.is_set():
+            log.info(f"parent {count}")
+            count += 1
+            time.sleep(0.0001)
+
+    parent_thread = threading.Thread(target=parent_logging)
+    parent_thread.start()
+    processes = []
+    for child_number in range(child_count):
+        time.sleep(0.01)
+        process = multiprocessing.get_context("fork").Process(target=child_logging, args=(balsa.name, child_number))
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join(30.0)
+    stop.set()
+    parent_thread.join()
+    balsa.remove()
+    assert all(process.exitcode == 0 for process in processes)  # (None if a child deadlocked)
+
+    records = list(iter_records(balsa.log_directory))
+    assert len(get_log_file_paths(balsa.log_directory)) > 1  # rolled over
+    assert all(record.valid and record.name == balsa.name for record in records)  # (e.g. no binary record decoded with the other process's dictionary)
+    # each child's records are written (the child's threads are restarted, and what a child has buffered is written when it exits)
+    child_messages = [record.message for record in records if record.message.startswith("child ")]
+    assert sorted(child_messages) == sorted(f"child {child_number} {count}" for child_number in range(child_count) for count in range(records_per_child))
+    # what the parent had buffered or queued when it forked is only written once (by the parent)
+    parent_records = [record for record in records if record.message.startswith("parent ")]
+    assert len(parent_records) > 0
+    assert all(count == 1 for count in Counter(record.message for record in parent_records).values())
+    parent_times = [record.time_stamp for record in parent_records]
+    assert parent_times == sorted(parent_times)  # (e.g. no binary time deltas from the other process)
+    assert parent_times[0] >= start and parent_times[-1] <= datetime.now().astimezone()
+
+    if mode == "index":
+        # the index is still right (the rest of the log file is indexed by the reader)
+        middle = parent_times[len(parent_times) // 3]
+        indexed = [str(record) for record in iter_indexed_records(balsa.log_directory, start_time=middle)]
+        assert indexed == [str(record) for record in records if record.time_stamp >= middle]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="os.fork() not available")
+@pytest.mark.parametrize("mode", ["text", "buffered", "binary", "compressed"])
+def test_fork_children_roll_over(mode: str):
+    # only the forked children write, so they roll the log file over themselves
+    balsa = TstCLIBalsa(f"{application_name}_children_roll_over_{mode}")
+    balsa.verbose = False  # (no console output)
+    balsa.max_bytes = max_bytes
+    balsa.backup_count = 1000
+    balsa.log_buffer_size = 1000 if mode == "buffered" else 0
+    balsa.log_format = "binary" if mode == "binary" else "text"
+    balsa.log_compression = "gzip" if mode == "compressed" else None
+    balsa.init_logger()
+    processes = []
+    for child_number in range(child_count):
+        process = multiprocessing.get_context("fork").Process(target=child_logging, args=(balsa.name, child_number))
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join(30.0)
+    balsa.remove()
+    assert all(process.exitcode == 0 for process in processes)
+
+    log_file_paths = get_log_file_paths(balsa.log_directory)
+    assert len(log_file_paths) > 1  # rolled over
+    if mode == "compressed":
+        assert all(log_file_path.name.endswith(".gz") for log_file_path in log_file_paths[:-1])
+    else:
+        # (a log file can go over max_bytes by up to one write per process)
+        assert all(log_file_path.stat().st_size < max_bytes + child_count * balsa.log_buffer_size + 1000 for log_file_path in log_file_paths)
+    assert not any(file_path.name.endswith((".compressing", ".tmp")) for file_path in balsa.log_directory.iterdir())
+    records = list(iter_records(balsa.log_directory))
+    assert all(record.valid for record in records)
+    child_messages = [record.message for record in records if record.message.startswith("child ")]
+    assert sorted(child_messages) == sorted(f"child {child_number} {count}" for child_number in range(child_count) for count in range(records_per_child))  # once each
+
+
+def child_init_logger(config_dict: Dict[str, Any]):
+    # the child has its own (buffered) handlers, and returns without Balsa.remove() - the process exits with os._exit(), so no atexit or logging.shutdown()
+    balsa = balsa_clone(config_dict, "child")
+    balsa.init_logger()
+    log = get_logger(balsa.name)
+    for count in range(records_per_child):
+        log.info(f"child {count}")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="os.fork() not available")
+def test_handler_created_in_fork_child():
+    balsa = TstCLIBalsa(f"{application_name}_handler_created_in_child")
+    balsa.verbose = False  # (no console output)
+    balsa.init_logger()  # (makes an empty log directory)
+    balsa.remove()  # so the child only has its own handlers
+    balsa.log_buffer_size = 1000 * 1000
+    balsa.log_flush_interval = 100.0  # (only written when the child exits)
+    process = multiprocessing.get_context("fork").Process(target=child_init_logger, args=(balsa.config_as_dict(),))
+    process.start()
+    process.join(30.0)
+    assert process.exitcode == 0
+    child_messages = [record.message for record in iter_records(balsa.log_directory) if record.message.startswith("child ")]
+    assert child_messages == [f"child {count}" for count in range(records_per_child)]
+
+
+if is_main():
+    for mode in modes:
+        test_fork_while_logging(mode)
+    for mode in ["text", "buffered", "binary", "compressed"]:
+        test_fork_children_roll_over(mode)
+    test_handler_created_in_fork_child()
@@ -0,0 +1,135 @@
+import io
+import time
+import logging
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, BalsaFormatter, BalsaCompiledFormatter, BalsaJSONFormatter, BalsaStringListHandler, HandlerType
+from balsa.formatter import _get_cached
+
+from .tst_balsa import TstCLIBalsa
+
+log_format = "%(asctime)s - %(name)s - %(processName)s - %(filename)s - %(lineno)s - %(funcName)s - %(levelname)s - %(message)s"
+
+
+def test_format_once(monkeypatch):
+    format_count = 0
+    render = BalsaCompiledFormatter._render
+
+    def counting_render(self, record):
+        nonlocal format_count
+        format_count += 1
+        return render(self, record)
+
+    monkeypatch.setattr(BalsaCompiledFormatter, "_render", counting_render)
+
+    application_name = "test_format_once"
+    balsa = TstCLIBalsa(application_name)
+    balsa.log_console_prefix = "\r"
+    balsa.init_logger()
+    console_stream = io.StringIO()
+    balsa.handlers[HandlerType.Console].setStream(console_stream)
+    log = get_logger(application_name)
+    format_count = 0
+    try:
+        raise ValueError("problem")
+    except ValueError:
+        log.exception("formatted once")
+    string_list = balsa.get_string_list()  # (the string list handler formats when read)
+    balsa.remove()
+
+    # file, console and string list handlers share one formatting of the record
+    assert format_count == 1
+    log_text = balsa.log_path.read_text()
+    assert console_stream.getvalue() == f"\r{string_list[-1]}\n"
+    assert log_text.endswith(f"{string_list[-1]}\n")
+    assert "ValueError: problem" in string_list[-1]
+
+
+def test_format_cache_keys():
+    record = logging.LogRecord("test_format_cache_keys", logging.INFO, __file__, 1, "message %s", ("args",), None)
+    assert BalsaFormatter("%(message)s").format(record) == "message args"
+    assert BalsaFormatter("%(message)s", prefix="> ").format(record) == "> message args"
+    assert BalsaFormatter("%(levelname)s %(message)s").format(record) == "INFO message args"  # a different format isn't from the cache
+    assert BalsaFormatter("%(asctime)s", datefmt="%Y").format(record) == time.strftime("%Y", time.localtime(record.created))
+    assert BalsaFormatter("{levelname} {message}", style="{").format(record) == "INFO message args"
+    assert len(_get_cached(record, "balsa_formatted")) == 4
+
+
+class RedactFilter(logging.Filter):
+    """
+    Replaces the message (the way a filter that redacts secrets would).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = "password=%s"
+        record.args = ("<redacted>",)
+        return True
+
+
+@pytest.mark.parametrize("formatter_class", [BalsaFormatter, BalsaCompiledFormatter, BalsaJSONFormatter])
+def test_format_cache_filter(formatter_class):
+    # a handler's filter that replaces the message is seen by the handlers after it, even though the record was already formatted
+    handlers = [BalsaStringListHandler(10), BalsaStringListHandler(10), BalsaStringListHandler(10)]
+    handlers[1].addFilter(RedactFilter())
+    logger = logging.getLogger(f"test_format_cache_filter_{formatter_class.__name__}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in handlers:
+        handler.setFormatter(formatter_class(log_format))
+        handler.handle = logging.Handler.handle.__get__(handler)  # (format right away, not when the strings are read)
+        handler.emit = lambda record, handler=handler: handler.records.append(handler.format(record))
+    logger.handlers = handlers
+
+    logger.info("password=%s", "secret")
+    assert "secret" in handlers[0].records[-1]
+    assert all("secret" not in handler.records[-1] and "<redacted>" in handler.records[-1] for handler in handlers[1:])
+
+
+def test_format_cache_same_output():
+    # each formatter gives the same result for a record that's already been formatted by the others (via the cache) as for a new record
+    formatters = [BalsaFormatter(log_format), BalsaFormatter(log_format, prefix="\r"), BalsaCompiledFormatter(log_format), BalsaFormatter("%(levelname)s %(message)s")]
+
+    def make_record(count: int) -> logging.LogRecord:
+        record = logging.LogRecord("test_format_cache_same_output", logging.INFO, __file__, count, "message %s", (count,), None)
+        record.created = 1700000000.0 + count
+        record.msecs = 0.0
+        return record
+
+    for count in range(100):
+        record = make_record(count)
+        assert [formatter.format(record) for formatter in formatters] == [formatter.format(make_record(count)) for formatter in formatters]
+
+
+@pytest.mark.benchmark
+def test_format_cache_benchmark():
+    record_count = 10000
+    durations = {}
+    for cached in [False, True]:
+        # the default handler set: file, console (with a prefix) and string list
+        if cached:
+            formatters = [BalsaFormatter(log_format), BalsaFormatter(log_format, prefix="\r"), BalsaFormatter(log_format)]
+        else:
+            # a different format for each handler, the same as having no cache
+            formatters = [BalsaFormatter(log_format), BalsaFormatter(f"\r{log_format}"), BalsaFormatter(f"{log_format} ")]
+        handlers = [logging.StreamHandler(io.StringIO()), logging.StreamHandler(io.StringIO()), BalsaStringListHandler(record_count)]  # type: ignore
+        for handler, formatter in zip(handlers, formatters):
+            handler.setFormatter(formatter)
+        records = [logging.LogRecord("test_format_cache_benchmark", logging.INFO, __file__, count, "message %s", (count,), None) for count in range(record_count)]
+        start = time.perf_counter()
+        for record in records:
+            for handler in handlers:
+                handler.handle(record)
+        assert len(handlers[2].strings) == record_count  # type: ignore
+        durations[cached] = time.perf_counter() - start
+    print(f"uncached={1e6 * durations[False] / record_count:.2f} uS, cached={1e6 * durations[True] / record_count:.2f} uS")
+    assert durations[True] < durations[False]
+
+
+if is_main():
+    for formatter_class in [BalsaFormatter, BalsaCompiledFormatter, BalsaJSONFormatter]:
+        test_format_cache_filter(formatter_class)
+    test_format_cache_keys()
+    test_format_cache_same_output()
+    test_format_cache_benchmark()
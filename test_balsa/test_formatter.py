@@ -0,0 +1,95 @@
+import os
+import time
+import random
+import logging
+from datetime import datetime
+
+import pytest
+from ismain import is_main
+
+from balsa import BalsaFormatter, balsa_log_regex
+
+
+def reference_format_time(timestamp: float) -> str:
+    # the original (uncached) BalsaFormatter.formatTime()
+    return datetime.fromtimestamp(timestamp).astimezone().isoformat()
+
+
+def make_record(timestamp: float) -> logging.LogRecord:
+    record = logging.LogRecord("test_formatter", logging.INFO, __file__, 1, "message", None, None)
+    record.created = timestamp
+    return record
+
+
+def check_format_time(timestamps: list):
+    formatter = BalsaFormatter()
+    for timestamp in timestamps:
+        assert formatter.formatTime(make_record(timestamp)) == reference_format_time(timestamp)
+
+
+def get_timestamps(start: float, duration: float, count: int) -> list:
+    timestamps = [start + random.uniform(0.0, duration) for _ in range(count)]
+    timestamps.extend([float(int(start)), int(start) + 0.5, int(start) + 0.9999996, int(start) + 0.0000004])  # whole seconds and rounding edge cases
+    timestamps.sort()
+    return timestamps
+
+
+def test_format_time():
+    random.seed(42)
+    check_format_time(get_timestamps(time.time(), 10.0, 10000))
+    check_format_time(get_timestamps(0.0, 1e9, 10000))
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="time.tzset() not available")
+def test_format_time_dst():
+    random.seed(42)
+    original_tz = os.environ.get("TZ")
+    try:
+        for tz, transitions in [
+            ("America/Los_Angeles", [1678615200.0, 1699174800.0]),  # 2023-03-12 (spring forward) and 2023-11-05 (fall back)
+            ("Australia/Adelaide", [1680366600.0, 1696091400.0]),  # half hour UTC offset, southern hemisphere
+        ]:
+            os.environ["TZ"] = tz
+            time.tzset()
+            for transition in transitions:
+                # timestamps on both sides of the transition, including the repeated hour when the clocks go back
+                check_format_time(get_timestamps(transition - 2 * 60 * 60, 4 * 60 * 60, 10000))
+    finally:
+        if original_tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = original_tz
+        time.tzset()
+
+
+def test_format_time_parse():
+    formatter = BalsaFormatter("%(asctime)s - %(name)s - %(filename)s - %(lineno)s - %(funcName)s - %(levelname)s - %(message)s")
+    record = make_record(time.time())
+    assert balsa_log_regex.match(formatter.format(record)) is not None
+
+
+@pytest.mark.benchmark
+def test_format_time_benchmark():
+    timestamps = get_timestamps(time.time(), 1.0, 100000)
+
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        reference_format_time(timestamp)
+    reference_duration = time.perf_counter() - start
+
+    formatter = BalsaFormatter()
+    records = [make_record(timestamp) for timestamp in timestamps]
+    start = time.perf_counter()
+    for record in records:
+        formatter.formatTime(record)
+    cached_duration = time.perf_counter() - start
+
+    print(f"formatTime : uncached={1e6 * reference_duration / len(timestamps):.2f} uS, cached={1e6 * cached_duration / len(timestamps):.2f} uS")
+    assert cached_duration < reference_duration
+
+
+if is_main():
+    test_format_time()
+    test_format_time_dst()
+    test_format_time_parse()
+    test_format_time_benchmark()
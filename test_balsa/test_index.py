@@ -0,0 +1,91 @@
+import logging
+from pathlib import Path
+
+from ismain import is_main
+
+from balsa import get_logger, iter_records, iter_indexed_records, get_index_path, update_index, get_log_file_paths
+
+from .tst_balsa import TstCLIBalsa
+
+start_time = 1700000000.0  # a fixed start time for the logs, so the time ranges are known
+record_interval = 0.05
+
+
+class SetCreated(logging.Filter):
+    """
+    simulate records written over a long time
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.created = start_time + self.count * record_interval
+        self.count += 1
+        return True
+
+
+def write_indexed_logs(application_name: str) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 50000
+    balsa.backup_count = 1000
+    balsa.use_log_index = True
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    log.addFilter(set_created := SetCreated())
+    for count in range(3000):
+        if count % 97 == 0:
+            log.error(f"error {count}")
+        else:
+            log.info(f"message {count}")
+    log.removeFilter(set_created)
+    balsa.remove()
+    return balsa
+
+
+def expected_records(log_directory: Path, start: float, end: float, min_level: int) -> list:
+    return [str(record) for record in iter_records(log_directory) if start <= record.time_stamp.timestamp() < end and record.log_level >= min_level]
+
+
+def test_log_index():
+    application_name = "test_log_index"
+    balsa = write_indexed_logs(application_name)
+
+    log_file_paths = get_log_file_paths(balsa.log_directory)
+    assert len(log_file_paths) > 2  # rotated
+    assert all(get_index_path(log_file_path).exists() for log_file_path in log_file_paths)  # kept up to date by the file handler, including on rollover
+
+    for start, end in [(start_time + 20.0, start_time + 25.0), (start_time + 0.0, start_time + 1.0), (start_time + 140.0, start_time + 1000.0), (start_time - 10.0, start_time)]:
+        for min_level in [logging.NOTSET, logging.INFO, logging.ERROR]:
+            records = [str(record) for record in iter_indexed_records(balsa.log_directory, start, end, min_level)]
+            assert records == expected_records(balsa.log_directory, start, end, min_level)
+    assert len(list(iter_indexed_records(balsa.log_directory, min_level=logging.ERROR))) == len(range(0, 3000, 97))
+
+    # the index the file handler kept is the same as one built from the log file
+    for log_file_path in log_file_paths:
+        log_index = update_index(log_file_path)
+        get_index_path(log_file_path).unlink()
+        rebuilt_log_index = update_index(log_file_path)
+        assert rebuilt_log_index.offsets == log_index.offsets
+        assert rebuilt_log_index.levels == log_index.levels
+
+
+def test_log_index_on_demand():
+    application_name = "test_log_index_on_demand"
+    balsa = write_indexed_logs(application_name)
+    log_file_paths = get_log_file_paths(balsa.log_directory)
+    for log_file_path in log_file_paths:
+        get_index_path(log_file_path).unlink()
+
+    start, end = start_time + 50.0, start_time + 52.5
+    records = [str(record) for record in iter_indexed_records(balsa.log_directory, start, end)]
+    assert records == expected_records(balsa.log_directory, start, end, logging.NOTSET)
+    assert all(get_index_path(log_file_path).exists() for log_file_path in log_file_paths[:-1])  # built and saved for the rotated backups
+    assert not get_index_path(balsa.log_path).exists()  # (the current log file's index is only kept by its file handler)
+
+
+if is_main():
+    test_log_index()
+    test_log_index_on_demand()
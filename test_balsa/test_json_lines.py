@@ -0,0 +1,104 @@
+import json
+import logging
+
+from ismain import is_main
+
+from balsa import get_logger, sf, iter_records, BalsaRecord, RecordFilter, query_records, structured_sentinel
+from balsa.parallel import get_work_units
+
+from .tst_balsa import TstCLIBalsa
+
+
+def write_logs(application_name: str, log_format: str) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.log_format = log_format
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    log.info("hello é")
+    log.info(sf("structured", answer=42, name="not the logger name"))
+    log.info(sf(question="life"))
+    log.warning("multi\nline")
+    try:
+        raise ValueError("problem")
+    except ValueError:
+        log.exception("exception")
+    get_logger(f"{application_name}.db").info("child")
+    balsa.remove()
+    return balsa
+
+
+def test_json_lines(capsys):
+    application_name = "test_json_lines"
+    balsa = write_logs(application_name, "json")
+
+    lines = balsa.log_path.read_text(encoding="utf-8").splitlines()
+    json_records = [json.loads(line) for line in lines]  # each line is a JSON object
+    assert all(list(json_record)[0] == "time_stamp" for json_record in json_records)
+    assert json_records[1]["message"] == "hello é"
+    assert json_records[2]["message"] == "structured"
+    assert json_records[2]["answer"] == 42
+    assert json_records[2]["_name"] == "not the logger name"
+    assert json_records[2]["name"] == application_name
+    assert json_records[4]["message"] == "multi\nline"
+    assert json_records[5]["exception"].startswith("Traceback (most recent call last):")
+    assert json_records[5]["log_level"] == "ERROR"
+
+    console_lines = [line for line in capsys.readouterr().err.splitlines() if len(line) > 0]
+    assert [json.loads(line)["message"] for line in console_lines][-6:] == [json_record["message"] for json_record in json_records][-6:]
+
+    records = list(iter_records(balsa.log_path))
+    assert len(records) == len(json_records)
+    assert all(record.valid for record in records)
+    assert records[1].message == "hello é"
+    assert records[2].structured_record == {"answer": 42, "name": "not the logger name"}
+    assert records[2].name == application_name
+    assert records[3].structured_record == {"question": "life"}
+    assert records[4].message == "multi\nline"
+    assert records[5].log_level == logging.ERROR
+    assert records[5].message.startswith("exception\nTraceback (most recent call last):")
+    assert records[5].message.endswith("ValueError: problem")
+
+
+def test_json_lines_same_as_text():
+    # a record read from JSON Lines is the same as from the text format
+    json_balsa = write_logs("test_json_lines_same_as_json", "json")
+    text_balsa = write_logs("test_json_lines_same_as_text", "text")
+    json_records = list(iter_records(json_balsa.log_path))
+    text_records = list(iter_records(text_balsa.log_path))
+    assert len(json_records) == len(text_records)
+    for json_record, text_record in zip(json_records, text_records):
+        json_dict = json_record.as_dict()
+        text_dict = text_record.as_dict()
+        for record_dict in [json_dict, text_dict]:
+            del record_dict["time_stamp"]
+            record_dict["name"] = record_dict["name"].replace("_json", "").replace("_text", "")
+            record_dict["message"] = record_dict["message"].replace("_json", "").replace("_text", "")
+        if structured_sentinel not in text_record.message or text_record.message.endswith(f"{structured_sentinel} "):
+            assert json_dict == text_dict
+        assert BalsaRecord(repr(json_record)).as_dict() == json_record.as_dict()
+
+
+def test_json_lines_query():
+    application_name = "test_json_lines_query"
+    balsa = TstCLIBalsa(application_name)
+    balsa.log_format = "json"
+    balsa.init_logger()
+    log = get_logger(application_name)
+    for count in range(1000):
+        if count % 10 == 0:
+            get_logger(f"{application_name}.db").info(sf("query", count=count))
+        else:
+            log.info(f"message {count}\nsecond line")
+    balsa.remove()
+
+    assert len(get_work_units(balsa.log_path, split_size=10000)) > 1
+    records = list(query_records(balsa.log_path, RecordFilter(name=f"{application_name}.db"), max_workers=2, split_size=10000))
+    assert [record.structured_record["count"] for record in records] == list(range(0, 1000, 10))
+    records = list(query_records(balsa.log_path, RecordFilter(process_name="MainProcess", structured={"count": "500"}), max_workers=2, split_size=10000))
+    assert len(records) == 1
+
+
+if is_main():
+    test_json_lines_same_as_text()
+    test_json_lines_query()
@@ -0,0 +1,79 @@
+import time
+import logging
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, sf, lsf, iter_records
+
+from .tst_balsa import TstCLIBalsa
+
+
+class Color(Enum):
+    red = 1
+
+
+sf_cases = [
+    (("hello",), {}),
+    ((), {"answer": 42}),
+    (("hello", "world, with a comma", 'a "quote"', 3), {"question": "life", "answer": 42}),
+    (("sentinel <<>> in args",), {"sentinel": "in <<>> value", "<<>>": "key"}),
+    (("é",), {"color": Color.red, "amount": Decimal("1.5"), "count": Decimal("3"), "data": b"bytes", "nested": {"a": [1, 2]}}),
+    ((), {}),
+]
+
+
+def test_lsf_same_as_sf():
+    for args, kwargs in sf_cases:
+        assert str(lsf(*args, **kwargs)) == sf(*args, **kwargs)
+
+
+def test_lsf_logging():
+    application_name = "test_lsf_logging"
+    balsa = TstCLIBalsa(application_name)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    for args, kwargs in sf_cases:
+        log.info(sf(*args, **kwargs))
+        log.info(lsf(*args, **kwargs))
+    balsa.remove()
+
+    records = list(iter_records(balsa.log_path))[1:]
+    for sf_record, lsf_record in zip(records[0::2], records[1::2]):
+        assert sf_record.message == lsf_record.message
+        assert sf_record.structured_record == lsf_record.structured_record
+
+
+def test_lsf_filtered():
+    # the message isn't built when the record is filtered out
+    application_name = "test_lsf_filtered"
+    log = logging.getLogger(application_name)
+    log.setLevel(logging.INFO)
+    message = lsf("filtered", count=1)
+    log.debug(message)
+    assert message._string is None
+
+
+@pytest.mark.benchmark
+def test_lsf_filtered_benchmark():
+    log = logging.getLogger("test_lsf_filtered_benchmark")
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.NullHandler())
+    iterations = 1000
+    durations = {}
+    for structured_formatter in [sf, lsf]:
+        start = time.perf_counter()
+        for count in range(iterations):
+            log.debug(structured_formatter("filtered", "debug", count=count, name="value"))
+        durations[structured_formatter.__name__] = time.perf_counter() - start
+        print(f"{structured_formatter.__name__} : {1e6 * durations[structured_formatter.__name__] / iterations:.1f} us per filtered log call")
+    assert durations["lsf"] < durations["sf"]
+
+
+if is_main():
+    test_lsf_same_as_sf()
+    test_lsf_logging()
+    test_lsf_filtered()
+    test_lsf_filtered_benchmark()
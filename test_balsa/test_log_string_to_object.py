@@ -1,6 +1,11 @@
+import time
 import logging
+import datetime
 
-from balsa import BalsaRecord, get_logger
+import dateutil.parser
+import pytest
+
+from balsa import BalsaRecord, get_logger, balsa_log_regex
 
 from .tst_balsa import TstCLIBalsa
 
@@ -65,3 +70,61 @@ def test_bad_log_string_to_object():
     log_object = BalsaRecord("I am not a log")  # invalid structured log string
     assert not log_object.valid
     assert log_object.log_level == logging.NOTSET
+
+
+def test_foreign_time_stamp_to_object():
+    # not ISO 8601, so parsed by dateutil
+    log_object = BalsaRecord("10:20:30 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - myapp")
+    assert log_object.valid
+    assert log_object.time_stamp.time() == datetime.time(10, 20, 30)
+
+
+def test_fast_parse_matches_regex_parse():
+    log_strings = [
+        "2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - myapp - with - separators",
+        "2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - warning - lower case level",
+        "2021-10-23T21:20:26.677123-07:00 - balsa_example - balsa_structured_logs.py - 15 - main - INFO - no process - name",
+        "2021-10-23T21:20:26.677123-07:00 - balsa example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - name with a space",
+        "2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - ERROR - multi\nline\n",
+        '2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - myapp <> {"my_name": "me"} <>',
+    ]
+    for log_string in log_strings:
+        log_object = BalsaRecord(log_string)
+        groups = balsa_log_regex.match(log_string)
+        assert log_object.valid == (groups is not None)
+        if groups is not None:
+            assert log_object.time_stamp == dateutil.parser.parse(groups.group(1))
+            assert log_object.name == groups.group(2)
+            assert log_object.process_name == (groups.group(3) or "")
+            assert log_object.file_name == groups.group(4)
+            assert log_object.line_number == int(groups.group(5))
+            assert log_object.function_name == groups.group(6)
+            assert log_object.log_level == getattr(logging, groups.group(7).upper())
+            assert log_object.message == groups.group(8).strip() or log_object.structured_record == {"my_name": "me"}
+
+
+def test_balsa_record_slots():
+    log_object = BalsaRecord("2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - myapp")
+    assert not hasattr(log_object, "__dict__")
+    with pytest.raises(AttributeError):
+        log_object.not_a_field = 1
+
+
+@pytest.mark.benchmark
+def test_balsa_record_parse_benchmark():
+    log_string = '2021-10-23T21:20:26.677123-07:00 - balsa_example - MainProcess - balsa_structured_logs.py - 15 - main - INFO - myapp <> {"my_name": "me", "my_value": 42} <>'
+    count = 10000
+
+    start = time.perf_counter()
+    for _ in range(count):
+        groups = balsa_log_regex.match(log_string)
+        dateutil.parser.parse(groups.group(1))  # the original regex and dateutil parsing
+    regex_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        BalsaRecord(log_string)
+    duration = time.perf_counter() - start
+
+    print(f"parse : regex and dateutil={1e6 * regex_duration / count:.1f} uS, BalsaRecord={1e6 * duration / count:.1f} uS")
+    assert duration < regex_duration
@@ -0,0 +1,78 @@
+import json
+import time
+import logging
+from pathlib import Path
+
+from ismain import is_main
+
+from balsa import BalsaRotatingFileHandler, BalsaFormatter, BalsaJSONFormatter, iter_merged_records, iter_merged_record_strings, get_merge_sets, get_log_file_paths, iter_records
+from balsa.cli import main
+
+from .test_file_handler import make_log_directory, log_format
+
+application_name = "test_merge"
+records_per_instance = 1000
+start_time = time.time() - 3600.0
+instances = {"a": (0.0, "text"), "b": (0.001, "json"), "c": (0.0, "binary")}  # instance name: (time offset, log format) - "c" has the same times as "a"
+
+
+def write_instance(log_directory: Path, instance_name: str, offset: float, format_name: str):
+    # a record every 2 mS, starting at offset
+    handler = BalsaRotatingFileHandler(Path(log_directory, f"{application_name}_{instance_name}.log"), 5000, 1000, binary=format_name == "binary")
+    handler.setFormatter(BalsaJSONFormatter() if format_name == "json" else BalsaFormatter(log_format))
+    for count in range(records_per_instance):
+        record = logging.LogRecord(application_name, logging.INFO, __file__, 1, f"{instance_name} {count}", None, None, "write_instance")
+        record.created = start_time + offset + 0.002 * count
+        record.msecs = (record.created - int(record.created)) * 1000
+        handler.handle(record)
+    handler.close()
+
+
+def write_instances(name: str) -> Path:
+    log_directory = make_log_directory(name)
+    for instance_name, (offset, format_name) in instances.items():
+        write_instance(log_directory, instance_name, offset, format_name)
+    return log_directory
+
+
+def get_expected_messages() -> list:
+    # in time order, and records with the same time are in instance (name) order
+    expected = sorted(
+        (offset + 0.002 * count, instance_number, f"{instance_name} {count}")
+        for instance_number, (instance_name, (offset, _)) in enumerate(instances.items())
+        for count in range(records_per_instance)
+    )
+    return [message for _, _, message in expected]
+
+
+def test_merge():
+    log_directory = write_instances(application_name)
+
+    merge_sets = get_merge_sets(log_directory)
+    assert [merge_set[-1].name for merge_set in merge_sets] == [f"{application_name}_{instance_name}.log" for instance_name in instances]
+    assert all(len(merge_set) > 1 for merge_set in merge_sets)  # (rotated)
+    assert sum(merge_sets, []) == get_log_file_paths(log_directory)
+
+    expected_messages = get_expected_messages()
+    records = list(iter_merged_records(log_directory, chunk_size=100))
+    assert [record.message for record in records] == expected_messages
+    record_strings = list(iter_merged_record_strings(log_directory))
+    assert [record_string.split(" - ")[-1] if not record_string.startswith("{") else json.loads(record_string)["message"] for record_string in record_strings] == expected_messages
+
+    # several paths (e.g. log directories from more than one machine, or single log files)
+    paths = [Path(log_directory, f"{application_name}_{instance_name}.log") for instance_name in ["b", "a"]]
+    single_file_records = [record for path in paths for record in iter_records(path)]
+    single_file_records.sort(key=lambda record: record.time_stamp)  # (no ties between "a" and "b")
+    assert [record.message for record in iter_merged_records(paths)] == [record.message for record in single_file_records]
+
+
+def test_merge_cli(capsys):
+    log_directory = write_instances(f"{application_name}_cli")
+    main(["merge", str(log_directory), "--json"])
+    assert [json.loads(line)["message"] for line in capsys.readouterr().out.splitlines()] == get_expected_messages()
+    main(["merge", str(log_directory)])
+    assert capsys.readouterr().out.splitlines() == list(iter_merged_record_strings(log_directory))
+
+
+if is_main():
+    test_merge()
@@ -0,0 +1,103 @@
+import json
+import logging
+from collections import Counter
+from operator import add
+
+from ismain import is_main
+
+from balsa import get_logger, iter_records, iter_records_parallel, reduce_records_parallel, BalsaRecord
+from balsa.parallel import get_work_units, _iter_parallel
+from balsa.cli import main
+
+from .tst_balsa import TstCLIBalsa
+
+
+def get_line_number(record: BalsaRecord) -> int:
+    return record.line_number
+
+
+def error_only(record: BalsaRecord) -> BalsaRecord | None:
+    return record if record.log_level >= logging.ERROR else None
+
+
+def count_level(level_counts: Counter, record: BalsaRecord) -> Counter:
+    level_counts[record.log_level] += 1
+    return level_counts
+
+
+def write_logs(application_name: str) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 50000
+    balsa.backup_count = 1000
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    for count in range(2000):
+        if count % 100 == 0:
+            try:
+                raise ValueError(f"problem {count}")
+            except ValueError:
+                log.exception(f"exception {count}")
+        else:
+            log.info(f"message {count}")
+    balsa.remove()
+    return balsa
+
+
+def test_parallel_parse():
+    application_name = "test_parallel_parse"
+    balsa = write_logs(application_name)
+
+    split_size = 10000
+    work_units = get_work_units(balsa.log_directory, split_size=split_size)
+    assert len(work_units) > len(list(balsa.log_directory.iterdir()))  # files are split
+
+    expected = [str(record) for record in iter_records(balsa.log_directory)]
+    assert [str(record) for record in iter_records_parallel(balsa.log_directory, max_workers=4, split_size=split_size)] == expected  # order preserved
+
+    errors = list(iter_records_parallel(balsa.log_directory, error_only, max_workers=4, split_size=split_size))
+    assert len(errors) == 20
+    assert all(record.message.endswith("ValueError: problem " + record.message.split()[1]) for record in errors)
+
+    line_numbers = list(iter_records_parallel(balsa.log_directory, get_line_number, max_workers=2, split_size=split_size))
+    assert len(line_numbers) == len(expected)
+
+    level_counts = reduce_records_parallel(balsa.log_directory, count_level, add, Counter(), max_workers=4, split_size=split_size)
+    assert level_counts[logging.ERROR] == 20
+    assert level_counts[logging.INFO] == len(expected) - 20
+
+
+def test_parallel_bounded():
+    max_workers = 2
+    submitted = []
+
+    def calls():
+        for count in range(100):
+            submitted.append(count)
+            yield abs, (-count,)
+
+    # calls are only submitted a bounded window ahead of the results being consumed, and the results are in order
+    results = _iter_parallel(calls(), max_workers)
+    assert next(results) == 0
+    assert len(submitted) == 2 * max_workers + 1
+    assert list(results) == list(range(1, 100))
+    assert len(submitted) == 100
+
+
+def test_parallel_parse_cli(capsys):
+    application_name = "test_parallel_parse_cli"
+    balsa = write_logs(application_name)
+
+    main(["parse", str(balsa.log_directory), "--count", "--workers", "2"])
+    level_counts = json.loads(capsys.readouterr().out)
+    assert level_counts["ERROR"] == 20
+
+    main(["parse", str(balsa.log_path), "--workers", "2"])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[-1]["message"] == "message 1999"
+    assert records[-1]["log_level"] == "INFO"
+
+
+if is_main():
+    test_parallel_parse()
+    test_parallel_bounded()
@@ -0,0 +1,96 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Tuple
+from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from ismain import is_main
+
+from balsa import get_logger, get_global_balsa, balsa_clone, init_pool_worker, iter_record_strings
+
+from .tst_balsa import TstCLIBalsa
+
+application_name = "test_balsa_pool"
+task_count = 200
+worker_count = 4
+
+
+def logging_task(value: int) -> Tuple[int, str]:
+    log = get_logger(application_name)
+    log.info(f"task {value}")
+    return os.getpid(), get_global_balsa().instance_name
+
+
+def per_task_setup_task(config_dict: Dict[str, Any], value: int) -> int:
+    # what a task has to do without a pool initializer
+    balsa = balsa_clone(config_dict, f"task_{os.getpid()}")
+    balsa.init_logger()
+    log = get_logger(application_name)
+    log.info(f"task {value}")
+    balsa.remove()
+    return value
+
+
+def make_parent_balsa(name: str):
+    balsa = TstCLIBalsa(name)
+    balsa.verbose = False  # (no console output)
+    balsa.init_logger()
+    return balsa
+
+
+def check_worker_logs(balsa, results: list):
+    instance_names = {}  # type: Dict[int, set]
+    for pid, instance_name in results:
+        instance_names.setdefault(pid, set()).add(instance_name)
+    assert all(len(names) == 1 for names in instance_names.values())  # the same instance name for a worker's lifetime
+    logged = []
+    for names in instance_names.values():
+        worker_log_path = Path(balsa.log_directory, f"{balsa.name}_{names.pop()}{balsa.log_extension}")
+        logged.extend(int(s.split(" - ")[-1].split()[-1]) for s in iter_record_strings(worker_log_path) if " - task " in s)
+    assert sorted(logged) == list(range(task_count))
+
+
+def test_pool_initializer():
+    balsa = make_parent_balsa(application_name)
+    balsa.log_buffer_size = 1000 * 1000  # the workers' records are only written if the worker's Balsa is removed when the worker exits
+    config = balsa.config_as_dict()
+
+    with Pool(worker_count, initializer=init_pool_worker, initargs=(config,)) as pool:
+        results = pool.map(logging_task, range(task_count), chunksize=10)
+        pool.close()
+        pool.join()
+    check_worker_logs(balsa, results)
+
+    balsa.delete_existing_log_files = True
+    balsa.remove()
+    balsa = make_parent_balsa(application_name)
+    with ProcessPoolExecutor(worker_count, initializer=init_pool_worker, initargs=(config,)) as executor:
+        results = list(executor.map(logging_task, range(task_count), chunksize=10))
+    check_worker_logs(balsa, results)
+    balsa.remove()
+
+
+@pytest.mark.benchmark
+def test_pool_initializer_benchmark():
+    balsa = make_parent_balsa(f"{application_name}_benchmark")
+    config = balsa.config_as_dict()
+    durations = {}
+    for per_worker in [False, True]:
+        start = time.perf_counter()
+        if per_worker:
+            with Pool(worker_count, initializer=init_pool_worker, initargs=(config,)) as pool:
+                pool.map(logging_task, range(task_count))
+        else:
+            with Pool(worker_count) as pool:
+                pool.starmap(per_task_setup_task, [(config, value) for value in range(task_count)])
+        durations[per_worker] = time.perf_counter() - start
+    balsa.remove()
+    print(f"per task setup={1e3 * durations[False] / task_count:.2f} mS/task, per worker setup={1e3 * durations[True] / task_count:.2f} mS/task")
+    assert durations[True] < durations[False]
+
+
+if is_main():
+    test_pool_initializer()
+    test_pool_initializer_benchmark()
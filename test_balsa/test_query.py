@@ -0,0 +1,90 @@
+import json
+import logging
+from datetime import timedelta
+
+from ismain import is_main
+
+from balsa import get_logger, sf, iter_records, RecordFilter, query_records, has_valid_index
+from balsa.cli import main
+
+from .tst_balsa import TstCLIBalsa
+
+
+def write_logs(application_name: str) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 50000
+    balsa.backup_count = 1000
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    db_log = get_logger(f"{application_name}.db")
+    for count in range(2000):
+        if count % 50 == 0:
+            log.error(sf("error", count=count, even=count % 100 == 0))
+        elif count % 10 == 0:
+            db_log.info(sf("query", table="users", count=count))
+        else:
+            log.info(f"message {count}")
+    balsa.remove()
+    return balsa
+
+
+def test_query():
+    application_name = "test_query"
+    balsa = write_logs(application_name)
+    all_records = list(iter_records(balsa.log_directory))
+    start_time = all_records[len(all_records) // 3].time_stamp
+    end_time = start_time + timedelta(seconds=0.01)
+
+    record_filters = [
+        RecordFilter(min_level=logging.ERROR),
+        RecordFilter(name=f"{application_name}.db"),
+        RecordFilter(name=application_name, structured={"table": "users"}),
+        RecordFilter(structured={"even": "true"}),
+        RecordFilter(structured={"count": "100"}),
+        RecordFilter(start_time=start_time, end_time=end_time),
+        RecordFilter(min_level=logging.ERROR, start_time=start_time),
+        RecordFilter(process_name="MainProcess", structured={"table": "users"}),
+        RecordFilter(process_name="NotAProcess"),
+    ]
+    def check_queries(**kwargs):
+        for record_filter in record_filters:
+            expected = [str(record) for record in all_records if record_filter(record) is not None]
+            assert [str(record) for record in query_records(balsa.log_directory, record_filter, max_workers=2, split_size=20000, **kwargs)] == expected
+
+    def index_count() -> int:
+        return sum(1 for _ in balsa.log_directory.glob("*.idx"))
+
+    # without indexes, queries scan (and don't write to the log directory)
+    check_queries()
+    check_queries(use_index=False)
+    assert index_count() == 0
+
+    # building the indexes is opt-in - the rotated backups' indexes are saved, then used by later queries
+    check_queries(build_index=True)
+    assert index_count() > 0
+    assert all(has_valid_index(index_path.with_suffix("")) for index_path in balsa.log_directory.glob("*.idx"))
+    check_queries()
+
+    assert len([record for record in all_records if RecordFilter(structured={"even": "true"})(record) is not None]) == 20
+
+
+def test_query_cli(capsys):
+    application_name = "test_query_cli"
+    balsa = write_logs(application_name)
+
+    for build_index in [False, True]:
+        main(["query", str(balsa.log_directory), "--level", "error", "--key", "even=true", "--json"] + (["--build_index"] if build_index else []))
+        records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(records) == 20
+        assert all(record["log_level"] == "ERROR" and record["structured_record"]["even"] for record in records)
+        assert any(balsa.log_directory.glob("*.idx")) == build_index
+
+    main(["query", str(balsa.log_directory), "--name", f"{application_name}.db", "--key", "count=1990", "--workers", "2"])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert '"count": 1990' in lines[0]
+
+
+if is_main():
+    test_query()
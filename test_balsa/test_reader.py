@@ -0,0 +1,77 @@
+import logging
+from pathlib import Path
+
+from ismain import is_main
+
+from balsa import get_logger, iter_records, get_log_file_paths
+
+from .tst_balsa import TstCLIBalsa
+
+
+def write_rotated_logs(application_name: str, record_count: int) -> TstCLIBalsa:
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_bytes = 20000
+    balsa.backup_count = 1000
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    for count in range(record_count):
+        if count % 100 == 0:
+            try:
+                raise ValueError(f"problem {count}")
+            except ValueError:
+                log.exception(f"exception {count}")
+        else:
+            log.info(f"message {count}")
+    balsa.remove()
+    return balsa
+
+
+def test_iter_records():
+    application_name = "test_iter_records"
+    record_count = 1000
+
+    balsa = write_rotated_logs(application_name, record_count)
+
+    log_file_paths = get_log_file_paths(balsa.log_directory)
+    assert len(log_file_paths) > 2  # rotated
+    assert log_file_paths[-1] == balsa.log_path  # newest last
+    assert log_file_paths[-2] == Path(f"{balsa.log_path}.1")
+
+    records = [record for record in iter_records(balsa.log_directory) if record.function_name == "write_rotated_logs"]
+    assert all(record.valid for record in records)
+    assert len(records) == record_count
+    for count, record in enumerate(records):
+        if count % 100 == 0:
+            assert record.log_level == logging.ERROR
+            assert record.message.startswith(f"exception {count}\nTraceback (most recent call last):")
+            assert record.message.endswith(f"ValueError: problem {count}")
+        else:
+            assert record.log_level == logging.INFO
+            assert record.message == f"message {count}"
+
+    # a single file and a tiny read size (so records and lines are split across reads)
+    records = list(iter_records(balsa.log_path, chunk_size=7))
+    assert len(records) > 0
+    assert [str(record) for record in records] == [str(record) for record in iter_records(balsa.log_path)]
+
+
+def test_iter_records_non_record_lines():
+    log_directory = Path("temp", "test_iter_records_non_record_lines")
+    log_directory.mkdir(parents=True, exist_ok=True)
+    log_file_path = Path(log_directory, "test.log")
+    log_file_path.write_bytes(
+        b"not a record\r\n2021-10-23T21:20:26.677123-07:00 - test - MainProcess - test.py - 15 - main - INFO - a\r\nb\r\n"
+        b"2021-10-23T21:20:27.677123-07:00 - test - MainProcess - test.py - 16 - main - INFO - c"
+    )
+    records = list(iter_records(log_file_path))
+    assert len(records) == 3
+    assert not records[0].valid
+    assert records[1].valid
+    assert records[1].message == "a\nb"
+    assert records[2].message == "c"
+
+
+if is_main():
+    test_iter_records()
+    test_iter_records_non_record_lines()
@@ -0,0 +1,72 @@
+import time
+from pathlib import Path
+from multiprocessing import Process
+
+from ismain import is_main
+
+from balsa import Balsa, BalsaRotatingFileHandler, BalsaSharedFileHandler, get_log_file_paths, iter_records, iter_record_strings, get_logger, __author__
+
+from .test_file_handler import make_log_directory, write_records
+
+application_name = "test_shared_file"
+process_count = 8
+records_per_process = 2000
+payload = "x" * 200  # long records, so an interleaved write would be noticed
+max_bytes = 100 * 1000
+
+
+def write_shared(log_directory: Path, process_number: int):
+    # each process has its own Balsa instance with the same name (no instance_name), so they all write the same log file
+    balsa = Balsa(application_name, __author__, log_directory=log_directory, is_root=False, use_shared_log_file=True, max_bytes=max_bytes, backup_count=1000)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    for count in range(records_per_process):
+        log.info(f"{process_number},{count},{payload}")
+    balsa.remove()
+
+
+def test_shared_file_rotation_matches_single_process():
+    # in a single process, rotation is the same as BalsaRotatingFileHandler
+    backup_count = 5
+    single_directory = make_log_directory("test_shared_rotation_single")
+    shared_directory = make_log_directory("test_shared_rotation_shared")
+    write_records(BalsaRotatingFileHandler(Path(single_directory, "test.log"), 5000, backup_count), 1000)
+    write_records(BalsaSharedFileHandler(Path(shared_directory, "test.log"), 5000, backup_count), 1000)
+
+    single_paths = get_log_file_paths(single_directory)
+    shared_paths = get_log_file_paths(shared_directory)
+    assert [path.name for path in shared_paths] == [path.name for path in single_paths]
+    assert [path.stat().st_size for path in shared_paths] == [path.stat().st_size for path in single_paths]
+    assert list(iter_record_strings(shared_directory))[-1].endswith("message 999 é")
+
+
+def test_shared_file_stress():
+    log_directory = make_log_directory(application_name)
+    start = time.perf_counter()
+    processes = [Process(target=write_shared, args=(log_directory, process_number)) for process_number in range(process_count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    duration = time.perf_counter() - start
+    assert all(process.exitcode == 0 for process in processes)
+    log_paths = get_log_file_paths(log_directory)
+    print(f"{process_count * records_per_process / duration:.0f} records/s from {process_count} processes, {len(log_paths)} log files")
+    assert len(log_paths) > 10  # many rollovers
+
+    # every record is in a log file exactly once, and no record is interleaved with another
+    written = {}  # type: dict
+    for log_path in log_paths:
+        for record in iter_records(log_path):
+            if record.name == application_name and record.message.endswith(payload):
+                process_number, count, message_payload = record.message.split(",")
+                assert message_payload == payload
+                written.setdefault(int(process_number), []).append(int(count))
+    assert written == {process_number: list(range(records_per_process)) for process_number in range(process_count)}
+    # (each process checks for rollover before it writes, so a log file can go over max_bytes by up to one record per process)
+    assert all(log_path.stat().st_size < max_bytes + process_count * 1000 for log_path in log_paths)
+
+
+if is_main():
+    test_shared_file_rotation_matches_single_process()
+    test_shared_file_stress()
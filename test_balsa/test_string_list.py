@@ -0,0 +1,114 @@
+import gc
+import logging
+import weakref
+
+from ismain import is_main
+
+from balsa import get_logger, BalsaStringListHandler, BalsaFormatter
+
+from .tst_balsa import TstCLIBalsa
+
+
+class CountingFormatter(BalsaFormatter):
+    def __init__(self, fmt: str):
+        super().__init__(fmt)
+        self.format_count = 0
+
+    def format(self, record: logging.LogRecord) -> str:
+        self.format_count += 1
+        return super().format(record)
+
+
+def test_string_list_ring_buffer():
+    max_entries = 10000
+    formatter = CountingFormatter("%(levelname)s - %(message)s")
+    handler = BalsaStringListHandler(max_entries)
+    handler.setFormatter(formatter)
+    logger = logging.getLogger("test_string_list_ring_buffer")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+
+    for count in range(3 * max_entries):
+        logger.info("message %d", count)
+    assert formatter.format_count == 0  # nothing is formatted until the strings are read
+    assert len(handler.records) == max_entries
+
+    strings = handler.strings
+    assert len(strings) == max_entries
+    assert strings[0] == f"INFO - message {2 * max_entries}"
+    assert strings[-1] == f"INFO - message {3 * max_entries - 1}"
+    assert formatter.format_count == max_entries  # only the records still in the buffer are formatted
+
+    assert handler.strings is strings  # cached
+    assert formatter.format_count == max_entries
+
+    logger.info("one more")
+    strings = handler.strings
+    assert len(strings) == max_entries
+    assert strings[0] == f"INFO - message {2 * max_entries + 1}"
+    assert strings[-1] == "INFO - one more"
+    assert formatter.format_count == max_entries + 1  # only the new record is formatted
+
+
+class Tracked:
+    """
+    Local variable that's tracked with a weak reference.
+    """
+
+
+def raise_with_local(local_reference: list):
+    tracked = Tracked()
+    local_reference.append(weakref.ref(tracked))
+    raise ValueError("problem")
+
+
+def test_string_list_snapshot():
+    handler = BalsaStringListHandler(100)
+    handler.setFormatter(BalsaFormatter("%(levelname)s - %(message)s"))
+    logger = logging.getLogger("test_string_list_snapshot")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+
+    # changing the arguments after the log call doesn't change the string
+    state = {"n": 1}
+    logger.info("state=%s", state)
+    state["n"] = 999
+
+    # the exception's traceback frames (and their locals) aren't kept alive
+    local_reference = []  # type: list
+    try:
+        raise_with_local(local_reference)
+    except ValueError:
+        logger.exception("exception")
+    gc.collect()
+    assert local_reference[0]() is None
+
+    strings = handler.strings
+    assert strings[0] == "INFO - state={'n': 1}"
+    assert strings[1].startswith("ERROR - exception\nTraceback") and strings[1].endswith("ValueError: problem")
+
+
+def test_balsa_string_list():
+    application_name = "test_balsa_string_list"
+
+    balsa = TstCLIBalsa(application_name)
+    balsa.max_string_list_entries = 3
+    balsa.init_logger()
+
+    log = get_logger(application_name)
+    for count in range(5):
+        log.info(f"message {count}")
+
+    string_list = balsa.get_string_list()
+    assert len(string_list) == 3
+    assert [string.split(" - ")[-1] for string in string_list] == ["message 2", "message 3", "message 4"]
+
+    balsa.remove()
+
+
+if is_main():
+    test_string_list_ring_buffer()
+    test_string_list_snapshot()
+    test_balsa_string_list()
@@ -0,0 +1,89 @@
+import json
+import logging
+
+from ismain import is_main
+
+from balsa import get_logger, sf, iter_records, HandlerType, BalsaRecord
+from balsa.formatter import get_message
+
+from .tst_balsa import TstCLIBalsa
+
+
+class Counted:
+    """
+    Structured value that counts how many times it is serialized.
+    """
+
+    count = 0
+
+    def __str__(self):
+        Counted.count += 1
+        return "counted"
+
+
+def test_structured_extra():
+    application_name = "test_structured_extra"
+    balsa = TstCLIBalsa(application_name)
+    balsa.init_logger()
+    log = get_logger(application_name)
+    log.info("native", extra={"structured": {"answer": 42, "name": "Ford"}})
+    log.info(sf("sf", answer=42, name="Ford"))
+    log.info("%s", "native only", extra={"structured": {"question": "life <<>>"}})
+    log.info(sf("both", answer=42), extra={"structured": {"name": "Ford"}})
+    string_list = balsa.get_string_list()
+    balsa.remove()
+
+    # native structured fields are in the same form as sf()
+    assert string_list[0].split(" - ")[-1] == "native <<>> {\"answer\": 42, \"name\": \"Ford\"} <<>>"
+    assert string_list[0].split(" - ")[-1].replace("native", "sf") == string_list[1].split(" - ")[-1]
+    records = list(iter_records(balsa.log_path))[1:]
+    assert [record.structured_record for record in records] == [
+        {"answer": 42, "name": "Ford"},
+        {"answer": 42, "name": "Ford"},
+        {"question": "life <</>>"},
+        {"answer": 42, "name": "Ford"},
+    ]
+    assert [record.message for record in records] == ["native <<>> ", "sf <<>> ", "native only <<>> ", "both <<>> "]
+
+
+native_cases = [
+    ("hello", {"answer": 42}),
+    ("with, commas", {"question": "life"}),
+    ('a "quote"', {"answer": 42}),
+    ("sentinel <<>> in message", {"sentinel": "in <<>> value", "<<>>": "key"}),
+]
+
+
+def test_native_same_as_sf():
+    for message, structured in native_cases:
+        record = logging.LogRecord("test_native_same_as_sf", logging.INFO, __file__, 1, message, None, None, "test_native_same_as_sf")
+        record.structured = structured
+        assert get_message(record) == sf(message, **structured)
+        # round trip
+        balsa_record = BalsaRecord(f"2023-11-14T22:13:20.000000+00:00 - test - test.py - 1 - test - INFO - {get_message(record)}")
+        assert balsa_record.valid
+        assert balsa_record.message == f"{sf(message)} <<>> "
+        assert balsa_record.structured_record == BalsaRecord(f"2023-11-14T22:13:20.000000+00:00 - test - test.py - 1 - test - INFO - {sf(message, **structured)}").structured_record
+
+
+def test_structured_serialized_once():
+    for log_format, expected_count in [("text", 1), ("json", 2)]:  # the string list handler is always text
+        application_name = f"test_structured_serialized_once_{log_format}"
+        balsa = TstCLIBalsa(application_name)
+        balsa.log_format = log_format
+        balsa.init_logger()
+        assert HandlerType.File in balsa.handlers and HandlerType.Console in balsa.handlers and HandlerType.StringList in balsa.handlers
+        log = get_logger(application_name)
+        Counted.count = 0
+        log.info("serialized once", extra={"structured": {"counted": Counted()}})
+        assert balsa.get_string_list()[-1].endswith('serialized once <<>> {"counted": "counted"} <<>>')  # (the string list handler formats when read)
+        balsa.remove()
+        assert Counted.count == expected_count
+        if log_format == "json":
+            assert json.loads(balsa.log_path.read_text().splitlines()[-1])["counted"] == "counted"
+
+
+if is_main():
+    test_structured_extra()
+    test_native_same_as_sf()
+    test_structured_serialized_once()